@@ -1,6 +1,27 @@
+import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import boto3
 import configparser
+from boto3.s3.transfer import TransferConfig
+
+from utils.model_cache.blob_cache import BlobCache
+from utils.model_cache.local_store import LocalDirectoryS3Client
+
+MB = 1024 * 1024
+
+MANIFEST_FILE_NAME = ".models_manifest.json"
+DOWNLOAD_WORKERS = os.getenv("MODEL_DOWNLOAD_WORKERS", 8)
+MULTIPART_THRESHOLD_MB = os.getenv("MODEL_DOWNLOAD_MULTIPART_THRESHOLD_MB", 64)
+MULTIPART_CHUNKSIZE_MB = os.getenv("MODEL_DOWNLOAD_MULTIPART_CHUNKSIZE_MB", 16)
+MAX_CONCURRENCY_PER_FILE = os.getenv("MODEL_DOWNLOAD_MAX_CONCURRENCY_PER_FILE", 4)
+# Shared host directory of the content-addressed model cache, disabled when not set.
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR")
+MODEL_CACHE_MAX_GB = os.getenv("MODEL_CACHE_MAX_GB", 20)
+# Local directory used instead of S3, e.g. in tests.
+MODEL_STORE_LOCAL_DIR = os.getenv("MODEL_STORE_LOCAL_DIR")
 
 
 def load_config(config_file_path):
@@ -14,24 +35,119 @@ def load_config(config_file_path):
         raise Exception(f"Error reading configuration from {config_file_path}: {e}")
 
 
+def create_s3_client():
+    if MODEL_STORE_LOCAL_DIR:
+        return LocalDirectoryS3Client(MODEL_STORE_LOCAL_DIR)
+    return boto3.client("s3")
+
+
+def create_model_cache():
+    if not MODEL_CACHE_DIR:
+        return None
+    return BlobCache(MODEL_CACHE_DIR, int(float(MODEL_CACHE_MAX_GB) * 1024 * MB))
+
+
 def list_model_objects(s3_client, bucket, prefix):
     try:
-        response = s3_client.list_objects_v2(Bucket=bucket, Prefix=prefix)
-        return response.get("Contents", [])
+        objects = []
+        list_kwargs = {"Bucket": bucket, "Prefix": prefix}
+        while True:
+            response = s3_client.list_objects_v2(**list_kwargs)
+            objects.extend(response.get("Contents", []))
+            if not response.get("IsTruncated"):
+                return objects
+            list_kwargs["ContinuationToken"] = response["NextContinuationToken"]
     except Exception as e:
         raise Exception(
             f"Error listing objects in S3 bucket {bucket} with prefix {prefix}: {e}"
         )
 
 
-def download_model(s3_client, bucket, file_path, dest_path):
+def create_transfer_config():
+    return TransferConfig(
+        multipart_threshold=int(MULTIPART_THRESHOLD_MB) * MB,
+        multipart_chunksize=int(MULTIPART_CHUNKSIZE_MB) * MB,
+        max_concurrency=int(MAX_CONCURRENCY_PER_FILE),
+        use_threads=True,
+    )
+
+
+def download_model(s3_client, bucket, file_path, dest_path, transfer_config=None):
     try:
-        s3_client.download_file(bucket, file_path, dest_path)
+        if transfer_config is None:
+            s3_client.download_file(bucket, file_path, dest_path)
+        else:
+            s3_client.download_file(
+                bucket, file_path, dest_path, Config=transfer_config
+            )
         print(f"Downloaded {file_path} to {dest_path}")
     except Exception as e:
         raise Exception(f"Error downloading model from S3: {file_path}: {str(e)}")
 
 
+def sync_model(s3_client, bucket, obj, dest_path, transfer_config, model_cache=None):
+    """
+    Downloads a model to `dest_path`, through the shared model cache when enabled.
+    """
+    if model_cache is None or not obj.get("ETag"):
+        download_model(s3_client, bucket, obj["Key"], dest_path, transfer_config)
+        return
+
+    model_cache.install(
+        obj["ETag"],
+        lambda tmp_path: download_model(
+            s3_client, bucket, obj["Key"], tmp_path, transfer_config
+        ),
+        dest_path,
+    )
+    print(f"Linked {obj['Key']} from the model cache to {dest_path}")
+
+
+def load_manifest(manifest_path):
+    """
+    Loads the manifest of the previous sync, mapping every S3 key to the ETag, size
+    and last modified time of the downloaded object.
+    """
+    try:
+        with open(manifest_path, "r") as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest_path, manifest):
+    # A missing manifest only means every model is downloaded again on the next
+    # sync, so failing to write it does not fail the sync.
+    try:
+        tmp_path = f"{manifest_path}.tmp"
+        with open(tmp_path, "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+        os.replace(tmp_path, manifest_path)
+    except OSError as e:
+        print(f"Could not write the models manifest {manifest_path}: {e}")
+
+
+def manifest_entry(obj):
+    return {
+        "etag": obj.get("ETag"),
+        "size": obj.get("Size"),
+        "last_modified": str(obj.get("LastModified")),
+    }
+
+
+def is_up_to_date(obj, manifest, dest_path):
+    """
+    Checks whether the object was downloaded by a previous sync and has not changed
+    in S3 or on disk since.
+    """
+    entry = manifest.get(obj["Key"])
+    if entry is None or entry.get("etag") is None:
+        return False
+    if entry != manifest_entry(obj):
+        return False
+    return os.path.isfile(dest_path) and os.path.getsize(dest_path) == entry["size"]
+
+
 def download_models():
     config_file_path = "./configs/config.ini"
 
@@ -41,9 +157,17 @@ def download_models():
         s3_models_dir = config.get("S3", "dir")
         download_models_dest_dir = config.get("Model", "dest_dir")
 
-        s3_client = boto3.client("s3")
+        started_at = time.perf_counter()
+        s3_client = create_s3_client()
         objects = list_model_objects(s3_client, s3_bucket, s3_models_dir)
 
+        manifest_path = os.path.join(download_models_dest_dir, MANIFEST_FILE_NAME)
+        manifest = load_manifest(manifest_path)
+        transfer_config = create_transfer_config()
+        model_cache = create_model_cache()
+
+        to_download = []
+        skipped = 0
         for obj in objects:
             file_path = obj["Key"]
 
@@ -60,12 +184,55 @@ def download_models():
                     "Destination path is empty. Check the configuration and paths."
                 )
 
+            if is_up_to_date(obj, manifest, dest_path):
+                skipped += 1
+                continue
+
             # Ensure the destination directory exists
             dest_dir = os.path.dirname(dest_path)
             if not os.path.exists(dest_dir):
                 os.makedirs(dest_dir, exist_ok=True)
 
-            download_model(s3_client, s3_bucket, file_path, dest_path)
+            to_download.append((obj, dest_path))
+
+        with ThreadPoolExecutor(max_workers=int(DOWNLOAD_WORKERS)) as executor:
+            futures = [
+                (
+                    obj,
+                    executor.submit(
+                        sync_model,
+                        s3_client,
+                        s3_bucket,
+                        obj,
+                        dest_path,
+                        transfer_config,
+                        model_cache,
+                    ),
+                )
+                for obj, dest_path in to_download
+            ]
+
+        errors = []
+        downloaded_bytes = 0
+        for obj, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append(e)
+                continue
+            manifest[obj["Key"]] = manifest_entry(obj)
+            downloaded_bytes += obj.get("Size") or 0
+
+        if to_download:
+            save_manifest(manifest_path, manifest)
+
+        print(
+            f"Downloaded {len(to_download) - len(errors)} models "
+            f"({downloaded_bytes} bytes), skipped {skipped} unchanged models "
+            f"in {time.perf_counter() - started_at:.2f}s"
+        )
+        if errors:
+            raise errors[0]
 
     except Exception as e:
         raise Exception(f"Failed to download models from S3: {e}")
@@ -0,0 +1,94 @@
+"""
+This module provides middleware which sheds load before the service is overloaded.
+
+Without admission control every request is accepted and queued behind BentoML's thread
+pool, so under overload the latency of every request climbs into seconds before any of
+them fails. `AdmissionControl` rejects API requests early with 503 and a `Retry-After`
+header when:
+
+- the adaptive concurrency limit of the worker is reached (see
+  `utils/common/concurrency_limiter.py`), the limit shrinking when requests wait in a
+  priority lane or for a worker thread longer than `ADMISSION_TARGET_QUEUE_MS`;
+- the oldest request waiting in a priority lane or for a worker thread has waited
+  longer than `ADMISSION_MAX_QUEUE_MS`.
+
+The queue is tracked by `TrackQueuedRequests`, which must be added to the service as
+well. Rejections are counted in `bentoml_service_admission_rejections_total` and are
+not logged, as logging every rejected request would add to the overload.
+"""
+
+import math
+import time
+from http import HTTPStatus
+
+from utils.common.concurrency_limiter import AIMDConcurrencyLimiter
+from utils.common.fallback import ADMISSION_UTILIZATION_KEY
+from utils.common.response import error_response
+from utils.common.settings import Settings, get_settings
+from utils.monitoring.prometheus_metrics import (
+    bentoml_service_admission_concurrency_limit,
+    bentoml_service_admission_rejections_total,
+)
+from utils.monitoring.runtime_metrics import QUEUE_WAIT_SECONDS_KEY, queued_requests
+
+CONCURRENCY_LIMIT = "concurrency_limit"
+QUEUE_TIME = "queue_time"
+
+
+def create_limiter(settings: Settings) -> AIMDConcurrencyLimiter:
+    return AIMDConcurrencyLimiter(
+        initial_limit=settings.admission_initial_limit,
+        min_limit=settings.admission_min_limit,
+        max_limit=settings.admission_max_limit,
+        target_queue_seconds=settings.admission_target_queue_ms / 1000,
+        on_change=bentoml_service_admission_concurrency_limit.set,
+    )
+
+
+class AdmissionControl:
+    """
+    Pure ASGI middleware admitting API requests within the concurrency limit and the
+    queue time threshold of the worker.
+    """
+
+    def __init__(self, app, settings: Settings = None):
+        self.app = app
+        self.settings = settings or get_settings()
+        self.limiter = create_limiter(self.settings)
+        self.max_queue_seconds = self.settings.admission_max_queue_ms / 1000
+        self.controlled_routes = ["/api/v1/predict"]
+
+    async def reject(self, scope, receive, send, reason: str, retry_after: int):
+        bentoml_service_admission_rejections_total.labels(reason=reason).inc()
+        response = error_response(
+            "Service overloaded, retry later", HTTPStatus.SERVICE_UNAVAILABLE
+        )
+        response.headers["Retry-After"] = str(retry_after)
+        await response(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not self.settings.admission_control_enabled
+            or scope["path"] not in self.controlled_routes
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        queue_age = queued_requests.oldest_age(time.perf_counter())
+        if queue_age > self.max_queue_seconds:
+            # the queue takes about as long to drain as its oldest request waited
+            await self.reject(scope, receive, send, QUEUE_TIME, math.ceil(queue_age))
+            return
+        if not self.limiter.try_acquire():
+            await self.reject(scope, receive, send, CONCURRENCY_LIMIT, 1)
+            return
+        # lets the API serve the request with the fallback model close to the limit
+        scope[ADMISSION_UTILIZATION_KEY] = self.limiter.in_flight / int(
+            self.limiter.limit
+        )
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limiter.release(scope.get(QUEUE_WAIT_SECONDS_KEY))
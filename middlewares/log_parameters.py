@@ -4,6 +4,9 @@ This module provides middleware for setting default logging parameters for HTTP
 It defines the `SetLogDefaultParameters` class, which clears and binds context variables for logging
 each incoming request, including request ID, host, HTTP method, and API endpoint. This middleware
 is used to ensure that log entries contain relevant context information for tracing and debugging.
+It also starts the latency budget and the deadline of the request, read from the
+`X-Request-Timeout-Ms` header, which later stages use to skip work that can no longer
+finish in time.
 """
 
 import uuid
@@ -15,6 +18,7 @@ from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 from starlette.responses import Response
 
+from utils.common.latency_budget import DEADLINE_HEADER, start_request_budget
 from utils.common.response import error_response
 from utils.structure_logging.logger_config import logger
 
@@ -43,6 +47,7 @@ class SetLogDefaultParameters(BaseHTTPMiddleware):
                 http_method=request.method,
                 api_endpoint=request.url.path,
             )
+            start_request_budget(request.url.path, request.headers.get(DEADLINE_HEADER))
 
             response = await call_next(request)
             return response
@@ -0,0 +1,127 @@
+"""
+This module provides middleware which separates interactive and bulk prediction traffic.
+
+Requests are queued in priority lanes before they are handed to BentoML, whose worker
+threads serve requests first in, first out. `WeightedFairScheduler` (see
+`utils/common/priority_scheduler.py`) hands at most `PRIORITY_MAX_CONCURRENCY`
+requests to BentoML at once. Bulk requests only get `PRIORITY_BULK_MAX_CONCURRENCY` of
+these slots, and one dispatch for every nine interactive ones while interactive
+requests wait (`PRIORITY_BULK_WEIGHT` to `PRIORITY_INTERACTIVE_WEIGHT`), so a burst of
+bulk requests does not queue in front of interactive ones. The lanes are only used
+when `PRIORITY_LANES_ENABLED` is set, since the concurrency they hand to BentoML caps
+the throughput of the worker.
+
+A request is bulk when any of the following says so, clients can move their requests
+to the bulk lane but not out of it:
+
+- its route is one of `PRIORITY_BULK_ROUTES`;
+- the `priority` claim of its JWT is `bulk`;
+- its `X-Priority` header is `bulk`.
+
+The middleware must run after `JWTAuthentication`, which keeps the claims of the
+request, and right after `TrackQueuedRequests`: the time a request waits in its lane is
+part of its queue time, which admission control and the fallback model react to.
+"""
+
+import time
+from http import HTTPStatus
+
+from middlewares.validate_jwt import CLAIMS_STATE_KEY
+from utils.common.latency_budget import deadline_exceeded
+from utils.common.priority_scheduler import Lane, LaneFull, WeightedFairScheduler
+from utils.common.response import error_response
+from utils.common.settings import Settings, get_settings
+from utils.monitoring.prometheus_metrics import (
+    bentoml_service_priority_lane_rejections_total,
+    bentoml_service_priority_lane_wait_seconds,
+)
+from utils.monitoring.stage_timing import (
+    count_deadline_exceeded,
+    deadline_exceeded_response,
+)
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+# lanes from the highest to the lowest priority
+LANES = (INTERACTIVE, BULK)
+PRIORITY_CLAIM = "priority"
+PRIORITY_HEADER = b"x-priority"
+PRIORITY_LANE = "priority_lane"
+
+
+def create_scheduler(settings: Settings) -> WeightedFairScheduler:
+    return WeightedFairScheduler(
+        [
+            Lane(
+                INTERACTIVE,
+                weight=settings.priority_interactive_weight,
+                max_concurrency=settings.priority_max_concurrency,
+                max_queue=settings.priority_interactive_max_queue,
+            ),
+            Lane(
+                BULK,
+                weight=settings.priority_bulk_weight,
+                max_concurrency=settings.priority_bulk_max_concurrency,
+                max_queue=settings.priority_bulk_max_queue,
+            ),
+        ],
+        max_concurrency=settings.priority_max_concurrency,
+    )
+
+
+class PriorityLanes:
+    """
+    Pure ASGI middleware queueing API requests in priority lanes.
+    """
+
+    def __init__(self, app, settings: Settings = None):
+        self.app = app
+        self.settings = settings or get_settings()
+        self.scheduler = create_scheduler(self.settings)
+        self.bulk_routes = set(self.settings.priority_bulk_routes)
+        self.controlled_routes = {"/api/v1/predict", *self.bulk_routes}
+        self._wait_histograms = {
+            lane: bentoml_service_priority_lane_wait_seconds.labels(lane=lane)
+            for lane in LANES
+        }
+
+    def lane(self, scope) -> str:
+        requested = [BULK if scope["path"] in self.bulk_routes else INTERACTIVE]
+        claims = scope.get("state", {}).get(CLAIMS_STATE_KEY) or {}
+        requested.append(claims.get(PRIORITY_CLAIM))
+        for name, value in scope["headers"]:
+            if name == PRIORITY_HEADER:
+                requested.append(value.decode("latin-1").strip().lower())
+        return max((lane for lane in requested if lane in LANES), key=LANES.index)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not self.settings.priority_lanes_enabled
+            or scope["path"] not in self.controlled_routes
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        lane = self.lane(scope)
+        queued_at = time.perf_counter()
+        try:
+            await self.scheduler.acquire(lane)
+        except LaneFull:
+            bentoml_service_priority_lane_rejections_total.labels(lane=lane).inc()
+            response = error_response(
+                "Service overloaded, retry later", HTTPStatus.SERVICE_UNAVAILABLE
+            )
+            response.headers["Retry-After"] = "1"
+            await response(scope, receive, send)
+            return
+
+        try:
+            self._wait_histograms[lane].observe(time.perf_counter() - queued_at)
+            if deadline_exceeded():
+                count_deadline_exceeded(PRIORITY_LANE)
+                await deadline_exceeded_response()(scope, receive, send)
+                return
+            await self.app(scope, receive, send)
+        finally:
+            self.scheduler.release(lane)
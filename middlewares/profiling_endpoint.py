@@ -0,0 +1,118 @@
+"""
+This module provides middleware which serves the on-demand profiling endpoint.
+
+`GET /admin/profile` captures a profile of the worker process serving the request and
+returns it as an attachment:
+
+- `kind=cpu` (default): a sampling CPU profile of the threads running on a CPU, in
+  the folded stack format, to be rendered with `flamegraph.pl` or speedscope.
+  `interval_ms` sets the sampling interval, 10 milliseconds by default.
+- `kind=wall`: the same, sampling every thread including the idle and blocked ones.
+- `kind=memory`: the allocation sites which grew the most, from two `tracemalloc`
+  snapshots.
+
+`seconds` sets the duration of the capture, 5 seconds by default and at most
+`PROFILING_MAX_SECONDS`. Only one capture runs per worker, concurrent requests are
+answered with 409.
+
+The route is admin-only: `JWTAuthentication` rejects tokens without the admin role,
+so this middleware must be added after it.
+"""
+
+import asyncio
+import os
+from http import HTTPStatus
+from urllib.parse import parse_qs
+
+from starlette.responses import PlainTextResponse
+
+from utils.common.response import error_response
+from utils.common.settings import Settings, get_settings
+from utils.monitoring.profiler import (
+    CPU,
+    PROFILE_KINDS,
+    ProfileInProgress,
+    capture_guard,
+    capture_profile,
+)
+from utils.structure_logging.logger_config import logger
+
+PROFILE_PATH = "/admin/profile"
+DEFAULT_SECONDS = 5.0
+DEFAULT_INTERVAL_MS = 10.0
+FILE_EXTENSIONS = {"cpu": "folded", "wall": "folded", "memory": "txt"}
+
+
+class ProfilingEndpoint:
+    """
+    Pure ASGI middleware answering the profiling endpoint. Every other request is
+    passed on untouched.
+    """
+
+    def __init__(self, app, settings: Settings = None):
+        self.app = app
+        self._settings = settings
+
+    @property
+    def settings(self) -> Settings:
+        return self._settings or get_settings()
+
+    def _parse_parameters(self, query_string: bytes):
+        query = parse_qs(query_string.decode("latin-1"))
+        kind = query.get("kind", [CPU])[-1]
+        if kind not in PROFILE_KINDS:
+            raise ValueError(f"kind must be one of {', '.join(PROFILE_KINDS)}")
+
+        seconds = float(query.get("seconds", [DEFAULT_SECONDS])[-1])
+        max_seconds = self.settings.profiling_max_seconds
+        if not 0 < seconds <= max_seconds:
+            raise ValueError(f"seconds must be between 0 and {max_seconds}")
+
+        interval_ms = float(query.get("interval_ms", [DEFAULT_INTERVAL_MS])[-1])
+        if not 1 <= interval_ms <= 1000:
+            raise ValueError("interval_ms must be between 1 and 1000")
+        return kind, seconds, interval_ms / 1000
+
+    async def handle(self, scope, receive, send):
+        try:
+            kind, seconds, interval_seconds = self._parse_parameters(
+                scope.get("query_string", b"")
+            )
+        except ValueError as e:
+            response = error_response(
+                "Invalid profile parameters", HTTPStatus.BAD_REQUEST, [str(e)]
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            # answered without starting a thread when a capture is known to run,
+            # the guard itself serializes the captures racing past this check
+            if capture_guard.busy:
+                raise ProfileInProgress()
+            logger.warning("Capturing profile", kind=kind, seconds=seconds)
+            profile = await asyncio.get_running_loop().run_in_executor(
+                None, capture_profile, kind, seconds, interval_seconds
+            )
+        except ProfileInProgress:
+            response = error_response(
+                "A profile is already being captured", HTTPStatus.CONFLICT
+            )
+        except Exception:
+            logger.exception("Error capturing profile")
+            response = error_response(
+                "Internal Server Error", HTTPStatus.INTERNAL_SERVER_ERROR
+            )
+        else:
+            filename = f"profile-{os.getpid()}-{kind}.{FILE_EXTENSIONS[kind]}"
+            response = PlainTextResponse(
+                profile,
+                headers={"content-disposition": f'attachment; filename="{filename}"'},
+            )
+        await response(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == PROFILE_PATH:
+            await self.handle(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
@@ -0,0 +1,100 @@
+"""
+This module provides middleware which rate limits the API requests of every tenant.
+
+The tenant of a request is the `RATE_LIMIT_TENANT_CLAIM` claim (default `sub`) of its
+JWT, and every tenant may send `RATE_LIMIT_REQUESTS_PER_SECOND` requests per second
+with bursts of `RATE_LIMIT_BURST` requests (see `utils/common/rate_limiter.py`), so one
+noisy client cannot use up the capacity of the service.
+
+`TenantRateLimit` runs before the request body is read, logged or validated: a tenant
+over its rate is answered with 429 and a `Retry-After` header at the cost of verifying
+its token. The verified claims are kept in the request state, so `JWTAuthentication`
+does not decode the token again. Requests without a valid token are not limited here,
+and are rejected by `JWTAuthentication`. Valid tokens without the tenant claim are
+answered with 403, rather than sharing the limit of a single anonymous tenant.
+"""
+
+import math
+from http import HTTPStatus
+
+from middlewares.validate_jwt import decode_claims
+from utils.common.rate_limiter import TenantRateLimiter
+from utils.common.response import error_response
+from utils.common.settings import Settings, get_settings
+from utils.monitoring.prometheus_metrics import (
+    bentoml_service_rate_limited_requests_total,
+)
+
+# tenant of the requests whose token does not hold the tenant claim, which are rejected
+MISSING_TENANT = ""
+MAX_RETRY_AFTER_SECONDS = 60
+
+
+def create_rate_limiter(settings: Settings) -> TenantRateLimiter:
+    return TenantRateLimiter(
+        rate=settings.rate_limit_requests_per_second,
+        burst=settings.rate_limit_burst,
+        tenant_rates=dict(settings.rate_limit_tenant_rates),
+        max_tenants=settings.rate_limit_max_tenants,
+    )
+
+
+class TenantRateLimit:
+    """
+    Pure ASGI middleware rejecting the API requests of tenants over their rate limit.
+    """
+
+    def __init__(self, app, settings: Settings = None):
+        self.app = app
+        self.settings = settings or get_settings()
+        self.limiter = create_rate_limiter(self.settings)
+        self.controlled_routes = ["/api/v1/predict"]
+
+    def tenant(self, scope):
+        token = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                token = value.decode("latin-1")
+                break
+        if token is None:
+            return None
+        try:
+            claims = decode_claims(scope, token, self.settings.jwt_secret)
+        except Exception:
+            # left to JWTAuthentication, which rejects and logs it
+            return None
+        tenant = claims.get(self.settings.rate_limit_tenant_claim)
+        return MISSING_TENANT if tenant is None else str(tenant)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not self.limiter.enabled
+            or scope["path"] not in self.controlled_routes
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        tenant = self.tenant(scope)
+        if tenant == MISSING_TENANT:
+            response = error_response(
+                "Forbidden: the token has no "
+                f"{self.settings.rate_limit_tenant_claim} claim",
+                HTTPStatus.FORBIDDEN,
+            )
+            await response(scope, receive, send)
+            return
+
+        wait_seconds = 0.0 if tenant is None else self.limiter.acquire(tenant)
+        if wait_seconds > 0:
+            bentoml_service_rate_limited_requests_total.inc()
+            response = error_response(
+                "Too many requests, retry later", HTTPStatus.TOO_MANY_REQUESTS
+            )
+            response.headers["Retry-After"] = str(
+                min(math.ceil(wait_seconds), MAX_RETRY_AFTER_SECONDS)
+            )
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
@@ -0,0 +1,146 @@
+"""
+This module provides middleware which gates the readiness probe on the worker warmup.
+
+BentoML's `/readyz` reports ready as soon as the worker has started, while the first
+requests after a start are much slower than steady state. The `ReadinessGate` answers
+`/readyz` with 503 until every startup step in `utils.common.readiness` has succeeded,
+so autoscaled pods never receive traffic cold.
+
+When `WARMUP_THROUGH_MIDDLEWARES` is enabled, it also replays the warmup samples through
+the whole middleware stack once the application has started. It must therefore be
+the first middleware added to the service.
+"""
+
+import asyncio
+from http import HTTPStatus
+from typing import List
+
+import orjson
+import structlog
+
+from utils.common.readiness import MIDDLEWARE_WARMUP, readiness
+from utils.common.request_corpus import CorpusRequest, load_request_corpus
+from utils.common.response import error_response
+from utils.common.settings import Settings, get_settings
+from utils.jwt.generate_token import generate_token
+from utils.structure_logging.logger_config import logger
+
+READINESS_PATH = "/readyz"
+# Tenant of the warmup requests, so they pass the tenant rate limit
+WARMUP_SUBJECT = "warmup"
+
+
+async def replay_request(app, request: CorpusRequest, headers: List) -> int:
+    """
+    Sends a POST request straight to an ASGI application.
+
+    Returns:
+        int: The status code of the response.
+    """
+    body = orjson.dumps(request.body)
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": request.route,
+        "raw_path": request.route.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"warmup"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            *headers,
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("warmup", 80),
+        "state": {},
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    status_code = HTTPStatus.INTERNAL_SERVER_ERROR
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status_code
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+
+    await app(scope, receive, send)
+    return status_code
+
+
+def _warmup_headers(settings: Settings) -> List:
+    token = generate_token({settings.rate_limit_tenant_claim: WARMUP_SUBJECT})
+    return [(b"authorization", token.encode())]
+
+
+class ReadinessGate:
+    """
+    Pure ASGI middleware answering the readiness probe until the worker is warmed up.
+    """
+
+    def __init__(self, app, settings: Settings = None):
+        self.app = app
+        self.settings = settings or get_settings()
+        self._warmup_task = None
+
+    async def warmup(self) -> None:
+        """
+        Replays the warmup samples through the middleware stack. The step fails if
+        any sample is not answered with a 2xx status code, e.g. when it is rejected
+        before reaching the model.
+        """
+        try:
+            settings = self.settings
+            samples = (
+                load_request_corpus(
+                    settings.warmup_sample_path, limit=settings.warmup_sample_limit
+                )
+                if settings.warmup_sample_path
+                else []
+            )
+            headers = _warmup_headers(settings)
+            for sample in samples:
+                status_code = await replay_request(self.app, sample, headers)
+                if not HTTPStatus.OK <= status_code < HTTPStatus.MULTIPLE_CHOICES:
+                    logger.error(
+                        "Warmup request failed",
+                        route=sample.route,
+                        status_code=status_code,
+                    )
+                    return
+            # the replayed requests bound their log parameters in this task
+            structlog.contextvars.clear_contextvars()
+            readiness.mark_completed(MIDDLEWARE_WARMUP)
+        except Exception:
+            logger.exception("Error warming up the middleware stack")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan" and self.settings.warmup_through_middlewares:
+
+            async def send_wrapper(message):
+                await send(message)
+                if message["type"] == "lifespan.startup.complete":
+                    self._warmup_task = asyncio.create_task(self.warmup())
+
+            await self.app(scope, receive, send_wrapper)
+            return
+
+        if (
+            scope["type"] == "http"
+            and scope["path"] == READINESS_PATH
+            and not readiness.is_ready()
+        ):
+            response = error_response(
+                "Service is warming up", HTTPStatus.SERVICE_UNAVAILABLE
+            )
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
@@ -0,0 +1,129 @@
+"""
+This module provides middleware which captures a sample of the API requests to disk.
+
+Logging every request body at WARNING level, as `RequestResponseHandler` does, is too
+costly to keep production traffic for later. `RequestCapture` instead samples
+`REQUEST_CAPTURE_SAMPLE_RATE` of the API requests and appends their raw body, route,
+status code and latency to a memory-mapped ring file per worker in
+`REQUEST_CAPTURE_DIR` (see `utils/monitoring/request_capture.py`). Appending a record
+only copies it to memory, and the file keeps the latest requests within a fixed size.
+
+The capture file is opened, or taken over from an exited worker, when the worker
+starts (in the ASGI lifespan) and closed when it stops, so no request waits for it.
+
+The latency is measured from this middleware, so it should be added right after
+the middlewares which reject requests before reading their body.
+"""
+
+import asyncio
+import os
+import random
+import time
+
+from utils.common.settings import Settings, get_settings
+from utils.monitoring.prometheus_metrics import bentoml_service_request_captures_total
+from utils.monitoring.request_capture import RequestCaptureRing, claim_capture_file
+from utils.structure_logging.logger_config import logger
+
+CAPTURED = "captured"
+TOO_LARGE = "too_large"
+
+
+class RequestCapture:
+    """
+    Pure ASGI middleware writing a sample of the API requests to the capture file of
+    the worker, which is opened when the worker starts.
+    """
+
+    def __init__(self, app, settings: Settings = None):
+        self.app = app
+        self.settings = settings or get_settings()
+        self.controlled_routes = ["/api/v1/predict"]
+        self.ring = None
+
+    def open_ring(self) -> None:
+        try:
+            os.makedirs(self.settings.request_capture_dir, exist_ok=True)
+            self.ring = RequestCaptureRing(
+                claim_capture_file(self.settings.request_capture_dir),
+                self.settings.request_capture_file_mb * 1024 * 1024,
+                self.settings.request_capture_record_bytes,
+            )
+        except (OSError, ValueError):
+            # the requests are still served, only the capture is disabled
+            logger.exception("Error opening the request capture file")
+
+    def close_ring(self) -> None:
+        ring, self.ring = self.ring, None
+        if ring is not None:
+            ring.close()
+
+    async def _lifespan(self, scope, receive, send):
+        async def send_wrapper(message):
+            if message["type"] == "lifespan.startup.complete":
+                # reading the file of an exited worker takes a while, off the loop
+                await asyncio.get_running_loop().run_in_executor(None, self.open_ring)
+            elif message["type"] in (
+                "lifespan.shutdown.complete",
+                "lifespan.shutdown.failed",
+            ):
+                # on the loop, so no request appends to the ring while it is closed
+                self.close_ring()
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] == "lifespan"
+            and self.settings.request_capture_dir
+            and self.settings.request_capture_sample_rate > 0
+        ):
+            await self._lifespan(scope, receive, send)
+            return
+        if (
+            scope["type"] != "http"
+            or self.ring is None
+            or scope["path"] not in self.controlled_routes
+            or random.random() >= self.settings.request_capture_sample_rate
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        max_body_bytes = self.settings.request_capture_record_bytes
+        chunks = []
+        body_bytes = 0
+        status = 0
+
+        async def capture_receive():
+            nonlocal body_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                body_bytes += len(chunk)
+                # a body larger than a record is not kept
+                if body_bytes <= max_body_bytes:
+                    chunks.append(chunk)
+            return message
+
+        async def capture_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        timestamp = time.time()
+        started_at = time.perf_counter()
+        await self.app(scope, capture_receive, capture_send)
+        latency = time.perf_counter() - started_at
+
+        ring = self.ring
+        # requests rejected before their body was read cannot be replayed
+        if ring is None or not body_bytes:
+            return
+        captured = body_bytes <= max_body_bytes and ring.append(
+            timestamp, scope["path"], b"".join(chunks), latency, status
+        )
+        bentoml_service_request_captures_total.labels(
+            outcome=CAPTURED if captured else TOO_LARGE
+        ).inc()
@@ -0,0 +1,94 @@
+"""
+This module provides middlewares which feed the runtime metrics of the worker.
+
+- `TrackInFlightRequests` counts the requests being served and runs the event loop
+  lag monitor while the application is up. It must be one of the first middlewares
+  added to the service.
+- `TrackQueuedRequests` counts the requests queued in the priority lanes or by BentoML
+  until their API function starts in a worker thread, which calls `request_started()`.
+  It must be added right before `PriorityLanes`, after every other middleware.
+
+See `utils/monitoring/runtime_metrics.py`.
+"""
+
+import asyncio
+import contextlib
+
+from utils.common.settings import Settings, get_settings
+from utils.monitoring.runtime_metrics import (
+    in_flight_requests,
+    mark_finished,
+    mark_queued,
+    monitor_event_loop_lag,
+)
+
+
+class TrackInFlightRequests:
+    """
+    Pure ASGI middleware counting the requests in flight in the worker.
+    """
+
+    def __init__(self, app, settings: Settings = None):
+        self.app = app
+        self.settings = settings or get_settings()
+        self._lag_monitor = None
+
+    async def _lifespan(self, scope, receive, send):
+        async def send_wrapper(message):
+            if message["type"] == "lifespan.startup.complete":
+                self._lag_monitor = asyncio.create_task(
+                    monitor_event_loop_lag(
+                        self.settings.event_loop_lag_interval_seconds
+                    )
+                )
+            elif message["type"] in (
+                "lifespan.shutdown.complete",
+                "lifespan.shutdown.failed",
+            ):
+                await self.stop_lag_monitor()
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def stop_lag_monitor(self) -> None:
+        if self._lag_monitor is not None:
+            self._lag_monitor.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._lag_monitor
+            self._lag_monitor = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(scope, receive, send)
+            return
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        in_flight_requests.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            in_flight_requests.dec()
+
+
+class TrackQueuedRequests:
+    """
+    Pure ASGI middleware counting the requests waiting in a priority lane or for a
+    worker thread.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        mark_queued(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # the request may fail before its API function starts
+            mark_finished(scope)
@@ -1,29 +1,73 @@
-import os
-from dotenv import load_dotenv
-from starlette.middleware.base import BaseHTTPMiddleware
+"""
+This module provides middleware which rewrites the response headers.
 
-load_dotenv()
+`UpdateResponseHeaders` is a pure ASGI middleware: it intercepts the
+`http.response.start` message and rewrites its raw header list in a single pass,
+without buffering or re-wrapping the response. The headers added are precomputed once
+for the configured environment.
+"""
 
+from typing import List, Tuple
 
-class UpdateResponseHeaders(BaseHTTPMiddleware):
+from utils.common.settings import Settings, get_settings
+
+# Header names in ASGI messages are lowercase byte strings
+REMOVED_HEADERS = frozenset([b"x-bentoml-request-id", b"server"])
+SECURITY_HEADERS = [
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"deny"),
+    (b"content-security-policy", b"default-src 'none'"),
+]
+
+
+def build_header_block(settings: Settings) -> Tuple[frozenset, List]:
+    """
+    Returns the names of the headers to drop from every response and the headers to
+    append to it for the given settings.
+    """
+    added_headers = SECURITY_HEADERS if settings.is_production else []
+    dropped_names = REMOVED_HEADERS | {name for name, _ in added_headers}
+    return dropped_names, added_headers
+
+
+class UpdateResponseHeaders:
     """
     Middleware to update HTTP response headers.
 
     This middleware removes certain headers from the response and adds security-related
-    headers if the environment is set to 'production'.
+    headers if the environment is set to 'production'. The environment is read from the
+    injected settings, or from the current settings snapshot when none are injected.
     """
 
-    async def dispatch(self, request, call_next):
-        response = await call_next(request)
+    def __init__(self, app, settings: Settings = None):
+        self.app = app
+        self._settings = settings
+        self._block_settings = None
+        self._header_block = None
+
+    @property
+    def header_block(self) -> Tuple[frozenset, List]:
+        settings = self._settings or get_settings()
+        # rebuilt only when the settings snapshot was reloaded
+        if settings is not self._block_settings:
+            self._header_block = build_header_block(settings)
+            self._block_settings = settings
+        return self._header_block
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        if "x-bentoml-request-id" in response.headers:
-            del response.headers["x-bentoml-request-id"]
-        if "server" in response.headers:
-            del response.headers["server"]
+        dropped_names, added_headers = self.header_block
 
-        if os.getenv("ENVIRONMENT") == "production":
-            response.headers["X-Content-Type-Options"] = "nosniff"
-            response.headers["X-Frame-Options"] = "deny"
-            response.headers["Content-Security-Policy"] = "default-src 'none'"
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    header
+                    for header in message.get("headers", ())
+                    if header[0] not in dropped_names
+                ] + added_headers
+            await send(message)
 
-        return response
+        await self.app(scope, receive, send_wrapper)
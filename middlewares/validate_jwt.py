@@ -1,15 +1,32 @@
-import os
 from http import HTTPStatus
 
 import jwt
-from dotenv import load_dotenv
 from jwt import ExpiredSignatureError, InvalidTokenError
 from starlette.middleware.base import BaseHTTPMiddleware
 
 from utils.common.response import error_response
+from utils.common.settings import Settings, get_settings
+from utils.jwt.generate_token import ADMIN_ROLE
 from utils.structure_logging.logger_config import logger
 
-load_dotenv()
+# key of the decoded claims in the request state, e.g. `request.state.jwt_claims`
+CLAIMS_STATE_KEY = "jwt_claims"
+
+
+def decode_claims(scope, token: str, secret: str) -> dict:
+    """
+    Verifies the token of a request and returns its claims, which are kept in the
+    request state so the token is decoded once per request.
+
+    Raises:
+        InvalidTokenError: If the token is invalid or expired.
+    """
+    state = scope.setdefault("state", {})
+    claims = state.get(CLAIMS_STATE_KEY)
+    if claims is None:
+        claims = jwt.decode(token, secret, algorithms=["HS256"])
+        state[CLAIMS_STATE_KEY] = claims
+    return claims
 
 
 class JWTAuthentication(BaseHTTPMiddleware):
@@ -17,11 +34,26 @@ class JWTAuthentication(BaseHTTPMiddleware):
     Middleware for JWT authentication. Checks if the request contains a valid JWT token
     in the Authorization header. If the token is missing or invalid, responds with an
     Unauthorized error. Handles expired tokens and other JWT-related errors.
+    The decoded claims are kept on the request as `request.state.jwt_claims`.
+    Admin routes additionally require the admin role in the `role` claim of the token,
+    and respond with a Forbidden error otherwise.
+
+    The secret is read from the injected settings, or from the current settings
+    snapshot when none are injected.
     """
 
+    def __init__(self, app, settings: Settings = None):
+        super().__init__(app)
+        self._settings = settings
+
+    @property
+    def settings(self) -> Settings:
+        return self._settings or get_settings()
+
     async def dispatch(self, request, call_next):
         try:
-            protected_routes = ["/api/v1/predict"]
+            protected_routes = ["/api/v1/predict", "/admin/profile"]
+            admin_routes = ["/admin/profile"]
             if request.url.path in protected_routes:
                 if "Authorization" not in request.headers:
                     status_code = HTTPStatus.UNAUTHORIZED
@@ -30,7 +62,15 @@ class JWTAuthentication(BaseHTTPMiddleware):
                     return error_response(error_msg, status_code)
 
                 token = request.headers.get("Authorization")
-                jwt.decode(token, os.environ["JWT_SECRET"], algorithms=["HS256"])
+                claims = decode_claims(request.scope, token, self.settings.jwt_secret)
+                if (
+                    request.url.path in admin_routes
+                    and claims.get("role") != ADMIN_ROLE
+                ):
+                    status_code = HTTPStatus.FORBIDDEN
+                    error_msg = "Forbidden: admin role required"
+                    logger.error(error_msg, status_code=status_code)
+                    return error_response(error_msg, status_code)
 
             response = await call_next(request)
             return response
@@ -5,6 +5,7 @@ from starlette.middleware.base import BaseHTTPMiddleware
 from utils.common.formatters import format_error_message
 from utils.common.response import error_response
 from utils.common.validations import route_validation_mapping
+from utils.monitoring.stage_timing import BODY_PARSING, stage_timer
 from utils.structure_logging.logger_config import logger
 
 
@@ -32,7 +33,8 @@ class ValidationHandler(BaseHTTPMiddleware):
             if url_path in routes_to_validate:
                 validation_strategy_mapping = route_validation_mapping()
                 validation_strategy = validation_strategy_mapping.get(url_path)
-                request_body = await request.json()
+                with stage_timer(BODY_PARSING, request.scope):
+                    request_body = await request.json()
                 validation_strategy.model_validate(request_body)
 
             response = await call_next(request)
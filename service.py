@@ -2,37 +2,98 @@
 
 from __future__ import annotations
 
-import os
-import pickle
 import logging
+import time
 import numpy as np
 import bentoml
 import warnings
 from http import HTTPStatus
 
+from middlewares.admission_control import AdmissionControl
 from middlewares.log_parameters import SetLogDefaultParameters
+from middlewares.priority_lanes import PriorityLanes
+from middlewares.profiling_endpoint import ProfilingEndpoint
+from middlewares.rate_limit import TenantRateLimit
+from middlewares.readiness_gate import ReadinessGate
+from middlewares.request_capture import RequestCapture
 from middlewares.request_response_handler import RequestResponseHandler
+from middlewares.runtime_metrics import TrackInFlightRequests, TrackQueuedRequests
 from middlewares.validation_handler import ValidationHandler
 from middlewares.validate_jwt import JWTAuthentication
 from middlewares.update_response_headers import UpdateResponseHeaders
 from utils.structure_logging.logger_config import configure_structure_logging, logger
+from utils.common.fallback import fallback_reason
+from utils.common.latency_budget import deadline_exceeded
+from utils.common.readiness import MODEL_WARMUP, readiness
+from utils.common.request_corpus import load_request_corpus
+from utils.common.settings import Settings, get_settings
 from utils.common.validations import IrisRequestParams
+from utils.model_reload.model_reloader import ModelReloader
+from utils.model_reload.shadow_evaluator import ShadowEvaluator
 from utils.monitoring.prometheus_metrics import (
+    bentoml_service_fallback_predictions_total,
     bentoml_service_model_inferencing_duration_seconds,
 )
+from utils.monitoring.drift_monitor import DriftMonitor, load_baseline
+from utils.monitoring.multiprocess import start_worker_metrics, stop_worker_metrics
+from utils.monitoring.runtime_metrics import request_started, runtime_sampler
+from utils.monitoring.stage_timing import (
+    MODEL_CALL,
+    TimedMiddleware,
+    count_deadline_exceeded,
+    observe_queue_wait,
+    stage_timer,
+)
 
 warnings.filterwarnings("ignore")
 
+settings = get_settings()
+
+FALLBACK_SERVICE_NAME = "IrisClassifierServiceFallback"
+SHADOW_SERVICE_NAME = "IrisClassifierServiceShadow"
+# Marks the responses of the fallback model
+DEGRADED_HEADER = "X-Degraded"
+
+FEATURE_NAMES = ["sepal_length", "sepal_width", "petal_length", "petal_width"]
+
+# Sample inputs a new model must predict before it is served, when no warmup sample
+# corpus is configured
+WARMUP_INPUTS = np.array(
+    [[5.1, 3.5, 1.4, 0.2], [6.2, 2.9, 4.3, 1.3], [7.7, 3.0, 6.1, 2.3]],
+    dtype=np.float32,
+)
+
+# Labelled once, instead of on every request
+inferencing_duration_seconds = (
+    bentoml_service_model_inferencing_duration_seconds.labels(
+        endpoint="/api/v1/predict", service_name="IrisClassifierService"
+    )
+)
+
 # Configure logging
 configure_structure_logging()
 bento_logger = logging.getLogger("bentoml")
-bento_logger.setLevel(os.getenv("LOG_LEVEL", "WARNING").upper())
+bento_logger.setLevel(settings.log_level)
+
 
-# Load the model
-with open("./models/iris.pickle", "rb") as model_file:
-    model = pickle.load(model_file)
+def load_warmup_inputs(settings: Settings):
+    """
+    Returns the model inputs of the warmup sample corpus, or the default warmup
+    inputs when no corpus is configured.
+    """
+    if not settings.warmup_sample_path:
+        return WARMUP_INPUTS
 
-bentoml.picklable_model.save_model("iris_knn_model", model)
+    samples = load_request_corpus(
+        settings.warmup_sample_path, limit=settings.warmup_sample_limit
+    )
+    rows = [
+        [sample.body.get(name) for name in FEATURE_NAMES]
+        for sample in samples
+        if sample.route == "/api/v1/predict"
+    ]
+    rows = [row for row in rows if None not in row]
+    return np.array(rows, dtype=np.float32) if rows else WARMUP_INPUTS
 
 
 @bentoml.service
@@ -43,10 +104,88 @@ class IrisClassifierService:
     This service exposes an API endpoint `/api/v1/predict` that takes input parameters for
     sepal length, sepal width, petal length, and petal width, and returns a prediction
     from the pre-trained KNN model.
+
+    The model file is watched and a new version is loaded, warmed up and swapped in
+    without restarting the service. The readiness probe only reports ready once the
+    model is loaded and warmed up.
+
+    When a fallback model is configured, requests arriving while the service is
+    overloaded are served by it instead, and their responses are marked as degraded
+    (see utils/common/fallback.py). When a shadow model is configured, it is compared
+    with the served model on a sample of the requests, in the background (see
+    utils/model_reload/shadow_evaluator.py). When a baseline of the training data is
+    configured, the drift of the inputs is exported (see
+    utils/monitoring/drift_monitor.py).
     """
 
     def __init__(self) -> None:
-        self.model = bentoml.picklable_model.load_model("iris_knn_model:latest")
+        self.settings = get_settings()
+        self.model_reloader = ModelReloader(
+            self.settings.model_path,
+            service_name="IrisClassifierService",
+            poll_interval_seconds=self.settings.model_reload_interval_seconds,
+            warmup_inputs=load_warmup_inputs(self.settings),
+        )
+        self.model_reloader.load()
+        self.fallback_reloader = None
+        if self.settings.fallback_model_path:
+            self.fallback_reloader = ModelReloader(
+                self.settings.fallback_model_path,
+                service_name=FALLBACK_SERVICE_NAME,
+                poll_interval_seconds=self.settings.model_reload_interval_seconds,
+                warmup_inputs=load_warmup_inputs(self.settings),
+            )
+            self.fallback_reloader.load()
+            self.fallback_reloader.start()
+            runtime_sampler.track_model(
+                FALLBACK_SERVICE_NAME, lambda: self.fallback_reloader.model
+            )
+        self.shadow_evaluator = None
+        if self.settings.shadow_model_path:
+            shadow_reloader = ModelReloader(
+                self.settings.shadow_model_path,
+                service_name=SHADOW_SERVICE_NAME,
+                poll_interval_seconds=self.settings.model_reload_interval_seconds,
+                warmup_inputs=load_warmup_inputs(self.settings),
+            )
+            shadow_reloader.load()
+            shadow_reloader.start()
+            self.shadow_evaluator = ShadowEvaluator(
+                shadow_reloader,
+                service_name="IrisClassifierService",
+                sample_rate=self.settings.shadow_sample_rate,
+                queue_size=self.settings.shadow_queue_size,
+                workers=self.settings.shadow_workers,
+                sample_rate_path=self.settings.shadow_sample_rate_path,
+            )
+            self.shadow_evaluator.start()
+        self.drift_monitor = None
+        if self.settings.drift_baseline_path:
+            self.drift_monitor = DriftMonitor(
+                load_baseline(self.settings.drift_baseline_path, FEATURE_NAMES),
+                window_size=self.settings.drift_window_size,
+            )
+        readiness.mark_completed(MODEL_WARMUP)
+        self.model_reloader.start()
+        start_worker_metrics()
+        runtime_sampler.track_model(
+            "IrisClassifierService", lambda: self.model_reloader.model
+        )
+        runtime_sampler.start()
+
+    @bentoml.on_shutdown
+    def stop_model_reloader(self) -> None:
+        self.model_reloader.stop()
+        if self.fallback_reloader is not None:
+            self.fallback_reloader.stop()
+        if self.shadow_evaluator is not None:
+            self.shadow_evaluator.stop()
+            self.shadow_evaluator.candidate.stop()
+
+    @bentoml.on_shutdown
+    def flush_metrics(self) -> None:
+        runtime_sampler.stop()
+        stop_worker_metrics()
 
     @bentoml.api(route="/api/v1/predict", input_spec=IrisRequestParams)
     def predict(self, ctx: bentoml.Context, **request_parameters: dict):
@@ -60,18 +199,44 @@ class IrisClassifierService:
             dict: A dictionary containing the prediction or an error message.
         """
         try:
-            params = ["sepal_length", "sepal_width", "petal_length", "petal_width"]
-            values = [request_parameters.get(param) for param in params]
+            observe_queue_wait(ctx.request.scope)
+            request_started(ctx.request.scope)
+            # the client gave up while the request waited for a worker thread
+            if deadline_exceeded():
+                count_deadline_exceeded(MODEL_CALL)
+                ctx.response.status_code = HTTPStatus.GATEWAY_TIMEOUT
+                return {"message": "Request deadline exceeded"}
+
+            values = [request_parameters.get(param) for param in FEATURE_NAMES]
 
             if None in values:
                 return {"message": "Missing one or more required parameters"}
+            if self.drift_monitor is not None:
+                self.drift_monitor.observe(values)
 
+            # Read the model once, so the request finishes on the model it started
+            # with even if a new version is swapped in meanwhile
+            model = self.model_reloader.model
+            degraded_reason = self.fallback_reloader and fallback_reason(
+                ctx.request.scope, self.settings
+            )
+            if degraded_reason:
+                model = self.fallback_reloader.model
+                bentoml_service_fallback_predictions_total.labels(
+                    service_name="IrisClassifierService", reason=degraded_reason
+                ).inc()
             data_array = np.array([values], dtype=np.float32)
-            with bentoml_service_model_inferencing_duration_seconds.labels(
-                endpoint="/api/v1/predict", service_name="IrisClassifierService"
-            ).time():
-                prediction = self.model.predict(data_array)
+            with inferencing_duration_seconds.time(), stage_timer(MODEL_CALL):
+                started_at = time.perf_counter()
+                prediction = model.predict(data_array)
+                model_seconds = time.perf_counter() - started_at
 
+            # only the requests served by the primary model are compared
+            if self.shadow_evaluator is not None and not degraded_reason:
+                self.shadow_evaluator.submit(data_array, prediction, model_seconds)
+            if degraded_reason:
+                ctx.response.headers[DEGRADED_HEADER] = "true"
+                return {"prediction": prediction.tolist()[0], "degraded": True}
             return {"prediction": prediction.tolist()[0]}
         except Exception:
             ctx.response.status_code = HTTPStatus.INTERNAL_SERVER_ERROR
@@ -81,8 +246,36 @@ class IrisClassifierService:
             return {"message": "Internal Server Error"}
 
 
-IrisClassifierService.add_asgi_middleware(SetLogDefaultParameters)
-IrisClassifierService.add_asgi_middleware(RequestResponseHandler)
-IrisClassifierService.add_asgi_middleware(ValidationHandler)
-IrisClassifierService.add_asgi_middleware(JWTAuthentication)
-IrisClassifierService.add_asgi_middleware(UpdateResponseHeaders)
+IrisClassifierService.add_asgi_middleware(ReadinessGate)
+IrisClassifierService.add_asgi_middleware(TrackInFlightRequests)
+# Rejects tenants over their rate before they take a share of the concurrency limit
+IrisClassifierService.add_asgi_middleware(TenantRateLimit)
+# Sheds load before any other work is spent on the request
+IrisClassifierService.add_asgi_middleware(AdmissionControl)
+# Captures a sample of the admitted requests, with their latency through the service
+IrisClassifierService.add_asgi_middleware(RequestCapture)
+# Every middleware is timed as a stage of the request, see utils/monitoring/stage_timing.py
+IrisClassifierService.add_asgi_middleware(
+    TimedMiddleware, middleware=SetLogDefaultParameters, stage="log_parameters"
+)
+IrisClassifierService.add_asgi_middleware(
+    TimedMiddleware,
+    middleware=RequestResponseHandler,
+    stage="request_response_handler",
+)
+IrisClassifierService.add_asgi_middleware(
+    TimedMiddleware, middleware=ValidationHandler, stage="validation"
+)
+IrisClassifierService.add_asgi_middleware(
+    TimedMiddleware, middleware=JWTAuthentication, stage="jwt"
+)
+IrisClassifierService.add_asgi_middleware(
+    TimedMiddleware, middleware=UpdateResponseHeaders, stage="response_headers"
+)
+# Answers /admin/profile, after JWTAuthentication which enforces the admin role
+IrisClassifierService.add_asgi_middleware(ProfilingEndpoint)
+# Counts the requests waiting in a priority lane or for a worker thread, which admission
+# control and the fallback model react to
+IrisClassifierService.add_asgi_middleware(TrackQueuedRequests)
+# Queues the API requests by priority, after JWTAuthentication which keeps the claims
+IrisClassifierService.add_asgi_middleware(PriorityLanes)
@@ -0,0 +1,235 @@
+"""
+Microbenchmarks of the request path, gated against the baselines in `baselines.json`.
+
+The benchmarks only run when `RUN_BENCHMARKS=true`:
+
+    RUN_BENCHMARKS=true pytest tests/benchmarks
+
+Every benchmark keeps the best time per call of `BENCHMARK_REPEAT` runs (default 5),
+and fails when it is slower than its baseline by more than `BENCHMARK_TOLERANCE`
+(default 0.5, i.e. 50%). A benchmark over the tolerance is measured again up to
+`BENCHMARK_RETRIES` times (default 2) before it fails, so a noisy neighbour does not
+fail the run. `BENCHMARK_UPDATE_BASELINES=true` records the measured times as the new
+baselines instead, and `BENCHMARK_RESULTS_PATH` writes them to a JSON file.
+"""
+
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pytest
+
+# the request logs would measure the terminal rather than the code
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+BENCHMARKS_DIR = Path(__file__).parent
+BASELINES_PATH = BENCHMARKS_DIR / "baselines.json"
+# a run lasts at least this long, so timer resolution and call overhead are negligible
+MIN_RUN_SECONDS = 0.2
+
+RESULTS: Dict[str, float] = {}
+
+
+def _enabled(name: str) -> bool:
+    return os.environ.get(name, "").lower() in ("true", "1", "yes")
+
+
+def pytest_collection_modifyitems(config, items):
+    if _enabled("RUN_BENCHMARKS"):
+        return
+    skip = pytest.mark.skip(reason="benchmarks only run with RUN_BENCHMARKS=true")
+    for item in items:
+        if BENCHMARKS_DIR in Path(item.fspath).parents:
+            item.add_marker(skip)
+
+
+def load_baselines() -> Dict[str, float]:
+    if not BASELINES_PATH.exists():
+        return {}
+    with open(BASELINES_PATH) as baselines_file:
+        return json.load(baselines_file)
+
+
+def _best_time_per_call(run: Callable[[int], float], repeat: int) -> float:
+    # grows the number of calls of a run like timeit's autorange
+    number = 1
+    while True:
+        seconds = run(number)
+        if seconds >= MIN_RUN_SECONDS:
+            break
+        number *= 10 if seconds < MIN_RUN_SECONDS / 10 else 2
+    return min([seconds] + [run(number) for _ in range(repeat - 1)]) / number
+
+
+class Benchmark:
+    """
+    Times a callable and checks the time per call against its baseline.
+    """
+
+    def __init__(self, baselines: Dict[str, float]):
+        self.baselines = baselines
+        self.repeat = int(os.environ.get("BENCHMARK_REPEAT", "5"))
+        self.tolerance = float(os.environ.get("BENCHMARK_TOLERANCE", "0.5"))
+        self.retries = int(os.environ.get("BENCHMARK_RETRIES", "2"))
+        self.update = _enabled("BENCHMARK_UPDATE_BASELINES")
+
+    def _measure(self, name: str, run: Callable[[int], float]) -> float:
+        seconds = _best_time_per_call(run, self.repeat)
+        baseline = self.baselines.get(name)
+        if not self.update and baseline is not None:
+            limit = baseline * (1 + self.tolerance)
+            for _ in range(self.retries):
+                if seconds <= limit:
+                    break
+                seconds = min(seconds, _best_time_per_call(run, self.repeat))
+
+        RESULTS[name] = seconds
+        if self.update or baseline is None:
+            return seconds
+        if seconds > limit:
+            pytest.fail(
+                f"{name} regressed: {seconds * 1e6:.2f}us per call, baseline "
+                f"{baseline * 1e6:.2f}us (+{seconds / baseline - 1:.0%}, tolerance "
+                f"{self.tolerance:.0%})"
+            )
+        return seconds
+
+    def __call__(self, name: str, func: Callable[[], object]) -> float:
+        """
+        Times `func()` and returns the seconds per call.
+        """
+
+        def run(number: int) -> float:
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            return time.perf_counter() - start
+
+        return self._measure(name, run)
+
+    def run_async(
+        self,
+        name: str,
+        func: Callable[[], object],
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> float:
+        """
+        Times `await func()` on an event loop and returns the seconds per call.
+        """
+        own_loop = loop is None
+        loop = loop or asyncio.new_event_loop()
+
+        async def timed(number: int) -> float:
+            start = time.perf_counter()
+            for _ in range(number):
+                await func()
+            return time.perf_counter() - start
+
+        try:
+            return self._measure(
+                name, lambda number: loop.run_until_complete(timed(number))
+            )
+        finally:
+            if own_loop:
+                loop.close()
+
+
+# loaded once, the summary compares with them after the baselines were updated
+BASELINES = load_baselines()
+
+
+@pytest.fixture(scope="session")
+def benchmark():
+    return Benchmark(BASELINES)
+
+
+def make_asgi_call(
+    app, path: str, body: bytes = b"", headers: List[Tuple[bytes, bytes]] = ()
+):
+    """
+    Returns a coroutine function sending a POST request straight to an ASGI
+    application, and checking that it was answered with a success.
+    """
+    scope_template = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"benchmark"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            *headers,
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("benchmark", 80),
+    }
+
+    async def call():
+        received = False
+        status = []
+
+        async def receive():
+            nonlocal received
+            if received:
+                await asyncio.Event().wait()
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                status.append(message["status"])
+
+        await app(dict(scope_template, state={}), receive, send)
+        assert status and status[0] < 400, f"Request answered with {status}"
+
+    return call
+
+
+@pytest.fixture(scope="session")
+def asgi_call():
+    return make_asgi_call
+
+
+@pytest.fixture(scope="session")
+def iris_model():
+    """
+    The model served by the template, trained as in `train_and_save_model.py`.
+    """
+    from sklearn.datasets import load_iris
+    from sklearn.neighbors import KNeighborsClassifier
+
+    iris = load_iris()
+    return KNeighborsClassifier(n_neighbors=3).fit(iris.data, iris.target)
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not RESULTS:
+        return
+    terminalreporter.section("benchmarks")
+    for name, seconds in sorted(RESULTS.items()):
+        baseline = BASELINES.get(name)
+        change = f"{seconds / baseline - 1:+.0%}" if baseline else "no baseline"
+        terminalreporter.write_line(f"{name:<50} {seconds * 1e6:>12.2f}us  {change}")
+
+
+def pytest_sessionfinish(session):
+    if not RESULTS:
+        return
+    results_path = os.environ.get("BENCHMARK_RESULTS_PATH")
+    if results_path:
+        with open(results_path, "w") as results_file:
+            json.dump(RESULTS, results_file, indent=2, sort_keys=True)
+    if _enabled("BENCHMARK_UPDATE_BASELINES"):
+        baselines = {**BASELINES, **RESULTS}
+        with open(BASELINES_PATH, "w") as baselines_file:
+            json.dump(baselines, baselines_file, indent=2, sort_keys=True)
+            baselines_file.write("\n")
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import pickle
+from dataclasses import replace
+
+import jwt
+import pytest
+from starlette.responses import JSONResponse
+
+from middlewares.admission_control import AdmissionControl
+from middlewares.log_parameters import SetLogDefaultParameters
+from middlewares.priority_lanes import PriorityLanes
+from middlewares.profiling_endpoint import ProfilingEndpoint
+from middlewares.rate_limit import TenantRateLimit
+from middlewares.readiness_gate import ReadinessGate
+from middlewares.request_capture import RequestCapture
+from middlewares.request_response_handler import RequestResponseHandler
+from middlewares.runtime_metrics import TrackInFlightRequests, TrackQueuedRequests
+from middlewares.update_response_headers import UpdateResponseHeaders
+from middlewares.validate_jwt import JWTAuthentication
+from middlewares.validation_handler import ValidationHandler
+from utils.common.settings import Settings, reload_settings
+from utils.monitoring.stage_timing import TimedMiddleware
+
+PREDICT_ROUTE = "/api/v1/predict"
+BODY = json.dumps(
+    {"sepal_length": 5.1, "sepal_width": 3.5, "petal_length": 1.4, "petal_width": 0.2}
+).encode()
+SECRET = "benchmark_secret"
+SETTINGS = Settings(jwt_secret=SECRET, environment="production")
+# the middlewares disabled by default, enabled without ever rejecting a request
+RATE_LIMIT_SETTINGS = replace(
+    SETTINGS, rate_limit_requests_per_second=1e9, rate_limit_burst=1e9
+)
+PRIORITY_LANES_SETTINGS = replace(SETTINGS, priority_lanes_enabled=True)
+# relative to the temporary directory of the benchmark, see test_middleware
+CAPTURE_SETTINGS = replace(
+    SETTINGS,
+    request_capture_dir="request_capture",
+    request_capture_sample_rate=1.0,
+    request_capture_file_mb=1,
+)
+
+
+async def endpoint(scope, receive, send):
+    await receive()
+    await JSONResponse({"prediction": 0})(scope, receive, send)
+
+
+def request_capture(app):
+    middleware = RequestCapture(app, settings=CAPTURE_SETTINGS)
+    # opened by the lifespan startup in the service
+    middleware.open_ring()
+    return middleware
+
+
+MIDDLEWARES = {
+    "none": lambda app: app,
+    "SetLogDefaultParameters": SetLogDefaultParameters,
+    "RequestResponseHandler": RequestResponseHandler,
+    "ValidationHandler": ValidationHandler,
+    "JWTAuthentication": lambda app: JWTAuthentication(app, settings=SETTINGS),
+    "UpdateResponseHeaders": lambda app: UpdateResponseHeaders(app, settings=SETTINGS),
+    "ReadinessGate": lambda app: ReadinessGate(app, settings=SETTINGS),
+    "ProfilingEndpoint": lambda app: ProfilingEndpoint(app, settings=SETTINGS),
+    "AdmissionControl": lambda app: AdmissionControl(app, settings=SETTINGS),
+    "TenantRateLimit": lambda app: TenantRateLimit(app, settings=RATE_LIMIT_SETTINGS),
+    "PriorityLanes": lambda app: PriorityLanes(app, settings=PRIORITY_LANES_SETTINGS),
+    "RequestCapture": request_capture,
+    "TrackInFlightRequests": lambda app: TrackInFlightRequests(app, settings=SETTINGS),
+    "TrackQueuedRequests": TrackQueuedRequests,
+    "TimedMiddleware": lambda app: TimedMiddleware(
+        app,
+        middleware=UpdateResponseHeaders,
+        stage="response_headers",
+        settings=SETTINGS,
+    ),
+}
+
+
+def auth_headers():
+    token = jwt.encode({"sub": "benchmark", "exp": 2**32}, SECRET, algorithm="HS256")
+    return [(b"authorization", token.encode())]
+
+
+@pytest.mark.parametrize("name", MIDDLEWARES)
+def test_middleware(benchmark, asgi_call, name, tmp_path, monkeypatch):
+    # keeps the files written by the middlewares in the temporary directory
+    monkeypatch.chdir(tmp_path)
+    app = MIDDLEWARES[name](endpoint)
+
+    benchmark.run_async(
+        f"middleware.{name}", asgi_call(app, PREDICT_ROUTE, BODY, auth_headers())
+    )
+
+
+@pytest.fixture(scope="module")
+def service_app(tmp_path_factory, iris_model):
+    """
+    The ASGI application of the service, run in-process with the full middleware
+    stack on an event loop of its own.
+    """
+    model_path = tmp_path_factory.mktemp("models") / "iris.pickle"
+    with open(model_path, "wb") as model_file:
+        pickle.dump(iris_model, model_file)
+
+    monkeypatch = pytest.MonkeyPatch()
+    monkeypatch.setenv("MODEL_PATH", str(model_path))
+    monkeypatch.setenv("MODEL_RELOAD_INTERVAL_SECONDS", "0")
+    monkeypatch.setenv("JWT_SECRET", SECRET)
+    reload_settings()
+
+    from utils.load_testing.load_generator import load_service_app, serve_in_process
+
+    loop = asyncio.new_event_loop()
+    app = load_service_app("service:IrisClassifierService")
+    serving = serve_in_process(app)
+    loop.run_until_complete(serving.__aenter__())
+    try:
+        yield loop, app
+    finally:
+        loop.run_until_complete(serving.__aexit__(None, None, None))
+        loop.close()
+        monkeypatch.undo()
+        reload_settings()
+
+
+def test_full_stack(benchmark, asgi_call, service_app):
+    loop, app = service_app
+
+    benchmark.run_async(
+        "full_stack.predict",
+        asgi_call(app, PREDICT_ROUTE, BODY, auth_headers()),
+        loop=loop,
+    )
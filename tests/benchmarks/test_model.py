@@ -0,0 +1,16 @@
+import numpy as np
+import pytest
+
+BATCH_SIZES = [1, 10, 100, 1000, 10000]
+
+
+@pytest.mark.parametrize("batch_size", BATCH_SIZES)
+def test_model_predict(benchmark, iris_model, batch_size):
+    generator = np.random.default_rng(0)
+    # the ranges of the iris dataset features
+    low = np.array([4.3, 2.0, 1.0, 0.1])
+    high = np.array([7.9, 4.4, 6.9, 2.5])
+    inputs = generator.uniform(low, high, size=(batch_size, 4)).astype(np.float32)
+
+    assert len(iris_model.predict(inputs)) == batch_size
+    benchmark(f"model.predict[batch={batch_size}]", lambda: iris_model.predict(inputs))
@@ -0,0 +1,77 @@
+import json
+
+import jwt
+import orjson
+from pydantic import ValidationError
+from sklearn.datasets import load_iris
+
+from utils.common.formatters import format_error_message
+from utils.common.validations import IrisRequestParams
+from utils.monitoring.drift_monitor import DriftMonitor, build_baseline, parse_baseline
+from utils.monitoring.request_capture import RequestCaptureRing
+
+BODY = {
+    "sepal_length": 5.1,
+    "sepal_width": 3.5,
+    "petal_length": 1.4,
+    "petal_width": 0.2,
+}
+RAW_BODY = json.dumps(BODY).encode()
+RESPONSE = {"prediction": 0}
+INVALID_BODY = {"sepal_length": -1, "sepal_width": "wide", "petal_length": 1.4}
+SECRET = "benchmark_secret"
+
+
+def test_json_decode(benchmark):
+    benchmark("json.loads", lambda: json.loads(RAW_BODY))
+    benchmark("orjson.loads", lambda: orjson.loads(RAW_BODY))
+
+
+def test_json_encode(benchmark):
+    benchmark("json.dumps", lambda: json.dumps(RESPONSE))
+    benchmark("orjson.dumps", lambda: orjson.dumps(RESPONSE))
+
+
+def test_pydantic_validation(benchmark):
+    benchmark(
+        "IrisRequestParams.model_validate",
+        lambda: IrisRequestParams.model_validate(BODY),
+    )
+    benchmark(
+        "IrisRequestParams.model_validate_json",
+        lambda: IrisRequestParams.model_validate_json(RAW_BODY),
+    )
+
+
+def test_format_error_message(benchmark):
+    try:
+        IrisRequestParams.model_validate(INVALID_BODY)
+    except ValidationError as e:
+        errors = e.errors()
+
+    assert len(format_error_message(errors)) == 3
+    benchmark("format_error_message", lambda: format_error_message(errors))
+
+
+def test_jwt_decode(benchmark):
+    token = jwt.encode({"exp": 2**32}, SECRET, algorithm="HS256")
+
+    benchmark("jwt.decode", lambda: jwt.decode(token, SECRET, algorithms=["HS256"]))
+
+
+def test_drift_monitor_observe(benchmark):
+    baseline = build_baseline(load_iris().data, list(BODY))
+    monitor = DriftMonitor(parse_baseline(baseline, list(BODY)))
+    row = list(BODY.values())
+
+    benchmark("DriftMonitor.observe", lambda: monitor.observe(row))
+
+
+def test_request_capture_append(benchmark, tmp_path):
+    ring = RequestCaptureRing(str(tmp_path / "requests.capture"), 1024 * 1024)
+
+    benchmark(
+        "RequestCaptureRing.append",
+        lambda: ring.append(0.0, "/api/v1/predict", RAW_BODY, 0.001, 200),
+    )
+    ring.close()
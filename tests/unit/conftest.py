@@ -0,0 +1,13 @@
+import pytest
+
+from utils.common import settings
+
+
+@pytest.fixture(autouse=True)
+def restore_settings():
+    """
+    Restores the settings snapshot of the process after tests which reload it.
+    """
+    snapshot = settings._settings
+    yield
+    settings._settings = snapshot
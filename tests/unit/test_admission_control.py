@@ -0,0 +1,138 @@
+import asyncio
+import time
+from http import HTTPStatus
+
+import httpx
+from prometheus_client import REGISTRY
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from middlewares.admission_control import AdmissionControl
+from middlewares.runtime_metrics import TrackQueuedRequests
+from utils.common.fallback import ADMISSION_UTILIZATION_KEY
+from utils.common.settings import Settings
+from utils.monitoring.runtime_metrics import queued_requests, request_started
+
+
+def rejections(reason):
+    return (
+        REGISTRY.get_sample_value(
+            "bentoml_service_admission_rejections_total", {"reason": reason}
+        )
+        or 0.0
+    )
+
+
+utilizations = []
+
+
+def make_app(settings, release: asyncio.Event, queue_seconds=0.0):
+    async def predict(request):
+        utilizations.append(request.scope.get(ADMISSION_UTILIZATION_KEY))
+        # waits for a worker thread, then for the test to let it finish
+        await asyncio.sleep(queue_seconds)
+        request_started(request.scope)
+        await release.wait()
+        return JSONResponse({"prediction": 0})
+
+    async def health(request):
+        return JSONResponse({"status": "ok"})
+
+    app = Starlette(
+        routes=[
+            Route("/api/v1/predict", predict, methods=["POST"]),
+            Route("/readyz", health),
+        ]
+    )
+    app.add_middleware(TrackQueuedRequests)
+    app.add_middleware(AdmissionControl, settings=settings)
+    return app
+
+
+def client_for(app):
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    )
+
+
+async def test_rejects_over_the_concurrency_limit():
+    release = asyncio.Event()
+    app = make_app(Settings(admission_initial_limit=2), release)
+    before = rejections("concurrency_limit")
+    utilizations.clear()
+
+    async with client_for(app) as client:
+        admitted = [
+            asyncio.create_task(client.post("/api/v1/predict", json={}))
+            for _ in range(2)
+        ]
+        await asyncio.sleep(0.05)
+        rejected = await client.post("/api/v1/predict", json={})
+        health = await client.get("/readyz")
+        release.set()
+        responses = await asyncio.gather(*admitted)
+
+    assert [response.status_code for response in responses] == [HTTPStatus.OK] * 2
+    assert rejected.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert rejected.headers["retry-after"] == "1"
+    assert rejected.json() == {"message": "Service overloaded, retry later"}
+    assert health.status_code == HTTPStatus.OK
+    assert rejections("concurrency_limit") == before + 1
+    assert utilizations == [0.5, 1.0]
+
+
+async def test_rejects_when_the_queue_is_too_old():
+    release = asyncio.Event()
+    release.set()
+    app = make_app(Settings(admission_max_queue_ms=100), release)
+    before = rejections("queue_time")
+    scope = {}
+    queued_requests.add(id(scope), time.perf_counter() - 1.5)
+
+    try:
+        async with client_for(app) as client:
+            rejected = await client.post("/api/v1/predict", json={})
+    finally:
+        queued_requests.remove(id(scope))
+
+    assert rejected.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert rejected.headers["retry-after"] == "2"
+    assert rejections("queue_time") == before + 1
+
+
+async def test_limit_shrinks_when_requests_queue():
+    release = asyncio.Event()
+    release.set()
+    settings = Settings(admission_initial_limit=2, admission_target_queue_ms=10)
+    app = make_app(settings, release, queue_seconds=0.05)
+
+    async with client_for(app) as client:
+        await asyncio.gather(
+            *(client.post("/api/v1/predict", json={}) for _ in range(2))
+        )
+
+    # the Starlette middleware stack is built on the first request
+    admission = app.middleware_stack
+    while not isinstance(admission, AdmissionControl):
+        admission = admission.app
+    assert admission.limiter.limit < 2
+    assert admission.limiter.in_flight == 0
+
+
+async def test_disabled():
+    release = asyncio.Event()
+    release.set()
+    app = make_app(
+        Settings(admission_control_enabled=False, admission_max_queue_ms=0), release
+    )
+    scope = {}
+    queued_requests.add(id(scope), time.perf_counter() - 1.5)
+
+    try:
+        async with client_for(app) as client:
+            response = await client.post("/api/v1/predict", json={})
+    finally:
+        queued_requests.remove(id(scope))
+
+    assert response.status_code == HTTPStatus.OK
@@ -0,0 +1,120 @@
+import pytest
+
+from utils.dynamodb.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(
+        name="test",
+        failure_rate_threshold=0.5,
+        latency_threshold_seconds=0.2,
+        window_size=10,
+        minimum_calls=4,
+        minimum_slow_calls=2,
+        open_seconds=5,
+        clock=clock,
+    )
+
+
+def test_opens_on_error_rate(breaker):
+    for succeeded in (True, False, True, False):
+        assert breaker.allow_request()
+        breaker.record(succeeded, 0.01)
+
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+
+
+def test_opens_on_p99_latency(breaker):
+    for latency in (0.01, 0.01, 0.01, 0.5):
+        breaker.record(True, latency)
+    # a single slow call is the p99 of a small window, but does not open it
+    assert breaker.state == CLOSED
+
+    breaker.record(True, 0.5)
+    assert breaker.state == OPEN
+
+
+def test_p99_latency_needs_more_than_one_percent_of_slow_calls(clock):
+    breaker = CircuitBreaker(
+        name="test",
+        latency_threshold_seconds=0.2,
+        window_size=500,
+        minimum_calls=500,
+        minimum_slow_calls=2,
+        clock=clock,
+    )
+    for index in range(500):
+        breaker.record(True, 0.5 if index % 100 == 99 else 0.01)
+    assert breaker.state == CLOSED
+
+    breaker.record(True, 0.5)
+    assert breaker.state == OPEN
+
+
+def test_stays_closed_below_minimum_calls(breaker):
+    breaker.record(False, 0.01)
+    breaker.record(False, 0.01)
+
+    assert breaker.state == CLOSED
+
+
+def test_half_open_probe_closes_breaker(breaker, clock):
+    for _ in range(4):
+        breaker.record(False, 0.01)
+    assert breaker.state == OPEN
+
+    clock.now = 5
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    # only a single probe is let through while half open
+    assert not breaker.allow_request()
+
+    breaker.record(True, 0.01)
+    assert breaker.state == CLOSED
+    assert breaker.allow_request()
+
+
+def test_half_open_probe_failure_reopens_breaker(breaker, clock):
+    for _ in range(4):
+        breaker.record(False, 0.01)
+
+    clock.now = 5
+    assert breaker.allow_request()
+    breaker.record(False, 0.01)
+
+    assert breaker.state == OPEN
+    clock.now = 9
+    assert not breaker.allow_request()
+
+
+def test_call(breaker):
+    assert breaker.call(lambda value: value * 2, 2) == 4
+
+    with pytest.raises(ValueError):
+        breaker.call(lambda: (_ for _ in ()).throw(ValueError("boom")))
+
+    breaker.state = OPEN
+    breaker._opened_at = 0
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: None)
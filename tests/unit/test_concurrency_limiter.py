@@ -0,0 +1,93 @@
+from utils.common.concurrency_limiter import AIMDConcurrencyLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_limiter(**options):
+    clock = FakeClock()
+    changes = []
+    limiter = AIMDConcurrencyLimiter(
+        **{
+            "initial_limit": 4,
+            "min_limit": 1,
+            "max_limit": 10,
+            "target_queue_seconds": 0.05,
+            "backoff_ratio": 0.5,
+            "cooldown_seconds": 1.0,
+            "on_change": changes.append,
+            "clock": clock,
+            **options,
+        }
+    )
+    return limiter, clock, changes
+
+
+def test_admits_up_to_the_limit():
+    limiter, _, _ = make_limiter()
+
+    assert [limiter.try_acquire() for _ in range(5)] == [True] * 4 + [False]
+    limiter.release()
+    assert limiter.try_acquire()
+
+
+def test_release_without_queue_time_keeps_limit():
+    limiter, _, changes = make_limiter()
+
+    limiter.try_acquire()
+    limiter.release(None)
+
+    assert limiter.limit == 4
+    assert limiter.in_flight == 0
+    assert changes == [4]
+
+
+def test_additive_increase_when_limit_in_use():
+    limiter, _, changes = make_limiter()
+
+    for _ in range(40):
+        admitted = 0
+        while limiter.try_acquire():
+            admitted += 1
+        for _ in range(admitted):
+            limiter.release(0.001)
+
+    assert limiter.limit == 10
+    assert changes == [4, 5, 6, 7, 8, 9, 10]
+
+
+def test_no_increase_when_limit_unused():
+    limiter, _, _ = make_limiter()
+
+    for _ in range(100):
+        limiter.try_acquire()
+        limiter.release(0.001)
+
+    assert limiter.limit == 4
+
+
+def test_multiplicative_decrease_once_per_cooldown():
+    limiter, clock, changes = make_limiter(initial_limit=8)
+
+    for _ in range(3):
+        limiter.try_acquire()
+    for _ in range(3):
+        limiter.release(0.5)
+    assert limiter.limit == 4
+
+    clock.now = 1.0
+    limiter.try_acquire()
+    limiter.release(0.5)
+    assert limiter.limit == 2
+
+    for _ in range(5):
+        clock.now += 1.0
+        limiter.try_acquire()
+        limiter.release(0.5)
+    assert limiter.limit == 1
+    assert changes == [8, 4, 2, 1]
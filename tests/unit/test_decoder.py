@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from boto3.dynamodb.types import TypeDeserializer
+
+from utils.dynamodb.benchmark_decoder import SCHEMA, deserialize_items, make_items
+from utils.dynamodb.decoder import ItemDecoder
+
+
+@pytest.fixture
+def decoder():
+    return ItemDecoder(SCHEMA)
+
+
+def test_decode_matches_type_deserializer(decoder):
+    items = make_items(5)
+
+    expected = deserialize_items(TypeDeserializer(), items)
+    records = decoder.decode_many(items)
+
+    for record, item in zip(records, expected):
+        assert record.artist == item["artist"]
+        assert record.plays == int(item["plays"])
+        assert record.rating == pytest.approx(float(item["rating"]))
+        assert record.explicit == item["explicit"]
+        assert isinstance(record.plays, int)
+        assert isinstance(record.rating, float)
+
+
+def test_decode_record_is_slotted(decoder):
+    record = decoder.decode(make_items(1)[0])
+
+    assert not hasattr(record, "__dict__")
+    with pytest.raises(AttributeError):
+        record.unknown = 1
+
+
+def test_decode_missing_attributes(decoder):
+    record = decoder.decode({"artist": {"S": "artist-1"}, "extra": {"S": "ignored"}})
+
+    assert record.artist == "artist-1"
+    assert record.song is None
+    assert record.plays is None
+    assert decoder.decode(None) is None
+
+
+def test_decode_responses(decoder):
+    items = make_items(3)
+
+    assert decoder.decode_get_item({"Item": items[0]}).song == "song-0"
+    assert decoder.decode_get_item({}) is None
+    assert [
+        record.song
+        for record in decoder.decode_batch_get_item(
+            {"Responses": {"music": items}, "UnprocessedKeys": {}}, "music"
+        )
+    ] == ["song-0", "song-1", "song-2"]
+    assert len(decoder.decode_scan({"Items": items, "Count": 3})) == 3
+
+
+def test_to_arrays(decoder):
+    items = make_items(3) + [{"artist": {"S": "artist-3"}, "plays": {"N": "1e3"}}]
+
+    columns = decoder.to_arrays(items)
+
+    assert columns["plays"].dtype == np.int64
+    assert columns["plays"].tolist() == [0, 10, 20, 1000]
+    assert columns["rating"].dtype == np.float64
+    assert columns["rating"].mask.tolist() == [False, False, False, True]
+    assert columns["song"].tolist() == ["song-0", "song-1", "song-2", None]
+    assert columns["explicit"].tolist() == [True, False, True, None]
+
+
+def test_numbers_decoded_exactly():
+    decoder = ItemDecoder({"plays": int})
+    items = [
+        {"plays": {"N": "9007199254740993"}},
+        {"plays": {"N": "9.007199254740993e15"}},
+    ]
+
+    assert [record.plays for record in decoder.decode_many(items)] == [
+        2**53 + 1,
+        2**53 + 1,
+    ]
+    assert decoder.to_arrays(items)["plays"].tolist() == [2**53 + 1, 2**53 + 1]
+
+    with pytest.raises(ValueError):
+        decoder.decode({"plays": {"N": "1.5"}})
+    with pytest.raises(ValueError):
+        decoder.to_arrays([{"plays": {"N": "1.5"}}])
+    with pytest.raises(OverflowError):
+        decoder.to_arrays([{"plays": {"N": str(2**63)}}])
+
+
+def test_unsupported_schema_type():
+    with pytest.raises(ValueError):
+        ItemDecoder({"tags": list})
@@ -4,10 +4,14 @@ import pytest
 from unittest.mock import Mock, patch, MagicMock, call
 
 from download_models import (
+    MANIFEST_FILE_NAME,
     load_config,
     list_model_objects,
     download_model,
     download_models,
+    is_up_to_date,
+    load_manifest,
+    manifest_entry,
 )
 
 
@@ -205,3 +209,84 @@ def test_download_models_with_multiple_files(
     ]
     download_models()
     assert mock_download_model.call_count == 10
+
+
+def test_list_model_objects_follows_pagination(mock_s3_client):
+    mock_s3_client.list_objects_v2.side_effect = [
+        {
+            "Contents": [{"Key": f"test-prefix/file{i}.pickle"} for i in range(1000)],
+            "IsTruncated": True,
+            "NextContinuationToken": "token-1",
+        },
+        {"Contents": [{"Key": "test-prefix/file1000.pickle"}], "IsTruncated": False},
+    ]
+
+    objects = list_model_objects(mock_s3_client, "test-bucket", "test-prefix")
+
+    assert len(objects) == 1001
+    mock_s3_client.list_objects_v2.assert_called_with(
+        Bucket="test-bucket", Prefix="test-prefix", ContinuationToken="token-1"
+    )
+
+
+def make_s3_object(key, etag, size):
+    return {
+        "Key": key,
+        "ETag": etag,
+        "Size": size,
+        "LastModified": "2024-01-01 00:00:00+00:00",
+    }
+
+
+@patch("download_models.boto3.client")
+@patch("download_models.load_config")
+def test_download_models_skips_unchanged_models(
+    mock_load_config, mock_boto3_client, tmp_path
+):
+    mock_config = MagicMock()
+    mock_config.get.side_effect = lambda section, option: {
+        ("S3", "bucket"): "test-bucket",
+        ("S3", "dir"): "models",
+        ("Model", "dest_dir"): str(tmp_path),
+    }[(section, option)]
+    mock_load_config.return_value = mock_config
+
+    s3_client = mock_boto3_client.return_value
+    s3_client.list_objects_v2.return_value = {
+        "Contents": [
+            make_s3_object("models/a.pickle", '"etag-a"', 1),
+            make_s3_object("models/b.pickle", '"etag-b"', 2),
+        ]
+    }
+
+    def download_file(bucket, key, dest_path, Config=None):
+        with open(dest_path, "wb") as f:
+            f.write(b"x" * (1 if key.endswith("a.pickle") else 2))
+
+    s3_client.download_file.side_effect = download_file
+
+    download_models()
+    assert s3_client.download_file.call_count == 2
+    assert load_manifest(str(tmp_path / MANIFEST_FILE_NAME))["models/a.pickle"] == {
+        "etag": '"etag-a"',
+        "size": 1,
+        "last_modified": "2024-01-01 00:00:00+00:00",
+    }
+
+    s3_client.download_file.reset_mock()
+    download_models()
+    s3_client.download_file.assert_not_called()
+
+    s3_client.list_objects_v2.return_value["Contents"][1]["ETag"] = '"etag-b2"'
+    download_models()
+    assert s3_client.download_file.call_count == 1
+    assert s3_client.download_file.call_args.args[1] == "models/b.pickle"
+
+
+def test_is_up_to_date_when_local_file_is_missing(tmp_path):
+    obj = make_s3_object("models/a.pickle", '"etag-a"', 1)
+    manifest = {"models/a.pickle": manifest_entry(obj)}
+
+    assert not is_up_to_date(obj, manifest, str(tmp_path / "a.pickle"))
+    (tmp_path / "a.pickle").write_bytes(b"x")
+    assert is_up_to_date(obj, manifest, str(tmp_path / "a.pickle"))
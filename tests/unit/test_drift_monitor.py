@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from prometheus_client import REGISTRY
+
+from utils.monitoring.drift_monitor import (
+    DriftMonitor,
+    build_baseline,
+    load_baseline,
+    parse_baseline,
+    population_stability_index,
+    save_baseline,
+)
+
+NAMES = ["drift_a", "drift_b"]
+
+
+@pytest.fixture
+def training():
+    return np.random.default_rng(0).normal([5.0, 1.0], [1.0, 0.2], size=(2000, 2))
+
+
+@pytest.fixture
+def baselines(training, tmp_path):
+    path = tmp_path / "baseline.json"
+    save_baseline(build_baseline(training, NAMES), str(path))
+    return load_baseline(str(path), NAMES)
+
+
+def test_baseline(baselines):
+    assert [baseline.name for baseline in baselines] == NAMES
+    for baseline in baselines:
+        assert baseline.proportions.sum() == pytest.approx(1)
+        assert len(baseline.proportions) == len(baseline.edges) + 1
+    assert baselines[0].mean == pytest.approx(5.0, abs=0.1)
+    assert baselines[1].std == pytest.approx(0.2, abs=0.02)
+
+
+def test_baseline_matched_by_name(training):
+    baseline = build_baseline(training, NAMES)
+
+    reordered = parse_baseline(baseline, NAMES[::-1])
+
+    assert [feature.name for feature in reordered] == NAMES[::-1]
+    assert reordered[0].mean == pytest.approx(1.0, abs=0.1)
+    with pytest.raises(ValueError, match="drift_c"):
+        parse_baseline(baseline, NAMES + ["drift_c"])
+
+
+def test_population_stability_index():
+    expected = np.array([0.25, 0.25, 0.5])
+
+    assert population_stability_index(expected, expected) == 0
+    assert population_stability_index(expected, np.array([0.5, 0.5, 0])) > 0.25
+
+
+def test_same_distribution_does_not_drift(baselines):
+    monitor = DriftMonitor(baselines, window_size=10**6)
+    served = np.random.default_rng(1).normal([5.0, 1.0], [1.0, 0.2], size=(5000, 2))
+
+    monitor.update(served)
+    scores = monitor.scores()
+
+    assert scores["drift_a"]["psi"] < 0.05
+    assert abs(scores["drift_a"]["mean_shift"]) < 0.1
+    assert scores["drift_b"]["std_ratio"] == pytest.approx(1, abs=0.1)
+
+
+def test_moments_merged_across_batches(baselines):
+    monitor = DriftMonitor(baselines, window_size=10**6)
+    served = np.random.default_rng(2).normal([6.0, 1.0], [2.0, 0.2], size=(999, 2))
+
+    for batch in np.array_split(served, 7):
+        monitor.update(batch)
+    scores = monitor.scores()["drift_a"]
+
+    assert scores["mean_shift"] * baselines[0].std + baselines[0].mean == (
+        pytest.approx(served[:, 0].mean())
+    )
+    assert scores["std_ratio"] * baselines[0].std == pytest.approx(served[:, 0].std())
+
+
+def test_window_exported_and_reset(baselines):
+    monitor = DriftMonitor(baselines, window_size=8, batch_size=4)
+
+    for _ in range(7):
+        monitor.observe([8.0, 1.0])
+    assert monitor.scores()["drift_a"]["mean_shift"] > 2
+    monitor.observe([8.0, 1.0])
+
+    assert monitor.scores() == {}
+    psi = REGISTRY.get_sample_value(
+        "bentoml_service_feature_drift_psi", {"feature": "drift_a"}
+    )
+    assert psi > 0.25
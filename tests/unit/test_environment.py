@@ -0,0 +1,13 @@
+from unittest.mock import patch
+
+from utils.common import environment
+
+
+def test_load_environment_parses_dotenv_once():
+    environment.load_environment.cache_clear()
+    with patch.object(environment, "load_dotenv", return_value=True) as load_dotenv:
+        assert environment.load_environment()
+        assert environment.load_environment()
+
+    load_dotenv.assert_called_once_with()
+    environment.load_environment.cache_clear()
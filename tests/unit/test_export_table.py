@@ -0,0 +1,174 @@
+import os
+from unittest.mock import Mock, patch
+
+import numpy as np
+import pytest
+
+from utils.dynamodb.export_table import (
+    SnapshotError,
+    TableSnapshot,
+    decode_items_to_columns,
+    export_table,
+    parallel_scan,
+    scan_segment,
+    write_snapshot,
+)
+
+
+def make_item(index):
+    return {
+        "artist": {"S": f"artist-{index}"},
+        "song": {"S": f"song-{index}"},
+        "plays": {"N": str(index * 10)},
+    }
+
+
+def test_scan_segment_follows_pagination():
+    client = Mock()
+    client.scan.side_effect = [
+        {"Items": [make_item(1)], "LastEvaluatedKey": {"artist": {"S": "artist-1"}}},
+        {"Items": [make_item(2)]},
+    ]
+
+    items = scan_segment(client, "music", segment=1, total_segments=4)
+
+    assert items == [make_item(1), make_item(2)]
+    assert client.scan.call_count == 2
+    assert client.scan.call_args_list[1].kwargs["ExclusiveStartKey"] == {
+        "artist": {"S": "artist-1"}
+    }
+    assert client.scan.call_args_list[1].kwargs["Segment"] == 1
+    assert client.scan.call_args_list[1].kwargs["TotalSegments"] == 4
+
+
+def test_parallel_scan_scans_every_segment():
+    client = Mock()
+    client.scan.side_effect = lambda **kwargs: {"Items": [make_item(kwargs["Segment"])]}
+
+    items = parallel_scan(client, "music", total_segments=3)
+
+    assert sorted(item["song"]["S"] for item in items) == [
+        "song-0",
+        "song-1",
+        "song-2",
+    ]
+
+
+def test_decode_items_to_columns():
+    items = [
+        {"name": {"S": "a"}, "count": {"N": "1"}, "score": {"N": "1.5"}},
+        {"name": {"S": "b"}, "count": {"N": "2"}, "active": {"BOOL": True}},
+    ]
+
+    columns = decode_items_to_columns(items)
+
+    assert columns["name"].tolist() == ["a", "b"]
+    assert columns["count"].dtype == np.int64
+    assert columns["count"].tolist() == [1, 2]
+    assert columns["score"].dtype == np.float64
+    assert columns["score"].tolist() == [1.5, None]
+    assert columns["active"].tolist() == [None, True]
+
+
+def test_decode_keeps_large_numbers_exact():
+    items = [
+        {"id": {"N": str(2**63 - 1)}, "score": {"N": "0.1"}},
+        {"score": {"NULL": True}},
+    ]
+
+    columns = decode_items_to_columns(items)
+
+    assert columns["id"].dtype == np.int64
+    assert columns["id"].tolist() == [2**63 - 1, None]
+    assert columns["score"].tolist() == [0.1, None]
+
+
+@pytest.mark.parametrize(
+    "items",
+    [
+        [{"id": {"N": "1"}}, {"id": {"S": "1"}}],
+        [{"id": {"N": str(2**63)}}],
+        [{"id": {"N": "1.00000000000000000001"}}],
+    ],
+)
+def test_decode_rejects_lossy_columns(items):
+    with pytest.raises(SnapshotError):
+        decode_items_to_columns(items)
+
+
+def test_export_table_and_load_snapshot(tmp_path):
+    client = Mock()
+    client.describe_table.return_value = {
+        "Table": {
+            "KeySchema": [
+                {"AttributeName": "artist", "KeyType": "HASH"},
+                {"AttributeName": "song", "KeyType": "RANGE"},
+            ]
+        }
+    }
+    client.scan.side_effect = lambda **kwargs: {"Items": [make_item(kwargs["Segment"])]}
+    output_dir = str(tmp_path / "music")
+
+    manifest = export_table(
+        "music", output_dir, total_segments=2, dynamodb_client=client
+    )
+
+    assert manifest["row_count"] == 2
+    assert manifest["key_attributes"] == ["artist", "song"]
+
+    snapshot = TableSnapshot(output_dir)
+    assert len(snapshot) == 2
+    assert isinstance(snapshot.columns["plays"], np.memmap)
+    assert snapshot.get({"artist": "artist-1", "song": "song-1"}) == {
+        "artist": "artist-1",
+        "song": "song-1",
+        "plays": 10,
+    }
+    assert snapshot.get({"artist": "artist-1", "song": "song-2"}) is None
+
+
+def test_snapshot_file_names_do_not_come_from_attributes(tmp_path):
+    items = [
+        {"id": {"S": "a"}, "../escaped": {"N": "1"}, "a/b": {"BOOL": True}},
+        {"id": {"S": "b"}},
+    ]
+    output_dir = str(tmp_path / "snapshots" / "table")
+
+    write_snapshot(decode_items_to_columns(items), output_dir, "table", ["id"])
+
+    assert sorted(os.listdir(output_dir)) == [
+        "column-0.mask.npy",
+        "column-0.npy",
+        "column-1.mask.npy",
+        "column-1.npy",
+        "column-2.npy",
+        "manifest.json",
+    ]
+    assert not (tmp_path / "snapshots" / "escaped.npy").exists()
+    snapshot = TableSnapshot(output_dir)
+    assert snapshot.get({"id": "a"}) == {"id": "a", "../escaped": 1, "a/b": True}
+    assert snapshot.get({"id": "b"}) == {"id": "b"}
+
+
+def test_failed_snapshot_keeps_the_previous_one(tmp_path):
+    output_dir = str(tmp_path / "table")
+    write_snapshot(
+        decode_items_to_columns([{"id": {"S": "a"}}]), output_dir, "table", ["id"]
+    )
+
+    with patch("utils.dynamodb.export_table.json.dump", side_effect=OSError):
+        with pytest.raises(OSError):
+            write_snapshot(
+                decode_items_to_columns([{"id": {"S": "b"}}]),
+                output_dir,
+                "table",
+                ["id"],
+            )
+    assert TableSnapshot(output_dir).get({"id": "a"}) == {"id": "a"}
+
+    write_snapshot(
+        decode_items_to_columns([{"id": {"S": "b"}}]), output_dir, "table", ["id"]
+    )
+    assert TableSnapshot(output_dir).get({"id": "b"}) == {"id": "b"}
+    # the previous snapshot is removed once replaced
+    assert len(os.listdir(tmp_path)) == 2
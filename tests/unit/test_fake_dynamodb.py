@@ -0,0 +1,125 @@
+import pytest
+from botocore.exceptions import ClientError
+
+from utils.dynamodb.circuit_breaker import OPEN, CircuitBreaker
+from utils.dynamodb.export_table import parallel_scan
+from utils.dynamodb.fake_dynamodb import FakeDynamoDBClient, constant_latency
+
+KEY_SCHEMA = [
+    {"AttributeName": "artist", "KeyType": "HASH"},
+    {"AttributeName": "song", "KeyType": "RANGE"},
+]
+
+
+def make_item(index):
+    return {
+        "artist": {"S": f"artist-{index}"},
+        "song": {"S": f"song-{index}"},
+        "publisher": {"S": f"publisher-{index}"},
+    }
+
+
+def make_key(index):
+    return {"artist": {"S": f"artist-{index}"}, "song": {"S": f"song-{index}"}}
+
+
+def make_client(items=10, **kwargs):
+    client = FakeDynamoDBClient(seed=42, **kwargs)
+    client.create_table(TableName="music", KeySchema=KEY_SCHEMA)
+    for index in range(items):
+        client.put_item(TableName="music", Item=make_item(index))
+    return client
+
+
+def test_get_item():
+    client = make_client()
+
+    assert client.get_item(TableName="music", Key=make_key(1)) == {"Item": make_item(1)}
+    assert client.get_item(TableName="music", Key=make_key(99)) == {}
+
+
+def test_create_existing_table_and_missing_table():
+    client = make_client()
+
+    with pytest.raises(ClientError) as exc_info:
+        client.create_table(TableName="music", KeySchema=KEY_SCHEMA)
+    assert exc_info.value.response["Error"]["Code"] == "ResourceInUseException"
+
+    with pytest.raises(ClientError) as exc_info:
+        client.get_item(TableName="unknown", Key=make_key(1))
+    assert exc_info.value.response["Error"]["Code"] == "ResourceNotFoundException"
+
+
+def test_batch_get_item_with_unprocessed_keys():
+    client = make_client(unprocessed_rate=0.5)
+    keys = [make_key(index) for index in range(10)]
+
+    response = client.batch_get_item(RequestItems={"music": {"Keys": keys}})
+
+    found = response["Responses"]["music"]
+    unprocessed = response["UnprocessedKeys"]["music"]["Keys"]
+    assert found and unprocessed
+    assert len(found) + len(unprocessed) == 10
+
+    with pytest.raises(ClientError):
+        client.batch_get_item(RequestItems={"music": {"Keys": keys * 11}})
+
+
+def test_batch_write_item():
+    client = make_client(items=0)
+
+    response = client.batch_write_item(
+        RequestItems={
+            "music": [{"PutRequest": {"Item": make_item(index)}} for index in range(3)]
+        }
+    )
+    assert response == {"UnprocessedItems": {}}
+
+    client.batch_write_item(
+        RequestItems={"music": [{"DeleteRequest": {"Key": make_key(0)}}]}
+    )
+    assert client.get_item(TableName="music", Key=make_key(0)) == {}
+    assert client.describe_table(TableName="music")["Table"]["ItemCount"] == 2
+
+
+def test_scan_pagination_and_segments():
+    client = make_client(items=25)
+
+    first_page = client.scan(TableName="music", Limit=10)
+    assert first_page["Count"] == 10
+    second_page = client.scan(
+        TableName="music", Limit=10, ExclusiveStartKey=first_page["LastEvaluatedKey"]
+    )
+    assert second_page["Items"][0] != first_page["Items"][-1]
+
+    items = parallel_scan(client, "music", total_segments=4, page_size=3)
+    assert sorted(item["song"]["S"] for item in items) == sorted(
+        f"song-{index}" for index in range(25)
+    )
+
+
+def test_latency_injection():
+    sleeps = []
+    client = make_client(latency=constant_latency(0.01), sleep=sleeps.append)
+    sleeps.clear()
+
+    client.get_item(TableName="music", Key=make_key(1))
+
+    assert sleeps == [0.01]
+    assert client.call_counts["GetItem"] == 1
+
+
+def test_throttling_opens_circuit_breaker():
+    client = make_client(items=1)
+    client.throttle_rate = 1.0
+    breaker = CircuitBreaker(name="fake", minimum_calls=5, window_size=5)
+
+    for _ in range(5):
+        with pytest.raises(ClientError) as exc_info:
+            breaker.call(client.get_item, TableName="music", Key=make_key(0))
+        assert (
+            exc_info.value.response["Error"]["Code"]
+            == "ProvisionedThroughputExceededException"
+        )
+
+    assert breaker.state == OPEN
@@ -0,0 +1,26 @@
+import pytest
+
+from utils.common.fallback import (
+    ADMISSION,
+    ADMISSION_UTILIZATION_KEY,
+    QUEUE_TIME,
+    fallback_reason,
+)
+from utils.common.settings import Settings
+from utils.monitoring.runtime_metrics import QUEUE_WAIT_SECONDS_KEY
+
+SETTINGS = Settings(fallback_queue_ms=100, fallback_admission_utilization=0.9)
+
+
+@pytest.mark.parametrize(
+    "scope, reason",
+    [
+        ({}, None),
+        ({QUEUE_WAIT_SECONDS_KEY: 0.05, ADMISSION_UTILIZATION_KEY: 0.5}, None),
+        ({QUEUE_WAIT_SECONDS_KEY: 0.2}, QUEUE_TIME),
+        ({ADMISSION_UTILIZATION_KEY: 0.9}, ADMISSION),
+        ({QUEUE_WAIT_SECONDS_KEY: 0.2, ADMISSION_UTILIZATION_KEY: 1.0}, QUEUE_TIME),
+    ],
+)
+def test_fallback_reason(scope, reason):
+    assert fallback_reason(scope, SETTINGS) == reason
@@ -0,0 +1,104 @@
+from unittest.mock import Mock, patch
+
+import pytest
+from botocore.exceptions import ClientError
+
+from utils.common.latency_budget import set_latency_budget
+from utils.dynamodb import fetch_data
+from utils.dynamodb.circuit_breaker import CircuitBreaker
+from utils.dynamodb.fetch_data import StaleCache, fetch_data_from_dynamodb
+
+QUERY = {"artist": {"S": "artist-1"}, "song": {"S": "song-1"}}
+ITEM = {**QUERY, "publisher": {"S": "publisher-1"}}
+
+
+@pytest.fixture
+def dynamodb_client():
+    client = Mock()
+    with (
+        patch.object(fetch_data, "get_dynamodb_client", return_value=client),
+        patch.object(fetch_data, "stale_cache", StaleCache(10)),
+        patch.object(
+            fetch_data,
+            "circuit_breaker",
+            CircuitBreaker(name="test", minimum_calls=2, window_size=2),
+        ),
+    ):
+        yield client
+    set_latency_budget(None)
+
+
+def test_fetch_data(dynamodb_client):
+    dynamodb_client.get_item.return_value = {"Item": ITEM}
+
+    assert fetch_data_from_dynamodb("music", QUERY) == ITEM
+    dynamodb_client.get_item.assert_called_once_with(TableName="music", Key=QUERY)
+
+
+def test_fetch_data_client_error_returns_stale_item(dynamodb_client):
+    dynamodb_client.get_item.return_value = {"Item": ITEM}
+    fetch_data_from_dynamodb("music", QUERY)
+
+    dynamodb_client.get_item.side_effect = ClientError(
+        {"Error": {"Code": "InternalServerError", "Message": "boom"}}, "GetItem"
+    )
+
+    assert fetch_data_from_dynamodb("music", QUERY) == ITEM
+    assert fetch_data_from_dynamodb("music", {"artist": {"S": "other"}}) is None
+
+
+@pytest.mark.parametrize(
+    "code, status_code, is_failure",
+    [
+        ("InternalServerError", 500, True),
+        ("ProvisionedThroughputExceededException", 400, True),
+        ("ValidationException", 400, False),
+        ("ResourceNotFoundException", 400, False),
+    ],
+)
+def test_only_service_failures_open_the_circuit(
+    dynamodb_client, code, status_code, is_failure
+):
+    dynamodb_client.get_item.side_effect = ClientError(
+        {
+            "Error": {"Code": code, "Message": "boom"},
+            "ResponseMetadata": {"HTTPStatusCode": status_code},
+        },
+        "GetItem",
+    )
+
+    fetch_data_from_dynamodb("music", QUERY)
+    fetch_data_from_dynamodb("music", QUERY)
+    fetch_data_from_dynamodb("music", QUERY)
+
+    assert dynamodb_client.get_item.call_count == (2 if is_failure else 3)
+
+
+def test_fetch_data_fails_fast_when_circuit_open(dynamodb_client):
+    dynamodb_client.get_item.side_effect = Exception("timeout")
+
+    fetch_data_from_dynamodb("music", QUERY)
+    fetch_data_from_dynamodb("music", QUERY)
+    assert dynamodb_client.get_item.call_count == 2
+
+    assert fetch_data_from_dynamodb("music", QUERY) is None
+    assert dynamodb_client.get_item.call_count == 2
+
+
+def test_fetch_data_skipped_when_budget_exhausted(dynamodb_client):
+    set_latency_budget(0)
+
+    assert fetch_data_from_dynamodb("music", QUERY) is None
+    dynamodb_client.get_item.assert_not_called()
+
+
+def test_stale_cache_evicts_least_recently_used():
+    cache = StaleCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
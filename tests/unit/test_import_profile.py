@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from utils.monitoring.import_profile import (
+    format_report,
+    parse_importtime,
+    profile_import,
+)
+
+# Regression thresholds, raise them on slower machines
+IMPORT_TIME_BUDGET_SECONDS = float(os.getenv("IMPORT_TIME_BUDGET_SECONDS", 5))
+WORKER_RSS_BUDGET_MB = float(os.getenv("WORKER_RSS_BUDGET_MB", 250))
+
+SERVICE_ENV = {"MODEL_RELOAD_INTERVAL_SECONDS": "0"}
+
+
+def test_parse_importtime():
+    stderr = "\n".join(
+        [
+            "import time: self [us] | cumulative | imported package",
+            "import time:       100 |        150 |     numpy.core",
+            "import time:       200 |       2000 |   numpy",
+            "import time:        50 |         50 | json",
+        ]
+    )
+
+    assert parse_importtime(stderr) == {"numpy": 0.002, "json": 0.00005}
+
+
+def test_service_cold_start():
+    profile = profile_import("service", env=SERVICE_ENV)
+    print(format_report("service", profile))
+
+    assert profile.import_seconds < IMPORT_TIME_BUDGET_SECONDS
+    # modules which are not needed on the serve path stay deferred
+    for module in ["boto3", "sklearn", "IPython"]:
+        assert module not in profile.modules
+
+
+@pytest.mark.skipif(
+    not os.path.exists("./models/iris.pickle"), reason="the model is not trained"
+)
+def test_worker_baseline_rss():
+    profile = profile_import(
+        "service",
+        statement="service.IrisClassifierService.inner()",
+        env=SERVICE_ENV,
+    )
+    print(format_report("service", profile))
+
+    assert profile.max_rss_mb < WORKER_RSS_BUDGET_MB
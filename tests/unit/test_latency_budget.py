@@ -0,0 +1,66 @@
+import time
+
+import pytest
+
+from utils.common.latency_budget import (
+    budget_exhausted,
+    deadline_exceeded,
+    parse_timeout_ms,
+    remaining_budget,
+    start_request_budget,
+)
+from utils.common.settings import reload_settings
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    def configure(**environment):
+        for name, value in environment.items():
+            monkeypatch.setenv(name, value)
+        reload_settings()
+
+    return configure
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("250", 250.0), (" 1.5", 1.5), ("-3", 0.0), ("soon", None), ("nan", None)],
+)
+def test_parse_timeout_ms(value, expected):
+    assert parse_timeout_ms(value) == expected
+
+
+def test_no_deadline_by_default(settings):
+    settings()
+
+    start_request_budget("/api/v1/predict")
+
+    assert remaining_budget() is None
+    assert not deadline_exceeded()
+
+
+def test_header_bounded_by_route_timeout(settings):
+    settings(REQUEST_ROUTE_TIMEOUTS_MS="/api/v1/predict=100")
+
+    start_request_budget("/api/v1/predict", "5000")
+    assert 0.09 < remaining_budget() <= 0.1
+
+    start_request_budget("/api/v1/predict", "10")
+    assert remaining_budget() <= 0.01
+
+    start_request_budget("/readyz", None)
+    assert remaining_budget() is None
+
+
+def test_latency_budget_ends_by_the_deadline(settings):
+    settings(REQUEST_LATENCY_BUDGET_MS="1000")
+
+    start_request_budget("/api/v1/predict", "10")
+    time.sleep(0.02)
+
+    assert budget_exhausted()
+    assert deadline_exceeded()
+
+    start_request_budget("/api/v1/predict", None)
+    assert not budget_exhausted()
+    assert not deadline_exceeded()
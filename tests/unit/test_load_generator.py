@@ -0,0 +1,157 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from utils.common.request_corpus import CorpusRequest
+from utils.common.settings import reload_settings
+from utils.load_testing.load_generator import (
+    IRIS_FEATURE_RANGES,
+    Outcome,
+    build_report,
+    compare_reports,
+    percentile,
+    run_closed_loop,
+    run_open_loop,
+    serve_in_process,
+    synthesize_requests,
+)
+
+
+@pytest.fixture(autouse=True)
+def jwt_secret(monkeypatch):
+    monkeypatch.setenv("JWT_SECRET", "test_secret")
+    reload_settings()
+
+
+def make_app(delay_seconds=0.0, lifespan_events=None):
+    async def predict(request):
+        body = await request.json()
+        if "Authorization" not in request.headers:
+            return JSONResponse({"message": "Unauthorized"}, status_code=401)
+        await asyncio.sleep(delay_seconds)
+        if body.get("fail"):
+            return JSONResponse({"message": "Internal Server Error"}, status_code=500)
+        return JSONResponse({"prediction": 0})
+
+    async def lifespan(app):
+        if lifespan_events is not None:
+            lifespan_events.append("startup")
+        yield
+        if lifespan_events is not None:
+            lifespan_events.append("shutdown")
+
+    return Starlette(
+        routes=[Route("/api/v1/predict", predict, methods=["POST"])],
+        lifespan=lifespan,
+    )
+
+
+def client_for(app):
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    )
+
+
+def test_synthesized_requests_are_iris_shaped():
+    requests = synthesize_requests(100, seed=1)
+
+    assert requests == synthesize_requests(100, seed=1)
+    for request in requests:
+        assert request.route == "/api/v1/predict"
+        for name, (low, high) in IRIS_FEATURE_RANGES.items():
+            assert low <= request.body[name] <= high
+
+
+def test_percentile_nearest_rank():
+    values = [float(value) for value in range(1, 1001)]
+
+    assert percentile(values, 50) == 500
+    assert percentile(values, 99) == 990
+    assert percentile(values, 99.9) == 999
+    assert percentile([1.0], 99.9) == 1.0
+    assert percentile([], 50) == 0.0
+
+
+async def test_closed_loop_counts_requests_and_errors():
+    requests = [
+        CorpusRequest("/api/v1/predict", {"fail": False}),
+        CorpusRequest("/api/v1/predict", {"fail": True}),
+    ]
+
+    async with client_for(make_app()) as client:
+        outcome = await run_closed_loop(client, requests, 4, total_requests=50)
+
+    report = build_report(outcome, {"mode": "closed"})
+    assert report["requests"] == 50
+    assert report["errors"] == 25
+    assert report["error_rate"] == 0.5
+    assert report["status_codes"] == {"200": 25, "500": 25}
+    assert set(report["latency_seconds"]) == {
+        "p50",
+        "p90",
+        "p99",
+        "p99.9",
+        "mean",
+        "max",
+    }
+    assert report["throughput_rps"] > 0
+
+
+async def test_open_loop_keeps_arrival_rate():
+    requests = synthesize_requests(10)
+
+    async with client_for(make_app(delay_seconds=0.05)) as client:
+        start = time.perf_counter()
+        outcome = await run_open_loop(client, requests, rate=100, duration_seconds=0.3)
+        elapsed = time.perf_counter() - start
+
+    assert len(outcome.latencies) == 30
+    # the arrivals do not wait for the responses
+    assert elapsed < 0.3 + 0.05 * 3
+    assert min(outcome.latencies) >= 0.05
+
+
+async def test_open_loop_drops_arrivals_over_the_limit():
+    async with client_for(make_app(delay_seconds=0.2)) as client:
+        outcome = await run_open_loop(
+            client,
+            synthesize_requests(1),
+            rate=100,
+            duration_seconds=0.1,
+            max_in_flight=3,
+        )
+
+    assert outcome.status_codes["dropped"] == 7
+    assert len(outcome.latencies) == 3
+    assert outcome.errors == 7
+
+
+async def test_serve_in_process_runs_lifespan():
+    events = []
+
+    async with serve_in_process(make_app(lifespan_events=events)) as client:
+        assert events == ["startup"]
+        response = await client.post(
+            "/api/v1/predict", json={}, headers={"Authorization": "token"}
+        )
+
+    assert response.json() == {"prediction": 0}
+    assert events == ["startup", "shutdown"]
+
+
+def test_compare_reports():
+    outcome = Outcome(started_at=0, finished_at=1)
+    outcome.record("200", False, 0.1)
+    outcome.record("200", False, 0.2)
+    baseline = build_report(outcome, {})
+    report = dict(baseline, throughput_rps=baseline["throughput_rps"] * 0.5)
+
+    comparison = compare_reports(baseline, report)
+
+    assert comparison["throughput_rps"] == -0.5
+    assert comparison["latency_p50"] == 0.0
@@ -0,0 +1,195 @@
+import errno
+import hashlib
+import os
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import download_models
+from utils.model_cache.blob_cache import BlobCache, ChecksumMismatchError, link_into
+from utils.model_cache.local_store import LocalDirectoryS3Client
+
+
+def etag_of(content: bytes) -> str:
+    return f'"{hashlib.md5(content).hexdigest()}"'
+
+
+def writer(content: bytes, calls=None):
+    def download(path):
+        if calls is not None:
+            calls.append(path)
+        with open(path, "wb") as f:
+            f.write(content)
+
+    return download
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return BlobCache(str(tmp_path / "cache"), max_bytes=1024)
+
+
+def test_fetch_downloads_once(cache):
+    calls = []
+    content = b"model-a"
+
+    first = cache.fetch(etag_of(content), writer(content, calls))
+    second = cache.fetch(etag_of(content), writer(content, calls))
+
+    assert first == second
+    assert len(calls) == 1
+    assert os.path.basename(first) == hashlib.sha256(content).hexdigest()
+    assert open(first, "rb").read() == content
+
+
+def test_concurrent_fetch_downloads_once(cache):
+    calls = []
+    content = b"model-b"
+
+    def slow_download(path):
+        time.sleep(0.05)
+        writer(content, calls)(path)
+
+    threads = [
+        threading.Thread(target=cache.fetch, args=(etag_of(content), slow_download))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+
+
+def test_fetch_checksum_mismatch(cache):
+    with pytest.raises(ChecksumMismatchError):
+        cache.fetch(etag_of(b"expected"), writer(b"corrupted"))
+
+    with pytest.raises(ChecksumMismatchError):
+        cache.fetch("multipart-2", writer(b"model"), expected_sha256="0" * 64)
+
+    assert cache.lookup(etag_of(b"expected")) is None
+    assert os.listdir(os.path.join(cache.root_dir, "tmp")) == []
+
+
+def test_collect_garbage_removes_least_recently_used(cache):
+    old = cache.fetch(etag_of(b"a" * 600), writer(b"a" * 600))
+    os.utime(old, (0, 0))
+    new = cache.fetch(etag_of(b"b" * 600), writer(b"b" * 600))
+
+    assert not os.path.exists(old)
+    assert os.path.exists(new)
+    assert cache.lookup(etag_of(b"a" * 600)) is None
+
+
+def test_link_into_replaces_existing_file(cache, tmp_path):
+    blob = cache.fetch(etag_of(b"model"), writer(b"model"))
+    dest_path = tmp_path / "iris.pickle"
+    dest_path.write_bytes(b"old")
+
+    link_into(blob, str(dest_path))
+
+    assert dest_path.read_bytes() == b"model"
+    assert os.path.samefile(blob, dest_path)
+
+
+def test_link_into_only_falls_back_to_symlink_across_file_systems(cache, tmp_path):
+    dest_path = tmp_path / "iris.pickle"
+
+    with pytest.raises(FileNotFoundError):
+        link_into(str(tmp_path / "missing"), str(dest_path))
+    assert not os.path.lexists(dest_path)
+
+    blob = cache.fetch(etag_of(b"model"), writer(b"model"))
+    with patch("os.link", side_effect=OSError(errno.EXDEV, "cross-device link")):
+        link_into(blob, str(dest_path))
+    assert os.path.islink(dest_path)
+    assert dest_path.read_bytes() == b"model"
+
+
+def test_collect_garbage_keeps_linked_blobs(cache, tmp_path):
+    dest_path = tmp_path / "iris.pickle"
+    with patch("os.link", side_effect=OSError(errno.EXDEV, "cross-device link")):
+        linked = cache.install(etag_of(b"a" * 600), writer(b"a" * 600), str(dest_path))
+    os.utime(linked, (0, 0))
+
+    cache.fetch(etag_of(b"b" * 600), writer(b"b" * 600))
+    assert os.path.exists(linked)
+
+    # the models directory now holds another model
+    dest_path.unlink()
+    dest_path.write_bytes(b"other")
+    cache.max_bytes = 0
+    cache.collect_garbage()
+    assert not os.path.exists(linked)
+    links_dir = os.path.join(cache.root_dir, "links", os.path.basename(linked))
+    assert not os.path.exists(links_dir)
+
+
+def test_collect_garbage_waits_for_fetches(cache):
+    blob = cache.fetch(etag_of(b"a" * 600), writer(b"a" * 600))
+    os.utime(blob, (0, 0))
+    cache.max_bytes = 0
+    collector = threading.Thread(target=cache.collect_garbage)
+
+    with cache._gc_lock(exclusive=False):
+        collector.start()
+        collector.join(0.1)
+        assert collector.is_alive()
+        assert os.path.exists(blob)
+    collector.join()
+
+    assert not os.path.exists(blob)
+
+
+def test_local_directory_s3_client_pagination(tmp_path):
+    for index in range(3):
+        path = tmp_path / "bucket" / "models" / f"model{index}.pickle"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"model")
+    client = LocalDirectoryS3Client(str(tmp_path))
+
+    objects = download_models.list_model_objects(client, "bucket", "models")
+    first_page = client.list_objects_v2(Bucket="bucket", Prefix="models", MaxKeys=2)
+
+    assert [obj["Key"] for obj in objects] == [
+        "models/model0.pickle",
+        "models/model1.pickle",
+        "models/model2.pickle",
+    ]
+    assert objects[0]["ETag"] == etag_of(b"model")
+    assert first_page["IsTruncated"]
+
+
+def test_download_models_links_from_cache(tmp_path):
+    model_path = tmp_path / "store" / "bucket" / "models" / "iris.pickle"
+    model_path.parent.mkdir(parents=True)
+    model_path.write_bytes(b"iris-model")
+
+    mock_config = MagicMock()
+    mock_config.get.side_effect = lambda section, option: {
+        ("S3", "bucket"): "bucket",
+        ("S3", "dir"): "models",
+        ("Model", "dest_dir"): str(tmp_path / "dest"),
+    }[(section, option)]
+
+    with (
+        patch("download_models.load_config", return_value=mock_config),
+        patch("download_models.MODEL_STORE_LOCAL_DIR", str(tmp_path / "store")),
+        patch("download_models.MODEL_CACHE_DIR", str(tmp_path / "cache")),
+    ):
+        download_models.download_models()
+
+    dest_path = tmp_path / "dest" / "iris.pickle"
+    assert dest_path.read_bytes() == b"iris-model"
+    assert os.path.samefile(
+        dest_path,
+        tmp_path
+        / "cache"
+        / "blobs"
+        / hashlib.sha256(b"iris-model").hexdigest()[:2]
+        / hashlib.sha256(b"iris-model").hexdigest(),
+    )
@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+from utils.model_reload.model_reloader import ModelReloader
+
+
+class FakeModel:
+    def __init__(self, name: str):
+        self.name = name
+        self.predict_calls = []
+
+    def predict(self, inputs):
+        if self.name == "broken":
+            raise ValueError("broken model")
+        self.predict_calls.append(inputs)
+        return [self.name]
+
+
+def load_fake_model(model_path):
+    with open(model_path) as model_file:
+        return FakeModel(model_file.read())
+
+
+def write_model(model_path, name, mtime):
+    model_path.write_text(name)
+    os.utime(model_path, (mtime, mtime))
+
+
+@pytest.fixture
+def model_path(tmp_path):
+    path = tmp_path / "model.pickle"
+    write_model(path, "v1", 1)
+    return path
+
+
+@pytest.fixture
+def reloader(model_path):
+    reloader = ModelReloader(
+        str(model_path),
+        service_name="TestService",
+        poll_interval_seconds=0,
+        warmup_inputs=[[1, 2, 3, 4]],
+        load_model=load_fake_model,
+    )
+    reloader.load()
+    return reloader
+
+
+def test_load_warms_up_model(reloader):
+    assert reloader.model.name == "v1"
+    assert reloader.model.predict_calls == [[[1, 2, 3, 4]], [[1, 2, 3, 4]]]
+    assert len(reloader.version) == 12
+
+
+def test_check_for_update_swaps_model(reloader, model_path):
+    swaps = []
+    reloader.add_swap_listener(lambda old, new: swaps.append((old, new)))
+    old_model = reloader.model
+
+    assert not reloader.check_for_update()
+
+    write_model(model_path, "v2", 2)
+    assert reloader.check_for_update()
+
+    assert reloader.model.name == "v2"
+    # in-flight requests keep their reference to the old model
+    assert old_model.name == "v1"
+    assert [(old.model.name, new.model.name) for old, new in swaps] == [("v1", "v2")]
+
+
+def test_check_for_update_keeps_model_when_warmup_fails(reloader, model_path):
+    write_model(model_path, "broken", 2)
+
+    assert not reloader.check_for_update()
+    assert reloader.model.name == "v1"
+
+
+def test_check_for_update_ignores_touched_file(reloader, model_path):
+    write_model(model_path, "v1", 2)
+
+    assert not reloader.check_for_update()
+
+
+def test_start_is_disabled_without_poll_interval(reloader):
+    reloader.start()
+
+    assert reloader._thread is None
@@ -0,0 +1,141 @@
+import asyncio
+from http import HTTPStatus
+
+import httpx
+import pytest
+from prometheus_client import REGISTRY
+
+from middlewares.admission_control import AdmissionControl
+from middlewares.priority_lanes import BULK, INTERACTIVE, PriorityLanes
+from middlewares.runtime_metrics import TrackQueuedRequests
+from utils.common.fallback import QUEUE_TIME, fallback_reason
+from utils.common.settings import Settings
+from utils.monitoring.runtime_metrics import request_started
+
+
+def scope(path="/api/v1/predict", headers=(), claims=None):
+    return {
+        "type": "http",
+        "path": path,
+        "headers": list(headers),
+        "state": {} if claims is None else {"jwt_claims": claims},
+    }
+
+
+@pytest.mark.parametrize(
+    "request_scope, lane",
+    [
+        (scope(), INTERACTIVE),
+        (scope(headers=[(b"x-priority", b"Bulk")]), BULK),
+        (scope(claims={"priority": "bulk"}), BULK),
+        (scope(path="/api/v1/predict_batch"), BULK),
+        # clients cannot move their requests out of the bulk lane
+        (
+            scope(
+                headers=[(b"x-priority", b"interactive")],
+                claims={"priority": "bulk"},
+            ),
+            BULK,
+        ),
+        (scope(headers=[(b"x-priority", b"urgent")]), INTERACTIVE),
+    ],
+)
+def test_lane_selection(request_scope, lane):
+    middleware = PriorityLanes(
+        app=None, settings=Settings(priority_bulk_routes=("/api/v1/predict_batch",))
+    )
+
+    assert middleware.lane(request_scope) == lane
+
+
+async def test_bulk_requests_wait_behind_interactive_ones():
+    release = asyncio.Event()
+    order = []
+
+    async def app(scope, receive, send):
+        lane = dict(scope["headers"]).get(b"x-priority", b"interactive").decode()
+        order.append(lane)
+        await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    settings = Settings(
+        priority_lanes_enabled=True,
+        priority_max_concurrency=1,
+        priority_bulk_max_queue=1,
+    )
+    middleware = PriorityLanes(app, settings=settings)
+    transport = httpx.ASGITransport(app=middleware)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+
+        def post(lane):
+            return asyncio.create_task(
+                client.post("/api/v1/predict", headers={"X-Priority": lane})
+            )
+
+        requests = [post("bulk"), post("bulk")]
+        await asyncio.sleep(0.05)
+        requests.append(post("interactive"))
+        await asyncio.sleep(0.05)
+        rejected = await client.post("/api/v1/predict", headers={"X-Priority": "bulk"})
+        release.set()
+        responses = await asyncio.gather(*requests)
+
+    assert rejected.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert [response.status_code for response in responses] == [HTTPStatus.OK] * 3
+    assert order == ["bulk", "interactive", "bulk"]
+
+
+async def test_lane_backlog_counts_as_queue_time():
+    release = asyncio.Event()
+    reasons = []
+    settings = Settings(
+        priority_lanes_enabled=True,
+        priority_max_concurrency=1,
+        admission_initial_limit=10,
+        admission_max_queue_ms=100,
+        fallback_queue_ms=50,
+    )
+
+    async def app(scope, receive, send):
+        request_started(scope)
+        reasons.append(fallback_reason(scope, settings))
+        await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    # in the order of the service
+    admission = AdmissionControl(
+        TrackQueuedRequests(PriorityLanes(app, settings=settings)), settings=settings
+    )
+    transport = httpx.ASGITransport(app=admission)
+    before = (
+        REGISTRY.get_sample_value(
+            "bentoml_service_admission_rejections_total", {"reason": "queue_time"}
+        )
+        or 0.0
+    )
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        requests = [
+            asyncio.create_task(client.post("/api/v1/predict")) for _ in range(2)
+        ]
+        try:
+            # the second request waits in its lane behind the first one
+            await asyncio.sleep(0.2)
+            rejected = await asyncio.wait_for(client.post("/api/v1/predict"), 1)
+        finally:
+            release.set()
+            responses = await asyncio.gather(*requests)
+
+    assert [response.status_code for response in responses] == [HTTPStatus.OK] * 2
+    assert rejected.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert (
+        REGISTRY.get_sample_value(
+            "bentoml_service_admission_rejections_total", {"reason": "queue_time"}
+        )
+        == before + 1
+    )
+    assert reasons == [None, QUEUE_TIME]
+    assert admission.limiter.limit < 10
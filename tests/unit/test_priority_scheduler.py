@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from utils.common.priority_scheduler import Lane, LaneFull, WeightedFairScheduler
+
+
+def make_scheduler(max_concurrency=1, bulk_max_concurrency=1, max_queue=100):
+    return WeightedFairScheduler(
+        [
+            Lane("interactive", 3, max_concurrency, max_queue),
+            Lane("bulk", 1, bulk_max_concurrency, max_queue),
+        ],
+        max_concurrency=max_concurrency,
+    )
+
+
+async def test_backlogged_lanes_served_by_weight():
+    scheduler = make_scheduler()
+    served = []
+
+    async def request(lane):
+        await scheduler.acquire(lane)
+        served.append(lane)
+        await asyncio.sleep(0)
+        scheduler.release(lane)
+
+    # holds the only slot until every request is queued
+    await scheduler.acquire("interactive")
+    tasks = [asyncio.create_task(request("bulk")) for _ in range(4)]
+    tasks += [asyncio.create_task(request("interactive")) for _ in range(12)]
+    await asyncio.sleep(0)
+    scheduler.release("interactive")
+    await asyncio.gather(*tasks)
+
+    first_eight = served[:8]
+    assert first_eight.count("interactive") == 6
+    assert first_eight.count("bulk") == 2
+    assert scheduler.in_flight == 0
+
+
+async def test_lane_concurrency_budget():
+    scheduler = make_scheduler(max_concurrency=3, bulk_max_concurrency=1)
+
+    await scheduler.acquire("bulk")
+    waiting_bulk = asyncio.create_task(scheduler.acquire("bulk"))
+    await scheduler.acquire("interactive")
+    await scheduler.acquire("interactive")
+    await asyncio.sleep(0)
+
+    assert not waiting_bulk.done()
+    scheduler.release("interactive")
+    await asyncio.sleep(0)
+    assert not waiting_bulk.done()
+
+    scheduler.release("bulk")
+    await waiting_bulk
+    assert scheduler.lanes["bulk"].in_flight == 1
+
+
+async def test_full_queue_rejected():
+    scheduler = make_scheduler(max_queue=1)
+    await scheduler.acquire("interactive")
+    waiting = asyncio.create_task(scheduler.acquire("interactive"))
+    await asyncio.sleep(0)
+
+    with pytest.raises(LaneFull):
+        await scheduler.acquire("interactive")
+
+    waiting.cancel()
+    await asyncio.gather(waiting, return_exceptions=True)
+
+
+async def test_cancelled_request_leaves_the_queue():
+    scheduler = make_scheduler()
+    await scheduler.acquire("interactive")
+    cancelled = asyncio.create_task(scheduler.acquire("bulk"))
+    waiting = asyncio.create_task(scheduler.acquire("bulk"))
+    await asyncio.sleep(0)
+
+    cancelled.cancel()
+    await asyncio.gather(cancelled, return_exceptions=True)
+    scheduler.release("interactive")
+    await waiting
+
+    assert scheduler.in_flight == 1
+    assert not scheduler.lanes["bulk"].waiting
@@ -0,0 +1,163 @@
+import threading
+import time
+from http import HTTPStatus
+
+import jwt
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from middlewares.profiling_endpoint import ProfilingEndpoint
+from middlewares.validate_jwt import JWTAuthentication
+from utils.common.settings import Settings
+from utils.monitoring.profiler import (
+    ProfileInProgress,
+    capture_allocation_diff,
+    capture_guard,
+    is_running,
+    sample_stacks,
+)
+
+SECRET = "test_secret"
+
+
+async def sample_endpoint(request):
+    return JSONResponse({"message": "success"})
+
+
+def make_client(settings=Settings(jwt_secret=SECRET)):
+    app = Starlette(routes=[Route("/test", sample_endpoint)])
+    # added last is outermost, the profiling endpoint sits behind the JWT check
+    app.add_middleware(ProfilingEndpoint, settings=settings)
+    app.add_middleware(JWTAuthentication, settings=settings)
+    return TestClient(app)
+
+
+def token(claims=None):
+    return jwt.encode(
+        {**(claims or {}), "exp": time.time() + 60}, SECRET, algorithm="HS256"
+    )
+
+
+def test_other_routes_pass_through():
+    response = make_client().get("/test")
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {"message": "success"}
+
+
+def test_profile_requires_token():
+    response = make_client().get("/admin/profile")
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_profile_requires_admin_role():
+    response = make_client().get(
+        "/admin/profile", headers={"Authorization": token({"role": "user"})}
+    )
+
+    assert response.status_code == HTTPStatus.FORBIDDEN
+    assert response.json() == {"message": "Forbidden: admin role required"}
+
+
+def test_cpu_profile_is_folded():
+    stop = threading.Event()
+
+    def busy_loop():
+        while not stop.is_set():
+            sum(range(1000))
+
+    thread = threading.Thread(target=busy_loop, name="busy")
+    thread.start()
+    try:
+        response = make_client().get(
+            "/admin/profile?seconds=0.2&interval_ms=5",
+            headers={"Authorization": token({"role": "admin"})},
+        )
+    finally:
+        stop.set()
+        thread.join()
+
+    assert response.status_code == HTTPStatus.OK
+    assert "attachment" in response.headers["content-disposition"]
+    lines = response.text.splitlines()
+    stacks = {line.rsplit(" ", 1)[0]: int(line.rsplit(" ", 1)[1]) for line in lines}
+    busy_stacks = [stack for stack in stacks if stack.startswith("busy;")]
+    assert busy_stacks
+    assert any("busy_loop (test_profiling_endpoint.py:" in s for s in busy_stacks)
+
+
+def test_cpu_profile_leaves_idle_threads_out():
+    stop = threading.Event()
+
+    def busy_loop():
+        while not stop.is_set():
+            sum(range(1000))
+
+    threads = [
+        threading.Thread(target=busy_loop, name="busy"),
+        threading.Thread(target=stop.wait, name="idle"),
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        # until the idle thread is blocked
+        deadline = time.monotonic() + 1
+        while is_running(threads[1].native_id) and time.monotonic() < deadline:
+            time.sleep(0.005)
+        cpu = sample_stacks(0.2, 0.005, running_only=True)
+        wall = sample_stacks(0.1, 0.005)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    assert any(stack.startswith("busy;") for stack in cpu)
+    assert not any(stack.startswith("idle;") for stack in cpu)
+    assert any(stack.startswith("idle;") for stack in wall)
+
+
+def test_memory_profile_reports_allocations():
+    retained = []
+
+    def allocate():
+        time.sleep(0.05)
+        retained.append([object() for _ in range(10000)])
+
+    thread = threading.Thread(target=allocate)
+    thread.start()
+    report = capture_allocation_diff(0.2, top=5)
+    thread.join()
+
+    assert "test_profiling_endpoint.py" in report
+
+
+def test_invalid_parameters(monkeypatch):
+    client = make_client(Settings(jwt_secret=SECRET, profiling_max_seconds=1))
+    headers = {"Authorization": token({"role": "admin"})}
+
+    for query in ("kind=disk", "seconds=2", "seconds=0", "interval_ms=0", "seconds=x"):
+        response = client.get(f"/admin/profile?{query}", headers=headers)
+        assert response.status_code == HTTPStatus.BAD_REQUEST, query
+
+
+def test_concurrent_capture_rejected():
+    with capture_guard:
+        response = make_client().get(
+            "/admin/profile?seconds=0.1",
+            headers={"Authorization": token({"role": "admin"})},
+        )
+        with pytest.raises(ProfileInProgress):
+            capture_allocation_diff(0.01)
+
+    assert response.status_code == HTTPStatus.CONFLICT
+    assert not capture_guard.busy
+
+
+def test_sampler_skips_own_thread():
+    samples = sample_stacks(0.02, 0.005)
+
+    assert not any("sample_stacks" in stack for stack in samples)
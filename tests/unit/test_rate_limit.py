@@ -0,0 +1,107 @@
+from http import HTTPStatus
+
+import jwt
+from prometheus_client import REGISTRY
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from middlewares.rate_limit import TenantRateLimit
+from middlewares.validate_jwt import JWTAuthentication
+from utils.common.settings import Settings
+
+SECRET = "test_secret"
+
+
+def rate_limited():
+    return (
+        REGISTRY.get_sample_value("bentoml_service_rate_limited_requests_total") or 0.0
+    )
+
+
+def make_client(settings, reached):
+    async def predict(request):
+        reached.append(request.state.jwt_claims)
+        return JSONResponse({"prediction": 0})
+
+    app = Starlette(
+        routes=[
+            Route("/api/v1/predict", predict, methods=["POST"]),
+            Route("/readyz", lambda request: JSONResponse({"status": "ok"})),
+        ]
+    )
+    app.add_middleware(JWTAuthentication, settings=settings)
+    app.add_middleware(TenantRateLimit, settings=settings)
+    return TestClient(app)
+
+
+def token(claims):
+    return jwt.encode(claims, SECRET, algorithm="HS256")
+
+
+def test_tenant_over_its_rate_rejected():
+    settings = Settings(
+        jwt_secret=SECRET, rate_limit_requests_per_second=0.5, rate_limit_burst=2
+    )
+    reached = []
+    client = make_client(settings, reached)
+    before = rate_limited()
+    noisy = {"Authorization": token({"sub": "noisy"})}
+
+    statuses = [
+        client.post("/api/v1/predict", headers=noisy).status_code for _ in range(2)
+    ]
+    rejected = client.post("/api/v1/predict", headers=noisy)
+    other = client.post(
+        "/api/v1/predict", headers={"Authorization": token({"sub": "other"})}
+    )
+
+    assert statuses == [HTTPStatus.OK] * 2
+    assert rejected.status_code == HTTPStatus.TOO_MANY_REQUESTS
+    assert rejected.headers["retry-after"] == "2"
+    assert rejected.json() == {"message": "Too many requests, retry later"}
+    assert other.status_code == HTTPStatus.OK
+    assert reached == [{"sub": "noisy"}] * 2 + [{"sub": "other"}]
+    assert rate_limited() == before + 1
+
+
+def test_tokens_without_tenant_rejected():
+    settings = Settings(jwt_secret=SECRET, rate_limit_requests_per_second=1)
+    reached = []
+    client = make_client(settings, reached)
+
+    responses = [
+        client.post("/api/v1/predict", headers={"Authorization": token(claims)})
+        for claims in ({}, {"sub": ""}, {"sub": "tenant"})
+    ]
+
+    assert [response.status_code for response in responses] == [
+        HTTPStatus.FORBIDDEN,
+        HTTPStatus.FORBIDDEN,
+        HTTPStatus.OK,
+    ]
+    assert responses[0].json() == {"message": "Forbidden: the token has no sub claim"}
+    assert reached == [{"sub": "tenant"}]
+
+
+def test_invalid_tokens_left_to_authentication():
+    settings = Settings(jwt_secret=SECRET, rate_limit_requests_per_second=0)
+    client = make_client(settings, [])
+
+    missing = client.post("/api/v1/predict")
+    invalid = client.post("/api/v1/predict", headers={"Authorization": "invalid"})
+
+    assert missing.status_code == HTTPStatus.UNAUTHORIZED
+    assert invalid.status_code == HTTPStatus.UNAUTHORIZED
+    assert client.get("/readyz").status_code == HTTPStatus.OK
+
+
+def test_disabled_by_default():
+    reached = []
+    client = make_client(Settings(jwt_secret=SECRET), reached)
+    headers = {"Authorization": token({"sub": "tenant"})}
+
+    for _ in range(20):
+        assert client.post("/api/v1/predict", headers=headers).status_code == 200
+    assert len(reached) == 20
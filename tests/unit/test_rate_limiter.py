@@ -0,0 +1,56 @@
+from utils.common.rate_limiter import TenantRateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_burst_then_rate():
+    clock = FakeClock()
+    limiter = TenantRateLimiter(rate=2, burst=3, clock=clock)
+
+    assert [limiter.acquire("a") for _ in range(3)] == [0.0] * 3
+    assert limiter.acquire("a") == 0.5
+
+    clock.now = 0.5
+    assert limiter.acquire("a") == 0.0
+    assert limiter.acquire("a") == 0.5
+
+
+def test_tenants_are_limited_separately():
+    limiter = TenantRateLimiter(rate=1, clock=FakeClock())
+
+    assert limiter.acquire("a") == 0.0
+    assert limiter.acquire("a") > 0
+    assert limiter.acquire("b") == 0.0
+
+
+def test_tenant_rates_override_the_default():
+    limiter = TenantRateLimiter(
+        rate=None, tenant_rates={"noisy": 1, "blocked": 0}, clock=FakeClock()
+    )
+
+    assert limiter.enabled
+    assert all(limiter.acquire("other") == 0.0 for _ in range(100))
+    assert limiter.acquire("noisy") == 0.0
+    assert limiter.acquire("noisy") == 1.0
+    assert limiter.acquire("blocked") == float("inf")
+    assert not TenantRateLimiter(rate=None).enabled
+
+
+def test_least_recently_used_tenant_evicted():
+    limiter = TenantRateLimiter(rate=1, max_tenants=2, clock=FakeClock())
+
+    limiter.acquire("a")
+    limiter.acquire("b")
+    limiter.acquire("a")
+    limiter.acquire("c")
+
+    assert len(limiter) == 2
+    # "b" was evicted and starts with a full bucket again
+    assert limiter.acquire("b") == 0.0
+    assert limiter.acquire("c") > 0
@@ -0,0 +1,159 @@
+import json
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from middlewares import readiness_gate
+from middlewares.rate_limit import TenantRateLimit
+from middlewares.readiness_gate import ReadinessGate, replay_request
+from middlewares.validate_jwt import JWTAuthentication
+from utils.common.readiness import MIDDLEWARE_WARMUP, MODEL_WARMUP, Readiness
+from utils.common.request_corpus import CorpusRequest, load_request_corpus
+from utils.common.settings import Settings, reload_settings
+
+SAMPLE = {
+    "sepal_length": 5.1,
+    "sepal_width": 3.5,
+    "petal_length": 1.4,
+    "petal_width": 0.2,
+}
+
+
+async def predict(request):
+    body = await request.json()
+    if body.get("sepal_length") is None:
+        return JSONResponse({"message": "error"}, status_code=500)
+    return JSONResponse({"prediction": 0})
+
+
+async def readyz(request):
+    return JSONResponse({"status": "ok"})
+
+
+def create_app():
+    return Starlette(
+        routes=[
+            Route("/api/v1/predict", predict, methods=["POST"]),
+            Route("/readyz", readyz),
+        ]
+    )
+
+
+@pytest.fixture
+def readiness(monkeypatch):
+    readiness = Readiness([MODEL_WARMUP, MIDDLEWARE_WARMUP])
+    monkeypatch.setattr(readiness_gate, "readiness", readiness)
+    return readiness
+
+
+def test_readyz_is_unavailable_until_warmed_up(readiness):
+    client = TestClient(ReadinessGate(create_app(), settings=Settings()))
+
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json() == {"message": "Service is warming up"}
+
+    readiness.mark_completed(MODEL_WARMUP)
+    assert client.get("/readyz").status_code == 503
+
+    readiness.mark_completed(MIDDLEWARE_WARMUP)
+    assert client.get("/readyz").status_code == 200
+
+
+def test_other_routes_are_not_gated(readiness):
+    client = TestClient(ReadinessGate(create_app(), settings=Settings()))
+
+    assert client.post("/api/v1/predict", json=SAMPLE).status_code == 200
+
+
+async def test_replay_request():
+    app = create_app()
+
+    assert (
+        await replay_request(app, CorpusRequest("/api/v1/predict", SAMPLE), []) == 200
+    )
+    assert await replay_request(app, CorpusRequest("/api/v1/predict", {}), []) == 500
+
+
+async def test_warmup_marks_middleware_step(readiness, monkeypatch, tmp_path):
+    corpus_path = tmp_path / "samples.jsonl"
+    corpus_path.write_text(json.dumps(SAMPLE) + "\n")
+    monkeypatch.setattr(readiness_gate, "_warmup_headers", lambda settings: [])
+    settings = Settings(
+        warmup_sample_path=str(corpus_path), warmup_through_middlewares=True
+    )
+
+    await ReadinessGate(create_app(), settings=settings).warmup()
+
+    assert readiness._completed_steps == {MIDDLEWARE_WARMUP}
+
+
+async def test_warmup_fails_on_server_error(readiness, monkeypatch, tmp_path):
+    corpus_path = tmp_path / "samples.jsonl"
+    corpus_path.write_text(json.dumps({"sepal_width": 3.5}) + "\n")
+    monkeypatch.setattr(readiness_gate, "_warmup_headers", lambda settings: [])
+    settings = Settings(
+        warmup_sample_path=str(corpus_path), warmup_through_middlewares=True
+    )
+
+    await ReadinessGate(create_app(), settings=settings).warmup()
+
+    assert not readiness._completed_steps
+
+
+async def test_warmup_fails_on_client_error(readiness, monkeypatch, tmp_path):
+    corpus_path = tmp_path / "samples.jsonl"
+    corpus_path.write_text(json.dumps(SAMPLE) + "\n")
+    settings = Settings(
+        warmup_sample_path=str(corpus_path),
+        warmup_through_middlewares=True,
+        jwt_secret="test_secret",
+    )
+    # the warmup token is signed with another secret
+    monkeypatch.setenv("JWT_SECRET", "other_secret")
+    reload_settings()
+
+    app = JWTAuthentication(create_app(), settings=settings)
+    await ReadinessGate(app, settings=settings).warmup()
+
+    assert not readiness._completed_steps
+
+
+async def test_warmup_passes_tenant_rate_limit(readiness, monkeypatch, tmp_path):
+    corpus_path = tmp_path / "samples.jsonl"
+    corpus_path.write_text((json.dumps(SAMPLE) + "\n") * 3)
+    settings = Settings(
+        warmup_sample_path=str(corpus_path),
+        warmup_through_middlewares=True,
+        jwt_secret="test_secret",
+        rate_limit_requests_per_second=10,
+    )
+    monkeypatch.setenv("JWT_SECRET", "test_secret")
+    reload_settings()
+
+    app = TenantRateLimit(
+        JWTAuthentication(create_app(), settings=settings), settings=settings
+    )
+    await ReadinessGate(app, settings=settings).warmup()
+
+    assert readiness._completed_steps == {MIDDLEWARE_WARMUP}
+
+
+def test_load_request_corpus(tmp_path):
+    corpus_path = tmp_path / "samples.jsonl"
+    corpus_path.write_text(
+        json.dumps(SAMPLE)
+        + "\n\n"
+        + json.dumps({"route": "/api/v1/other", "body": SAMPLE})
+        + "\n"
+        + json.dumps(SAMPLE)
+        + "\n"
+    )
+
+    assert load_request_corpus(str(corpus_path), limit=2) == [
+        CorpusRequest("/api/v1/predict", SAMPLE),
+        CorpusRequest("/api/v1/other", SAMPLE),
+    ]
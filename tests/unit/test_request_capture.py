@@ -0,0 +1,208 @@
+import json
+import os
+from http import HTTPStatus
+
+import pytest
+from prometheus_client import REGISTRY
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from middlewares.request_capture import RequestCapture
+from utils.common.request_corpus import load_request_corpus
+from utils.common.settings import Settings
+from utils.monitoring.request_capture import (
+    FILE_HEADER_BYTES,
+    RequestCaptureRing,
+    capture_file_path,
+    claim_capture_file,
+    export_corpus,
+    read_capture,
+)
+
+# Process id which is never alive
+DEAD_PID = 999999991
+
+
+def body(index):
+    return json.dumps({"sepal_length": index}).encode()
+
+
+def captures(outcome):
+    return (
+        REGISTRY.get_sample_value(
+            "bentoml_service_request_captures_total", {"outcome": outcome}
+        )
+        or 0.0
+    )
+
+
+def test_ring_keeps_the_latest_records(tmp_path):
+    path = str(tmp_path / "requests.capture")
+    ring = RequestCaptureRing(path, FILE_HEADER_BYTES + 3 * 256, record_bytes=256)
+
+    for index in range(5):
+        assert ring.append(100.0 + index, "/api/v1/predict", body(index), 0.5, 200)
+    assert not ring.append(105.0, "/api/v1/predict", b"x" * 256, 0.5, 200)
+    ring.close()
+
+    records = read_capture(path)
+    assert [record.sequence for record in records] == [3, 4, 5]
+    assert [record.body for record in records] == [body(2), body(3), body(4)]
+    assert records[0].timestamp == 102.0
+    assert records[0].latency_seconds == 0.5
+    assert records[0].status == 200
+    assert records[0].route == "/api/v1/predict"
+
+
+def test_ring_continues_an_existing_file(tmp_path):
+    path = str(tmp_path / "requests.capture")
+    ring = RequestCaptureRing(path, FILE_HEADER_BYTES + 3 * 256, record_bytes=256)
+    for index in range(2):
+        ring.append(100.0 + index, "/api/v1/predict", body(index), 0.5, 200)
+    ring.close()
+
+    ring = RequestCaptureRing(path, FILE_HEADER_BYTES + 3 * 256, record_bytes=256)
+    for index in range(2, 4):
+        ring.append(100.0 + index, "/api/v1/predict", body(index), 0.5, 200)
+    ring.close()
+    assert [record.body for record in read_capture(path)] == [
+        body(1),
+        body(2),
+        body(3),
+    ]
+
+    # a file with other slots is truncated
+    ring = RequestCaptureRing(path, FILE_HEADER_BYTES + 2 * 512, record_bytes=512)
+    ring.close()
+    assert read_capture(path) == []
+
+
+def test_file_of_exited_worker_claimed(tmp_path):
+    live_path = tmp_path / f"requests-{os.getppid()}.capture"
+    dead_path = tmp_path / f"requests-{DEAD_PID}.capture"
+    live_path.write_bytes(b"live")
+    dead_path.write_bytes(b"dead")
+
+    path = claim_capture_file(str(tmp_path))
+
+    assert path == capture_file_path(str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        [live_path.name, os.path.basename(path)]
+    )
+    with open(path, "rb") as capture_file:
+        assert capture_file.read() == b"dead"
+    assert claim_capture_file(str(tmp_path)) == path
+
+
+def test_torn_record_skipped(tmp_path):
+    path = tmp_path / "requests.capture"
+    ring = RequestCaptureRing(str(path), FILE_HEADER_BYTES + 2 * 256, record_bytes=256)
+    ring.append(100.0, "/api/v1/predict", body(0), 0.1, 200)
+    ring.append(101.0, "/api/v1/predict", body(1), 0.1, 200)
+    ring.close()
+
+    data = bytearray(path.read_bytes())
+    # a record overwritten in the middle of its body
+    data[FILE_HEADER_BYTES + 256 + 40] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+    assert [record.body for record in read_capture(str(path))] == [body(0)]
+
+
+def test_not_a_capture_file(tmp_path):
+    path = tmp_path / "requests.jsonl"
+    path.write_text("{}\n" * 100)
+
+    with pytest.raises(ValueError):
+        read_capture(str(path))
+
+
+def test_export_corpus(tmp_path):
+    paths = []
+    for worker, timestamps in enumerate([(100.0, 102.0), (101.0,)]):
+        path = str(tmp_path / f"requests-{worker}.capture")
+        ring = RequestCaptureRing(path, 64 * 1024)
+        for timestamp in timestamps:
+            ring.append(timestamp, "/api/v1/predict", body(timestamp), 0.0125, 200)
+        ring.append(timestamp, "/api/v1/predict", b"not json", 0.01, 400)
+        ring.close()
+        paths.append(path)
+    corpus_path = str(tmp_path / "requests.jsonl")
+
+    assert export_corpus(paths, corpus_path) == 3
+    assert export_corpus(paths, corpus_path, route="/healthz") == 0
+
+    export_corpus(paths, corpus_path)
+    requests = load_request_corpus(corpus_path)
+    assert [request.body["sepal_length"] for request in requests] == [
+        100.0,
+        101.0,
+        102.0,
+    ]
+    assert {request.route for request in requests} == {"/api/v1/predict"}
+    with open(corpus_path) as corpus_file:
+        line = json.loads(corpus_file.readline())
+    assert line["latency_ms"] == 12.5
+    assert line["status"] == 200
+
+
+def make_client(settings):
+    async def predict(request):
+        payload = await request.json()
+        return JSONResponse({"prediction": 0}, status_code=payload.get("status", 200))
+
+    app = Starlette(
+        routes=[
+            Route("/api/v1/predict", predict, methods=["POST"]),
+            Route("/readyz", lambda request: JSONResponse({"status": "ok"})),
+        ]
+    )
+    app.add_middleware(RequestCapture, settings=settings)
+    return TestClient(app)
+
+
+def test_sampled_requests_captured(tmp_path):
+    settings = Settings(
+        request_capture_dir=str(tmp_path),
+        request_capture_sample_rate=1.0,
+        request_capture_file_mb=1,
+        request_capture_record_bytes=256,
+    )
+    before = captures("captured"), captures("too_large")
+
+    # the capture file is opened on startup and closed on shutdown
+    with make_client(settings) as client:
+        ok = client.post("/api/v1/predict", json={"sepal_length": 5.1})
+        invalid = client.post("/api/v1/predict", json={"status": 422})
+        too_large = client.post("/api/v1/predict", json={"padding": "x" * 256})
+        client.get("/readyz")
+
+    assert ok.status_code == HTTPStatus.OK
+    assert invalid.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    assert too_large.status_code == HTTPStatus.OK
+    (capture_path,) = tmp_path.glob("requests-*.capture")
+    records = read_capture(str(capture_path))
+    assert [json.loads(record.body) for record in records] == [
+        {"sepal_length": 5.1},
+        {"status": 422},
+    ]
+    assert [record.status for record in records] == [200, 422]
+    assert all(record.latency_seconds > 0 for record in records)
+    assert (captures("captured"), captures("too_large")) == (
+        before[0] + 2,
+        before[1] + 1,
+    )
+
+
+def test_capture_disabled(tmp_path):
+    for settings in (
+        Settings(request_capture_dir=str(tmp_path), request_capture_sample_rate=0),
+        Settings(request_capture_sample_rate=1.0),
+    ):
+        with make_client(settings) as client:
+            response = client.post("/api/v1/predict", json={})
+        assert response.status_code == HTTPStatus.OK
+
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,169 @@
+import asyncio
+import gc
+import time
+
+import numpy as np
+from prometheus_client import REGISTRY
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from middlewares.runtime_metrics import TrackInFlightRequests, TrackQueuedRequests
+from utils.common.settings import Settings
+from utils.monitoring.runtime_metrics import (
+    GCPauses,
+    RuntimeSampler,
+    in_flight_requests,
+    mark_finished,
+    mark_queued,
+    monitor_event_loop_lag,
+    object_size_bytes,
+    queued_requests,
+    request_started,
+    resident_memory_bytes,
+)
+
+
+def sample_value(name, labels=None):
+    return REGISTRY.get_sample_value(name, labels or {}) or 0.0
+
+
+def test_gc_pauses_recorded_and_exported():
+    gc_pauses = GCPauses()
+    before = sample_value("bentoml_service_gc_collections_total", {"generation": "2"})
+
+    gc_pauses.install()
+    try:
+        gc.collect()
+    finally:
+        gc_pauses.uninstall()
+
+    assert [generation for generation, _ in gc_pauses.pending] == [2]
+    gc_pauses.export()
+    assert not gc_pauses.pending
+    assert (
+        sample_value("bentoml_service_gc_collections_total", {"generation": "2"})
+        == before + 1
+    )
+    assert gc_pauses.callback not in gc.callbacks
+
+
+def test_object_size_counts_buffers_once():
+    array = np.zeros(1000, dtype=np.float64)
+    model = {"weights": array, "view": array[:10], "again": array}
+
+    size = object_size_bytes(model)
+
+    assert array.nbytes <= size < 2 * array.nbytes
+
+
+def test_object_size_follows_pickled_state():
+    class Tree:
+        __slots__ = ("data",)
+
+        def __init__(self):
+            self.data = np.zeros(1000)
+
+        def __getstate__(self):
+            return (self.data,)
+
+    assert object_size_bytes(Tree()) >= 8000
+
+
+def test_resident_memory_bytes():
+    assert resident_memory_bytes() > 10 * 1024 * 1024
+
+
+def test_sampler_exports_gauges():
+    sampler = RuntimeSampler(interval_seconds=60)
+    model = {"weights": np.zeros(1000)}
+    sampler.track_model("TestService", lambda: model)
+
+    sampler.sample()
+
+    assert sample_value("bentoml_service_worker_resident_memory_bytes") > 0
+    assert (
+        sample_value(
+            "bentoml_service_model_resident_bytes", {"service_name": "TestService"}
+        )
+        >= 8000
+    )
+
+
+def test_queued_request_counted_once():
+    scope = {}
+    before = queued_requests.value
+
+    mark_queued(scope)
+    assert queued_requests.value == before + 1
+    request_started(scope)
+    mark_finished(scope)
+
+    assert queued_requests.value == before
+
+
+async def test_event_loop_lag_observed():
+    before = sample_value("bentoml_service_event_loop_lag_seconds_sum")
+    monitor = asyncio.create_task(monitor_event_loop_lag(0.01))
+    await asyncio.sleep(0.02)
+
+    # blocks the event loop
+    time.sleep(0.1)
+    await asyncio.sleep(0.03)
+    monitor.cancel()
+
+    assert sample_value("bentoml_service_event_loop_lag_seconds_sum") - before >= 0.05
+
+
+def test_middlewares_count_requests():
+    observed = {}
+
+    async def endpoint(request):
+        observed["in_flight"] = in_flight_requests.value
+        observed["queued"] = queued_requests.value
+        request_started(request.scope)
+        observed["started"] = queued_requests.value
+        return JSONResponse({"message": "success"})
+
+    async def failing_endpoint(request):
+        raise RuntimeError("fails before the API function")
+
+    app = Starlette(routes=[Route("/test", endpoint), Route("/fail", failing_endpoint)])
+    app.add_middleware(TrackQueuedRequests)
+    app.add_middleware(
+        TrackInFlightRequests,
+        settings=Settings(event_loop_lag_interval_seconds=0.01),
+    )
+    in_flight_before, queued_before = in_flight_requests.value, queued_requests.value
+
+    with TestClient(app, raise_server_exceptions=False) as client:
+        assert client.get("/test").status_code == 200
+        assert client.get("/fail").status_code == 500
+
+    assert observed == {
+        "in_flight": in_flight_before + 1,
+        "queued": queued_before + 1,
+        "started": queued_before,
+    }
+    assert in_flight_requests.value == in_flight_before
+    assert queued_requests.value == queued_before
+
+
+def test_lag_monitor_runs_during_lifespan():
+    app = Starlette()
+    middleware = {}
+
+    class Capture(TrackInFlightRequests):
+        def __init__(self, app, **options):
+            super().__init__(app, **options)
+            middleware["instance"] = self
+
+    app.add_middleware(Capture, settings=Settings(event_loop_lag_interval_seconds=0.01))
+
+    with TestClient(app):
+        lag_monitor = middleware["instance"]._lag_monitor
+        assert lag_monitor is not None and not lag_monitor.done()
+
+    assert middleware["instance"]._lag_monitor is None
+    assert lag_monitor.cancelled()
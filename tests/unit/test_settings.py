@@ -0,0 +1,126 @@
+import pytest
+
+from utils.common import settings as settings_module
+from utils.common.settings import (
+    Settings,
+    SettingsError,
+    add_reload_listener,
+    get_settings,
+    reload_settings,
+)
+
+
+def test_defaults():
+    settings = Settings.from_environment({})
+
+    assert settings == Settings()
+    assert settings.request_latency_budget_ms is None
+    assert not settings.is_production
+
+
+def test_values_are_parsed():
+    settings = Settings.from_environment(
+        {
+            "ENVIRONMENT": "Production",
+            "LOG_LEVEL": "info",
+            "JWT_EXPIRATION_MINUTES": "10",
+            "REQUEST_LATENCY_BUDGET_MS": "250",
+            "WARMUP_THROUGH_MIDDLEWARES": "true",
+            "DYNAMODB_READ_TIMEOUT": " 3 ",
+            "WARMUP_SAMPLE_PATH": "",
+            "RATE_LIMIT_TENANT_RATES": "tenant-a=5, tenant=b=0.5",
+        }
+    )
+
+    assert settings.is_production
+    assert settings.log_level == "INFO"
+    assert settings.jwt_expiration_minutes == 10
+    assert settings.request_latency_budget_ms == 250.0
+    assert settings.warmup_through_middlewares
+    assert settings.dynamodb_read_timeout == 3
+    assert settings.warmup_sample_path is None
+    assert settings.rate_limit_tenant_rates == (("tenant-a", 5.0), ("tenant=b", 0.5))
+
+
+def test_invalid_values_are_all_reported():
+    with pytest.raises(SettingsError) as error:
+        Settings.from_environment(
+            {
+                "WARMUP_THROUGH_MIDDLEWARES": "maybe",
+                "DYNAMODB_BREAKER_FAILURE_RATE": "2",
+                "DYNAMODB_READ_TIMEOUT": "fast",
+                "RATE_LIMIT_TENANT_RATES": "tenant-a",
+            }
+        )
+
+    message = str(error.value)
+    for name in [
+        "WARMUP_THROUGH_MIDDLEWARES",
+        "DYNAMODB_BREAKER_FAILURE_RATE",
+        "DYNAMODB_READ_TIMEOUT",
+        "RATE_LIMIT_TENANT_RATES",
+    ]:
+        assert name in message
+
+
+def test_unknown_environment_and_log_level_are_warned_about(caplog):
+    settings = Settings.from_environment({"ENVIRONMENT": "prod", "LOG_LEVEL": "trace"})
+
+    assert settings.environment == Settings().environment
+    assert settings.log_level == Settings().log_level
+    assert "ENVIRONMENT must be one of" in caplog.text
+    assert "LOG_LEVEL must be one of" in caplog.text
+
+
+@pytest.mark.parametrize(
+    "environment, message",
+    [
+        ({"WARMUP_SAMPLE_LIMIT": "-1"}, "WARMUP_SAMPLE_LIMIT must be at least 0"),
+        (
+            {"DYNAMODB_BREAKER_FAILURE_RATE": "2"},
+            "DYNAMODB_BREAKER_FAILURE_RATE must be between 0 and 1",
+        ),
+        (
+            {"REQUEST_LATENCY_BUDGET_MS": "0"},
+            "REQUEST_LATENCY_BUDGET_MS must be at least 1",
+        ),
+        (
+            {"REQUEST_LATENCY_BUDGET_MS": "nan"},
+            "REQUEST_LATENCY_BUDGET_MS must be a finite number",
+        ),
+        (
+            {"DYNAMODB_BREAKER_FAILURE_RATE": "nan"},
+            "DYNAMODB_BREAKER_FAILURE_RATE must be a finite number",
+        ),
+        ({"METRICS_LATENCY_BUCKETS": "0.1,inf"}, "METRICS_LATENCY_BUCKETS"),
+        ({"RATE_LIMIT_TENANT_RATES": "tenant-a=nan"}, "RATE_LIMIT_TENANT_RATES"),
+    ],
+)
+def test_invalid_number_messages(environment, message):
+    with pytest.raises(SettingsError) as error:
+        Settings.from_environment(environment)
+
+    assert message in str(error.value)
+    assert "None" not in str(error.value)
+
+
+def test_reload_swaps_snapshot_and_notifies_listeners(monkeypatch):
+    monkeypatch.setattr(settings_module, "_reload_listeners", [])
+    reloaded = []
+    add_reload_listener(reloaded.append)
+    monkeypatch.setenv("ENVIRONMENT", "production")
+
+    settings = reload_settings()
+
+    assert get_settings() is settings
+    assert settings.is_production
+    assert reloaded == [settings]
+
+
+def test_reload_keeps_snapshot_when_invalid(monkeypatch):
+    current = get_settings()
+    monkeypatch.setenv("WARMUP_SAMPLE_LIMIT", "-1")
+
+    with pytest.raises(SettingsError):
+        reload_settings()
+    assert get_settings() is current
@@ -0,0 +1,124 @@
+import threading
+
+import numpy as np
+import pytest
+from prometheus_client import REGISTRY
+
+from utils.model_reload.shadow_evaluator import ShadowEvaluator
+
+
+class FakeModel:
+    def __init__(self, prediction, started=None, release=None):
+        self.prediction = prediction
+        self.started = started
+        self.release = release
+
+    def predict(self, inputs):
+        if self.started is not None:
+            self.started.set()
+            self.release.wait()
+        if isinstance(self.prediction, Exception):
+            raise self.prediction
+        return np.array([self.prediction])
+
+
+class FakeReloader:
+    def __init__(self, model):
+        self.model = model
+
+
+def sample_value(name, labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def comparisons(service_name, outcome):
+    return sample_value(
+        "bentoml_service_shadow_comparisons_total",
+        {"service_name": service_name, "outcome": outcome},
+    )
+
+
+def make_evaluator(model, service_name, **options):
+    options.setdefault("sample_rate", 1.0)
+    return ShadowEvaluator(FakeReloader(model), service_name, **options)
+
+
+def test_predictions_compared():
+    evaluator = make_evaluator(FakeModel(1), "ShadowCompare")
+    inputs = np.zeros((1, 4))
+
+    evaluator.evaluate(inputs, np.array([1]), 0.001)
+    evaluator.evaluate(inputs, np.array([2]), 0.001)
+    evaluator.candidate.model = FakeModel(RuntimeError("broken"))
+    evaluator.evaluate(inputs, np.array([1]), 0.001)
+
+    assert comparisons("ShadowCompare", "agree") == 1
+    assert comparisons("ShadowCompare", "disagree") == 1
+    assert comparisons("ShadowCompare", "error") == 1
+    assert (
+        sample_value(
+            "bentoml_service_shadow_model_duration_seconds_count",
+            {"service_name": "ShadowCompare", "model": "shadow"},
+        )
+        == 2
+    )
+
+
+def test_requests_sampled():
+    draws = iter([0.05, 0.5])
+    evaluator = make_evaluator(
+        FakeModel(1), "ShadowSampled", sample_rate=0.1, sample=lambda: next(draws)
+    )
+
+    assert evaluator.submit(np.zeros((1, 4)), np.array([1]), 0.001)
+    assert not evaluator.submit(np.zeros((1, 4)), np.array([1]), 0.001)
+    assert evaluator.pending == 1
+
+
+def test_full_queue_drops_without_blocking():
+    started, release = threading.Event(), threading.Event()
+    evaluator = make_evaluator(
+        FakeModel(1, started, release), "ShadowDropped", queue_size=1
+    )
+    evaluator.start()
+    inputs, prediction = np.zeros((1, 4)), np.array([1])
+
+    try:
+        assert evaluator.submit(inputs, prediction, 0.001)
+        assert started.wait(5)
+        assert evaluator.submit(inputs, prediction, 0.001)
+        assert not evaluator.submit(inputs, prediction, 0.001)
+    finally:
+        release.set()
+        evaluator.stop()
+
+    assert comparisons("ShadowDropped", "agree") == 2
+    assert (
+        sample_value(
+            "bentoml_service_shadow_dropped_total", {"service_name": "ShadowDropped"}
+        )
+        == 1
+    )
+
+
+@pytest.mark.parametrize("content, sample_rate", [("0.5\n", 0.5), ("2", 0.1)])
+def test_sample_rate_read_from_file(tmp_path, content, sample_rate):
+    now = [0.0]
+    path = tmp_path / "sample_rate"
+    evaluator = make_evaluator(
+        FakeModel(1),
+        "ShadowRate",
+        sample_rate=0.1,
+        sample_rate_path=str(path),
+        clock=lambda: now[0],
+        sample=lambda: 1.0,
+    )
+
+    evaluator.submit(np.zeros((1, 4)), np.array([1]), 0.001)
+    path.write_text(content)
+    evaluator.submit(np.zeros((1, 4)), np.array([1]), 0.001)
+    assert evaluator.sample_rate == 0.1
+
+    now[0] = 1.0
+    evaluator.submit(np.zeros((1, 4)), np.array([1]), 0.001)
+    assert evaluator.sample_rate == sample_rate
@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+from prometheus_client import REGISTRY
+from starlette.applications import Starlette
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from middlewares.log_parameters import SetLogDefaultParameters
+from utils.common.settings import Settings, SettingsError
+from utils.monitoring.prometheus_metrics import exponential_buckets
+from utils.monitoring.stage_timing import (
+    APP_ENTERED_AT_KEY,
+    QUEUE_WAIT,
+    TimedMiddleware,
+    observe_queue_wait,
+    stage_timer,
+)
+
+
+def stage_sample(stage, suffix):
+    value = REGISTRY.get_sample_value(
+        f"bentoml_service_request_stage_duration_seconds_{suffix}", {"stage": stage}
+    )
+    return value or 0.0
+
+
+class SlowMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        await asyncio.sleep(0.05)
+        return await call_next(request)
+
+
+async def slow_endpoint(request):
+    await asyncio.sleep(0.1)
+    return JSONResponse({"message": "success"})
+
+
+def test_timed_middleware_excludes_downstream_time():
+    app = Starlette(routes=[Route("/test", slow_endpoint)])
+    app.add_middleware(TimedMiddleware, middleware=SlowMiddleware, stage="test_slow")
+    count, total = stage_sample("test_slow", "count"), stage_sample("test_slow", "sum")
+
+    assert TestClient(app).get("/test").status_code == 200
+
+    assert stage_sample("test_slow", "count") == count + 1
+    assert 0.05 <= stage_sample("test_slow", "sum") - total < 0.1
+
+
+def test_timed_middleware_drops_requests_past_deadline():
+    app = Starlette(routes=[Route("/test", slow_endpoint)])
+    app.add_middleware(TimedMiddleware, middleware=SlowMiddleware, stage="test_late")
+    app.add_middleware(TimedMiddleware, middleware=SlowMiddleware, stage="test_early")
+    app.add_middleware(
+        TimedMiddleware, middleware=SetLogDefaultParameters, stage="log_parameters"
+    )
+    client = TestClient(app)
+
+    def dropped(stage):
+        return (
+            REGISTRY.get_sample_value(
+                "bentoml_service_deadline_exceeded_total", {"stage": stage}
+            )
+            or 0.0
+        )
+
+    before = dropped("test_late")
+    late = client.get("/test", headers={"X-Request-Timeout-Ms": "20"})
+    in_time = client.get("/test", headers={"X-Request-Timeout-Ms": "1000"})
+
+    assert late.status_code == 504
+    assert late.json() == {"message": "Request deadline exceeded"}
+    assert dropped("test_late") == before + 1
+    assert in_time.status_code == 200
+
+
+def test_stage_timer():
+    count = stage_sample("test_block", "count")
+
+    with stage_timer("test_block"):
+        pass
+
+    assert stage_sample("test_block", "count") == count + 1
+
+
+class NestedStageMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        with stage_timer("test_nested", request.scope):
+            await asyncio.sleep(0.05)
+        return await call_next(request)
+
+
+def test_stage_timer_is_excluded_from_the_middleware_stage():
+    app = Starlette(routes=[Route("/test", slow_endpoint)])
+    app.add_middleware(
+        TimedMiddleware, middleware=NestedStageMiddleware, stage="test_parent"
+    )
+    app.add_middleware(TimedMiddleware, middleware=SlowMiddleware, stage="test_outer")
+    parent, nested = stage_sample("test_parent", "sum"), stage_sample(
+        "test_nested", "sum"
+    )
+    outer = stage_sample("test_outer", "sum")
+
+    assert TestClient(app).get("/test").status_code == 200
+
+    assert 0.05 <= stage_sample("test_nested", "sum") - nested < 0.1
+    assert stage_sample("test_parent", "sum") - parent < 0.05
+    assert 0.05 <= stage_sample("test_outer", "sum") - outer < 0.1
+
+
+def test_observe_queue_wait_requires_timed_middleware():
+    count = stage_sample(QUEUE_WAIT, "count")
+
+    observe_queue_wait({})
+    assert stage_sample(QUEUE_WAIT, "count") == count
+
+    observe_queue_wait({APP_ENTERED_AT_KEY: 0.0})
+    assert stage_sample(QUEUE_WAIT, "count") == count + 1
+
+
+def test_exponential_buckets():
+    assert exponential_buckets(0.001, 10, 4) == pytest.approx((0.001, 0.01, 0.1, 1))
+
+
+def test_latency_buckets_setting():
+    settings = Settings.from_environment({"METRICS_LATENCY_BUCKETS": "0.001,0.01,1"})
+    assert settings.metrics_latency_buckets == (0.001, 0.01, 1.0)
+
+    with pytest.raises(SettingsError):
+        Settings.from_environment({"METRICS_LATENCY_BUCKETS": "0.1,0.01"})
@@ -1,17 +1,44 @@
 import pytest
 from starlette.applications import Starlette
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, StreamingResponse
 from starlette.routing import Route
 from starlette.testclient import TestClient
 
 from middlewares.update_response_headers import UpdateResponseHeaders
+from utils.common.settings import Settings, reload_settings
 
 
 async def sample_endpoint(request):
     return JSONResponse({"message": "success"})
 
 
-app = Starlette(routes=[Route("/test", sample_endpoint)])
+async def headers_endpoint(request):
+    return JSONResponse(
+        {"message": "success"},
+        headers={
+            "x-bentoml-request-id": "1",
+            "server": "uvicorn",
+            "x-frame-options": "sameorigin",
+            "x-custom": "kept",
+        },
+    )
+
+
+async def streaming_endpoint(request):
+    async def chunks():
+        yield b"first,"
+        yield b"second"
+
+    return StreamingResponse(chunks(), media_type="text/plain")
+
+
+app = Starlette(
+    routes=[
+        Route("/test", sample_endpoint),
+        Route("/headers", headers_endpoint),
+        Route("/stream", streaming_endpoint),
+    ]
+)
 app.add_middleware(UpdateResponseHeaders)
 
 
@@ -28,6 +55,7 @@ def test_headers_removed(client, monkeypatch):
 
 def test_headers_added_in_production(client, monkeypatch):
     monkeypatch.setenv("ENVIRONMENT", "production")
+    reload_settings()
     response = client.get("/test")
     assert response.headers["X-Content-Type-Options"] == "nosniff"
     assert response.headers["X-Frame-Options"] == "deny"
@@ -36,7 +64,37 @@ def test_headers_added_in_production(client, monkeypatch):
 
 def test_headers_not_added_in_non_production(client, monkeypatch):
     monkeypatch.setenv("ENVIRONMENT", "development")
+    reload_settings()
     response = client.get("/test")
     assert "X-Content-Type-Options" not in response.headers
     assert "X-Frame-Options" not in response.headers
     assert "Content-Security-Policy" not in response.headers
+
+
+def test_injected_settings_take_precedence(monkeypatch):
+    monkeypatch.setenv("ENVIRONMENT", "development")
+    reload_settings()
+    injected_app = Starlette(routes=[Route("/test", sample_endpoint)])
+    injected_app.add_middleware(
+        UpdateResponseHeaders, settings=Settings(environment="production")
+    )
+
+    response = TestClient(injected_app).get("/test")
+    assert response.headers["X-Frame-Options"] == "deny"
+
+
+def test_headers_rewritten_in_single_pass(client, monkeypatch):
+    monkeypatch.setenv("ENVIRONMENT", "production")
+    reload_settings()
+    response = client.get("/headers")
+    assert "x-bentoml-request-id" not in response.headers
+    assert "server" not in response.headers
+    assert response.headers["x-custom"] == "kept"
+    # security headers replace the ones set by the endpoint
+    assert response.headers.get_list("x-frame-options") == ["deny"]
+
+
+def test_streaming_response_is_passed_through(client):
+    response = client.get("/stream")
+    assert response.text == "first,second"
+    assert "server" not in response.headers
@@ -6,6 +6,7 @@ from http import HTTPStatus
 from starlette.responses import JSONResponse
 from middlewares.validate_jwt import JWTAuthentication
 from utils.common.response import error_response
+from utils.common.settings import reload_settings
 
 
 @pytest.fixture
@@ -18,6 +19,7 @@ def mock_request():
     request = Mock()
     request.url.path = "/api/v1/predict"
     request.headers = {}
+    request.scope = {}
     return request
 
 
@@ -54,6 +56,7 @@ async def test_expired_jwt(
     mock_call_next = AsyncMock(return_value=mock_response)
     logger_mock = mocker.patch("utils.structure_logging.logger_config.logger.error")
     monkeypatch.setenv("JWT_SECRET", "test_secret")
+    reload_settings()
 
     expired_token = jwt.encode({"exp": 0}, os.environ["JWT_SECRET"], algorithm="HS256")
     mock_request.headers = {"Authorization": expired_token}
@@ -79,6 +82,7 @@ async def test_invalid_jwt(
     mock_call_next = AsyncMock(return_value=mock_response)
     logger_mock = mocker.patch("utils.structure_logging.logger_config.logger.error")
     monkeypatch.setenv("JWT_SECRET", "test_secret")
+    reload_settings()
 
     invalid_token = "invalid.token.here"
     mock_request.headers = {"Authorization": invalid_token}
@@ -104,6 +108,7 @@ async def test_internal_server_error(
     mock_call_next = AsyncMock(return_value=mock_response)
     logger_mock = mocker.patch("utils.structure_logging.logger_config.logger.exception")
     monkeypatch.setenv("JWT_SECRET", "test_secret")
+    reload_settings()
 
     mocker.patch("jwt.decode", side_effect=Exception("Unexpected error"))
 
@@ -128,6 +133,7 @@ async def test_internal_server_error(
 async def test_valid_jwt(middleware, mock_request, mock_response, monkeypatch):
     mock_call_next = AsyncMock(return_value=mock_response)
     monkeypatch.setenv("JWT_SECRET", "test_secret")
+    reload_settings()
 
     valid_token = jwt.encode(
         {"some": "payload"}, os.environ["JWT_SECRET"], algorithm="HS256"
@@ -138,3 +144,20 @@ async def test_valid_jwt(middleware, mock_request, mock_response, monkeypatch):
 
     assert response.status_code == HTTPStatus.OK
     assert response.body == mock_response.body
+
+
+@pytest.mark.asyncio
+async def test_claims_kept_on_request(
+    middleware, mock_request, mock_response, monkeypatch
+):
+    mock_call_next = AsyncMock(return_value=mock_response)
+    monkeypatch.setenv("JWT_SECRET", "test_secret")
+    reload_settings()
+
+    token = jwt.encode({"sub": "tenant-a"}, os.environ["JWT_SECRET"], algorithm="HS256")
+    mock_request.headers = {"Authorization": token}
+
+    response = await middleware.dispatch(mock_request, mock_call_next)
+
+    assert response.status_code == HTTPStatus.OK
+    assert mock_request.scope["state"]["jwt_claims"] == {"sub": "tenant-a"}
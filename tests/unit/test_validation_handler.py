@@ -3,6 +3,7 @@ from pydantic import ValidationError
 from unittest.mock import AsyncMock, MagicMock, patch
 
 from middlewares.validation_handler import ValidationHandler
+from utils.monitoring.stage_timing import NESTED_SECONDS_KEY
 from utils.structure_logging.logger_config import logger
 
 
@@ -15,6 +16,7 @@ async def test_valid_request(mock_route_validation_mapping):
     request = AsyncMock()
     request.url.path = "/api/v1/predict"
     request.json = AsyncMock(return_value={"key": "value"})
+    request.scope = {}
 
     call_next = AsyncMock()
     handler = ValidationHandler(app=MagicMock())
@@ -23,6 +25,8 @@ async def test_valid_request(mock_route_validation_mapping):
 
     mock_route_validation_mapping.assert_called_once()
     mock_validation_strategy.model_validate.assert_called_once_with({"key": "value"})
+    # the body parsing is excluded from the validation stage
+    assert NESTED_SECONDS_KEY in request.scope
     call_next.assert_called_once()
 
 
@@ -35,6 +39,7 @@ async def test_invalid_request(mock_route_validation_mapping):
     request = AsyncMock()
     request.url.path = "/api/v1/predict"
     request.json = AsyncMock(return_value={"key": "value"})
+    request.scope = {}
     mock_errors = [
         {
             "type": "missing",
@@ -92,6 +97,7 @@ async def test_unexpected_exception(mock_route_validation_mapping):
     request = AsyncMock()
     request.url.path = "/api/v1/predict"
     request.json = AsyncMock(return_value={"key": "value"})
+    request.scope = {}
 
     call_next = AsyncMock()
     handler = ValidationHandler(app=MagicMock())
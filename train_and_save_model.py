@@ -4,15 +4,20 @@ import os
 import pickle
 import bentoml
 from sklearn.datasets import load_iris
-from sklearn.neighbors import KNeighborsClassifier
+from sklearn.neighbors import KNeighborsClassifier, NearestCentroid
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score
 import logging
 
+from utils.monitoring.drift_monitor import build_baseline, save_baseline
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Names of the iris features in the requests of the predict API
+FEATURE_NAMES = ["sepal_length", "sepal_width", "petal_length", "petal_width"]
+
 
 def train_and_save_model() -> None:
     # Load the Iris dataset
@@ -46,7 +51,28 @@ def train_and_save_model() -> None:
 
     # Save the model to BentoML model store
     bentoml_model = bentoml.picklable_model.save_model("iris_knn_model", model)
-    logger.info(f"Model saved to BentoML model store with ID: {bentoml_model.id}")
+    logger.info(f"Model saved to BentoML model store with tag: {bentoml_model.tag}")
+
+    # Train the cheap fallback model served when the service is overloaded: it
+    # compares an input with one centroid per class instead of every training row
+    logger.info("Training NearestCentroid fallback model...")
+    fallback_model = NearestCentroid()
+    fallback_model.fit(X_train, y_train)
+    fallback_accuracy = accuracy_score(y_test, fallback_model.predict(X_test))
+    logger.info(f"Fallback model accuracy: {fallback_accuracy:.2f}")
+
+    fallback_model_file_path = "./models/iris_fallback.pickle"
+    logger.info(f"Saving the fallback model to {fallback_model_file_path}...")
+    with open(fallback_model_file_path, "wb") as model_file:
+        pickle.dump(fallback_model, model_file)
+    logger.info("Fallback model saved successfully.")
+
+    # Save the distribution of the training features, which the served inputs are
+    # compared with to detect drift
+    baseline_file_path = "./models/iris_baseline.json"
+    logger.info(f"Saving the training data baseline to {baseline_file_path}...")
+    save_baseline(build_baseline(X_train, FEATURE_NAMES), baseline_file_path)
+    logger.info("Training data baseline saved successfully.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,96 @@
+"""
+This module provides an adaptive concurrency limit for admission control.
+
+`AIMDConcurrencyLimiter` admits a request only while fewer than `limit` requests are
+in flight, and adapts the limit to the load the service can take, like TCP congestion
+control (additive increase, multiplicative decrease):
+
+- every request which waited longer than the target queue time for a worker thread
+  signals congestion, and the limit is multiplied by the backoff ratio, at most once
+  per cooldown so a burst of congested requests counts as one signal;
+- every other request which completed while the limit was in use grows the limit by
+  `1 / limit`, i.e. by about one per limit's worth of requests.
+
+The limiter is used from the event loop only and needs no lock.
+"""
+
+import time
+from typing import Callable, Optional
+
+
+class AIMDConcurrencyLimiter:
+    """
+    Concurrency limit adapted with additive increase and multiplicative decrease.
+
+    Attributes:
+        limit (float): Current limit, between `min_limit` and `max_limit`.
+        in_flight (int): Number of admitted requests not released yet.
+        target_queue_seconds (float): Queue time above which a request signals
+            congestion.
+        backoff_ratio (float): Factor applied to the limit on congestion.
+        cooldown_seconds (float): Minimum time between two decreases.
+        on_change (Callable, optional): Called with the new integer limit whenever it
+            changes.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        target_queue_seconds: float,
+        backoff_ratio: float = 0.9,
+        cooldown_seconds: float = 0.1,
+        on_change: Optional[Callable[[int], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.target_queue_seconds = target_queue_seconds
+        self.backoff_ratio = backoff_ratio
+        self.cooldown_seconds = cooldown_seconds
+        self.on_change = on_change
+        self.in_flight = 0
+        self._clock = clock
+        self._last_decrease = float("-inf")
+        self._notify(int(self.limit))
+
+    def _notify(self, limit: int) -> None:
+        if self.on_change is not None:
+            self.on_change(limit)
+
+    def _set_limit(self, limit: float) -> None:
+        previous = int(self.limit)
+        self.limit = min(max(limit, self.min_limit), self.max_limit)
+        if int(self.limit) != previous:
+            self._notify(int(self.limit))
+
+    def try_acquire(self) -> bool:
+        """
+        Admits a request if the limit allows it.
+        """
+        if self.in_flight >= int(self.limit):
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self, queue_seconds: Optional[float] = None) -> None:
+        """
+        Releases an admitted request and adapts the limit to the time it waited for a
+        worker thread. Requests which never reached a worker thread leave the limit
+        unchanged.
+        """
+        # the limit was in use if the request was admitted close to it
+        limit_in_use = self.in_flight * 2 >= self.limit
+        self.in_flight -= 1
+        if queue_seconds is None:
+            return
+
+        if queue_seconds > self.target_queue_seconds:
+            now = self._clock()
+            if now - self._last_decrease >= self.cooldown_seconds:
+                self._last_decrease = now
+                self._set_limit(self.limit * self.backoff_ratio)
+        elif limit_in_use:
+            self._set_limit(self.limit + 1 / self.limit)
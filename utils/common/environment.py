@@ -0,0 +1,23 @@
+"""
+This module loads the `.env` file into the environment.
+
+`utils.common.settings` calls `load_environment()` before reading the settings, and so
+does any script reading the environment directly. The file is parsed only once per
+process, however often the settings are reloaded.
+"""
+
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+
+@lru_cache(maxsize=1)
+def load_environment() -> bool:
+    """
+    Loads the `.env` file on the first call. Variables already set in the environment
+    take precedence.
+
+    Returns:
+        bool: Whether a `.env` file was found.
+    """
+    return load_dotenv()
@@ -0,0 +1,41 @@
+"""
+This module decides, for every request, whether the fallback model serves it.
+
+When the service is overloaded a slightly less accurate answer is better than a
+timeout, so a request is served by the cheaper fallback model (`FALLBACK_MODEL_PATH`)
+when either:
+
+- it waited longer than `FALLBACK_QUEUE_MS` in a priority lane or for a worker thread,
+  i.e. the service is saturated;
+- it was admitted with `FALLBACK_ADMISSION_UTILIZATION` or more of the concurrency
+  limit of the admission control in use, i.e. the service is about to shed load.
+"""
+
+from typing import Optional
+
+from utils.common.settings import Settings
+from utils.monitoring.runtime_metrics import QUEUE_WAIT_SECONDS_KEY
+
+# Scope key holding the share of the concurrency limit in use when the request was
+# admitted, set by `AdmissionControl`
+ADMISSION_UTILIZATION_KEY = "admission_control.utilization"
+
+QUEUE_TIME = "queue_time"
+ADMISSION = "admission"
+
+
+def fallback_reason(scope, settings: Settings) -> Optional[str]:
+    """
+    Returns why the request should be served by the fallback model, or None if the
+    primary model serves it.
+    """
+    queue_seconds = scope.get(QUEUE_WAIT_SECONDS_KEY)
+    if queue_seconds is not None and queue_seconds * 1000 > settings.fallback_queue_ms:
+        return QUEUE_TIME
+    utilization = scope.get(ADMISSION_UTILIZATION_KEY)
+    if (
+        utilization is not None
+        and utilization >= settings.fallback_admission_utilization
+    ):
+        return ADMISSION
+    return None
@@ -0,0 +1,107 @@
+"""
+This module tracks the latency budget and the deadline of the request being served.
+
+Both are stored as monotonic deadlines in context variables. They are set once per
+request by the `SetLogDefaultParameters` middleware, and every later stage (including
+code running in the worker thread pool, which inherits the request context) can check
+how much time is left before doing expensive work:
+
+- the latency budget (`REQUEST_LATENCY_BUDGET_MS`) is soft: downstream calls are
+  skipped once it is used up, and the request is still answered;
+- the deadline is hard: the client gave up on the request by then, so the request is
+  dropped with 504 Gateway Timeout. It is the timeout sent by the client in the
+  `X-Request-Timeout-Ms` header, bounded by the timeout of the route
+  (`REQUEST_ROUTE_TIMEOUTS_MS`).
+
+The latency budget never ends after the deadline.
+"""
+
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from utils.common.settings import get_settings
+
+DEADLINE_HEADER = "x-request-timeout-ms"
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+_hard_deadline: ContextVar[Optional[float]] = ContextVar(
+    "request_hard_deadline", default=None
+)
+
+
+def set_latency_budget(seconds: Optional[float]) -> None:
+    """
+    Sets the latency budget of the current request. None removes the budget.
+    """
+    _deadline.set(None if seconds is None else time.monotonic() + seconds)
+
+
+def parse_timeout_ms(value: Optional[str]) -> Optional[float]:
+    """
+    Parses the timeout sent by a client in milliseconds. Invalid values are ignored.
+    """
+    if value is None:
+        return None
+    try:
+        timeout_ms = float(value)
+    except (TypeError, ValueError):
+        return None
+    # NaN is never past, infinity is no deadline
+    if timeout_ms != timeout_ms or timeout_ms == float("inf"):
+        return None
+    return max(timeout_ms, 0.0)
+
+
+def start_request_budget(route: str = None, timeout_header: str = None) -> None:
+    """
+    Starts the latency budget and the deadline of the request being served.
+
+    Args:
+        route (str, optional): Path of the request, whose route timeout applies.
+        timeout_header (str, optional): Value of the `X-Request-Timeout-Ms` header.
+    """
+    settings = get_settings()
+    timeouts_ms = [
+        timeout_ms
+        for timeout_ms in (
+            dict(settings.request_route_timeouts_ms).get(route),
+            parse_timeout_ms(timeout_header),
+        )
+        if timeout_ms is not None
+    ]
+    now = time.monotonic()
+    hard_deadline = now + min(timeouts_ms) / 1000 if timeouts_ms else None
+    _hard_deadline.set(hard_deadline)
+
+    budget_ms = settings.request_latency_budget_ms
+    deadline = now + budget_ms / 1000 if budget_ms else None
+    if hard_deadline is not None and (deadline is None or hard_deadline < deadline):
+        deadline = hard_deadline
+    _deadline.set(deadline)
+
+
+def remaining_budget() -> Optional[float]:
+    """
+    Returns the seconds left in the current request's budget, or None if unbounded.
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def budget_exhausted(reserve_seconds: float = 0.0) -> bool:
+    """
+    Checks whether less than `reserve_seconds` are left in the current request's budget.
+    """
+    remaining = remaining_budget()
+    return remaining is not None and remaining <= reserve_seconds
+
+
+def deadline_exceeded() -> bool:
+    """
+    Checks whether the deadline of the current request has passed.
+    """
+    hard_deadline = _hard_deadline.get()
+    return hard_deadline is not None and time.monotonic() >= hard_deadline
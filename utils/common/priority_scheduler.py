@@ -0,0 +1,135 @@
+"""
+This module provides a weighted fair scheduler dispatching requests from priority lanes.
+
+Every lane has its own queue and concurrency budget, and the scheduler hands at most
+`max_concurrency` requests of all lanes to the model at once. When a slot is free, the
+next request comes from the lane with the earliest virtual finish time among the lanes
+with waiting requests and a free slot in their budget (weighted fair queueing):
+dispatching a request advances the virtual time of its lane by `1 / weight`, so two
+backlogged lanes with weights 9 and 1 are served nine requests to one. A lane which
+was idle starts at the current virtual time, and cannot claim the share it did not use.
+
+The scheduler is used from the event loop only and needs no lock.
+"""
+
+import asyncio
+from collections import deque
+from typing import Deque, Iterable
+
+
+class LaneFull(Exception):
+    """
+    Raised when the queue of a lane is full.
+    """
+
+
+class Lane:
+    """
+    Queue and concurrency budget of one priority class.
+
+    Attributes:
+        name (str): Name of the lane.
+        weight (float): Share of the dispatches when several lanes are backlogged.
+        max_concurrency (int): Maximum number of requests of the lane in flight.
+        max_queue (int): Maximum number of requests waiting in the lane.
+    """
+
+    def __init__(self, name: str, weight: float, max_concurrency: int, max_queue: int):
+        self.name = name
+        self.weight = weight
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.waiting: Deque[asyncio.Future] = deque()
+        self.virtual_time = 0.0
+
+    def has_room(self) -> bool:
+        return self.in_flight < self.max_concurrency
+
+
+class WeightedFairScheduler:
+    """
+    Dispatches the requests of priority lanes with weighted fair queueing.
+
+    Usage:
+        await scheduler.acquire("interactive")
+        try:
+            ...
+        finally:
+            scheduler.release("interactive")
+    """
+
+    def __init__(self, lanes: Iterable[Lane], max_concurrency: int):
+        self.lanes = {lane.name: lane for lane in lanes}
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        # start time of the last dispatched request
+        self._virtual_time = 0.0
+
+    @staticmethod
+    def _finish_time(lane: Lane) -> float:
+        return lane.virtual_time + 1 / lane.weight
+
+    def _start(self, lane: Lane) -> None:
+        self._virtual_time = lane.virtual_time
+        lane.virtual_time += 1 / lane.weight
+        lane.in_flight += 1
+        self.in_flight += 1
+
+    def _dispatch(self) -> None:
+        while self.in_flight < self.max_concurrency:
+            for lane in self.lanes.values():
+                # requests which gave up while waiting
+                while lane.waiting and lane.waiting[0].cancelled():
+                    lane.waiting.popleft()
+            ready = [
+                lane for lane in self.lanes.values() if lane.waiting and lane.has_room()
+            ]
+            if not ready:
+                return
+            lane = min(ready, key=self._finish_time)
+            self._start(lane)
+            lane.waiting.popleft().set_result(None)
+
+    async def acquire(self, name: str) -> None:
+        """
+        Waits until a request of the lane can be handed to the model.
+
+        Raises:
+            LaneFull: If the queue of the lane is full.
+        """
+        lane = self.lanes[name]
+        if not lane.waiting:
+            # the lane was not backlogged, the share it did not use is lost
+            lane.virtual_time = max(lane.virtual_time, self._virtual_time)
+        if (
+            not lane.waiting
+            and lane.has_room()
+            and self.in_flight < self.max_concurrency
+        ):
+            self._start(lane)
+            return
+        if len(lane.waiting) >= lane.max_queue:
+            raise LaneFull(name)
+
+        future = asyncio.get_running_loop().create_future()
+        lane.waiting.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                if future in lane.waiting:
+                    lane.waiting.remove(future)
+            else:
+                # dispatched right before the request gave up
+                self.release(name)
+            raise
+
+    def release(self, name: str) -> None:
+        """
+        Releases a request of the lane and dispatches the next waiting request.
+        """
+        lane = self.lanes[name]
+        lane.in_flight -= 1
+        self.in_flight -= 1
+        self._dispatch()
@@ -0,0 +1,103 @@
+"""
+This module provides per-tenant token bucket rate limiting.
+
+Every tenant has a bucket holding up to `burst` tokens, refilled at `rate` tokens per
+second. A request takes one token and is refused while the bucket is empty, so a
+tenant can send `burst` requests at once and `rate` requests per second over time.
+
+The buckets are refilled lazily when a tenant sends a request, and at most
+`max_tenants` buckets are kept: the bucket of the tenant idle for the longest time is
+evicted first. An evicted tenant starts again with a full bucket, which it would have
+refilled by then unless it is idle for less than `burst / rate` seconds.
+
+The limiter is used from the event loop only and needs no lock.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Callable, Mapping, Optional
+
+
+class TokenBucket:
+    """
+    Tokens left for one tenant, as of `updated_at`.
+    """
+
+    __slots__ = ("tokens", "updated_at")
+
+    def __init__(self, tokens: float, updated_at: float):
+        self.tokens = tokens
+        self.updated_at = updated_at
+
+
+class TenantRateLimiter:
+    """
+    Token bucket rate limit per tenant, with a bounded number of buckets.
+
+    Attributes:
+        rate (float, optional): Requests per second of every tenant, unlimited when
+            None. A tenant with a rate of 0 is rejected.
+        burst (float, optional): Size of the buckets, one second worth of requests
+            (at least one) when None.
+        tenant_rates (Mapping[str, float]): Rates of the tenants which do not use the
+            default rate.
+        max_tenants (int): Maximum number of buckets kept.
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float],
+        burst: Optional[float] = None,
+        tenant_rates: Optional[Mapping[str, float]] = None,
+        max_tenants: int = 10000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.tenant_rates = dict(tenant_rates or {})
+        self.max_tenants = max_tenants
+        self._clock = clock
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate is not None or bool(self.tenant_rates)
+
+    def _limits(self, tenant: str):
+        rate = self.tenant_rates.get(tenant, self.rate)
+        if rate is None:
+            return None, None
+        return rate, self.burst if self.burst is not None else max(rate, 1.0)
+
+    def acquire(self, tenant: str) -> float:
+        """
+        Takes a token from the bucket of the tenant.
+
+        Returns:
+            float: 0 if the request is admitted, otherwise the seconds until the
+                bucket holds a token again.
+        """
+        rate, burst = self._limits(tenant)
+        if rate is None:
+            return 0.0
+        if rate <= 0:
+            return float("inf")
+
+        now = self._clock()
+        bucket = self._buckets.get(tenant)
+        if bucket is None:
+            bucket = self._buckets[tenant] = TokenBucket(burst, now)
+            if len(self._buckets) > self.max_tenants:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(tenant)
+            bucket.tokens = min(burst, bucket.tokens + (now - bucket.updated_at) * rate)
+            bucket.updated_at = now
+
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return 0.0
+        return (1 - bucket.tokens) / rate
@@ -0,0 +1,43 @@
+"""
+This module tracks whether the worker is ready to serve traffic.
+
+The worker is ready once every required startup step has succeeded: the model is
+loaded and warmed up and, when `WARMUP_THROUGH_MIDDLEWARES` is enabled, the sample
+requests have been replayed through the middleware stack. The `ReadinessGate`
+middleware answers the readiness probe from this state.
+"""
+
+import threading
+
+from utils.common.settings import get_settings
+from utils.structure_logging.logger_config import logger
+
+MODEL_WARMUP = "model_warmup"
+MIDDLEWARE_WARMUP = "middleware_warmup"
+
+
+class Readiness:
+    """
+    Set of startup steps which must succeed before the worker is ready.
+    """
+
+    def __init__(self, required_steps):
+        self.required_steps = frozenset(required_steps)
+        self._completed_steps = set()
+        self._lock = threading.Lock()
+
+    def mark_completed(self, step: str) -> None:
+        with self._lock:
+            self._completed_steps.add(step)
+            ready = self._completed_steps >= self.required_steps
+        logger.warning("Startup step completed", step=step, ready=ready)
+
+    def is_ready(self) -> bool:
+        return self._completed_steps >= self.required_steps
+
+
+readiness = Readiness(
+    [MODEL_WARMUP, MIDDLEWARE_WARMUP]
+    if get_settings().warmup_through_middlewares
+    else [MODEL_WARMUP]
+)
@@ -0,0 +1,49 @@
+"""
+This module reads request corpora: JSONL files of sample API requests.
+
+Every line is either a request body, e.g. `{"sepal_length": 5.1, ...}`, or an object
+with the route and the body of the request, e.g.
+`{"route": "/api/v1/predict", "body": {"sepal_length": 5.1, ...}}`. Corpora are used
+to warm the service up and to replay traffic with the load testing harness.
+"""
+
+import json
+from typing import Dict, List, NamedTuple, Optional
+
+DEFAULT_ROUTE = "/api/v1/predict"
+
+
+class CorpusRequest(NamedTuple):
+    route: str
+    body: Dict
+
+
+def load_request_corpus(
+    corpus_path: str, default_route: str = DEFAULT_ROUTE, limit: Optional[int] = None
+) -> List[CorpusRequest]:
+    """
+    Loads the requests of a JSONL corpus. Blank lines are skipped.
+
+    Args:
+        corpus_path (str): Path of the JSONL file.
+        default_route (str): Route of the lines which only contain a request body.
+        limit (int, optional): Maximum number of requests to load.
+
+    Returns:
+        List[CorpusRequest]: The requests of the corpus.
+    """
+    requests = []
+    with open(corpus_path, "r") as corpus_file:
+        for line in corpus_file:
+            if limit is not None and len(requests) >= limit:
+                break
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "body" in record:
+                requests.append(
+                    CorpusRequest(record.get("route", default_route), record["body"])
+                )
+            else:
+                requests.append(CorpusRequest(default_route, record))
+    return requests
@@ -0,0 +1,551 @@
+"""
+This module holds the typed settings of the service.
+
+The environment (and the `.env` file) is read and validated once, into an immutable
+`Settings` snapshot. Request handling reads plain attributes of the snapshot returned
+by `get_settings()` and never touches the environment or reparses values.
+
+`reload_settings()` is the explicit reload hook: it reads the environment again, swaps
+the snapshot in and notifies the listeners registered with `add_reload_listener()`, so
+components holding derived state can rebuild it.
+"""
+
+import logging
+import math
+import os
+import threading
+from dataclasses import dataclass
+from typing import Callable, List, Mapping, Optional, Tuple
+
+from utils.common.environment import load_environment
+
+ENVIRONMENTS = ("development", "staging", "production")
+
+
+class SettingsError(ValueError):
+    """
+    Raised when environment variables hold invalid values.
+    """
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Snapshot of the service configuration. See the README for the environment
+    variable behind every attribute.
+    """
+
+    environment: str = "development"
+    log_level: str = "WARNING"
+    jwt_secret: Optional[str] = None
+    jwt_expiration_minutes: int = 1
+    model_path: str = "./models/iris.pickle"
+    model_reload_interval_seconds: float = 10.0
+    fallback_model_path: Optional[str] = None
+    fallback_queue_ms: float = 100.0
+    fallback_admission_utilization: float = 0.9
+    shadow_model_path: Optional[str] = None
+    shadow_sample_rate: float = 0.1
+    shadow_sample_rate_path: Optional[str] = None
+    shadow_queue_size: int = 1000
+    shadow_workers: int = 1
+    drift_baseline_path: Optional[str] = None
+    drift_window_size: int = 1000
+    request_capture_dir: Optional[str] = None
+    request_capture_sample_rate: float = 0.01
+    request_capture_file_mb: int = 64
+    request_capture_record_bytes: int = 4096
+    request_latency_budget_ms: Optional[float] = None
+    request_route_timeouts_ms: Tuple[Tuple[str, float], ...] = ()
+    warmup_sample_path: Optional[str] = None
+    warmup_sample_limit: int = 100
+    warmup_through_middlewares: bool = False
+    dynamodb_endpoint_url: str = "http://localhost:8000"
+    aws_region_name: str = "ap-south-1"
+    dynamodb_connect_timeout: int = 1
+    dynamodb_read_timeout: int = 1
+    dynamodb_total_max_attempts: int = 2
+    dynamodb_max_pool_connections: int = 20
+    dynamodb_breaker_failure_rate: float = 0.5
+    dynamodb_breaker_p99_latency_seconds: float = 0.5
+    dynamodb_breaker_window_size: int = 100
+    dynamodb_breaker_minimum_calls: int = 20
+    dynamodb_breaker_minimum_slow_calls: int = 5
+    dynamodb_breaker_open_seconds: float = 5.0
+    dynamodb_stale_cache_size: int = 1024
+    dynamodb_min_remaining_budget_seconds: float = 0.01
+    metrics_latency_buckets: Optional[Tuple[float, ...]] = None
+    metrics_flush_interval_seconds: float = 1.0
+    profiling_max_seconds: float = 30.0
+    runtime_metrics_interval_seconds: float = 1.0
+    event_loop_lag_interval_seconds: float = 0.1
+    admission_control_enabled: bool = True
+    admission_initial_limit: int = 32
+    admission_min_limit: int = 1
+    admission_max_limit: int = 256
+    admission_target_queue_ms: float = 50.0
+    admission_max_queue_ms: float = 1000.0
+    rate_limit_requests_per_second: Optional[float] = None
+    rate_limit_burst: Optional[float] = None
+    rate_limit_tenant_rates: Tuple[Tuple[str, float], ...] = ()
+    rate_limit_tenant_claim: str = "sub"
+    rate_limit_max_tenants: int = 10000
+    priority_lanes_enabled: bool = False
+    priority_max_concurrency: int = 2
+    priority_interactive_weight: float = 9.0
+    priority_bulk_weight: float = 1.0
+    priority_bulk_max_concurrency: int = 1
+    priority_interactive_max_queue: int = 64
+    priority_bulk_max_queue: int = 256
+    priority_bulk_routes: Tuple[str, ...] = ()
+
+    @property
+    def is_production(self) -> bool:
+        return self.environment == "production"
+
+    @classmethod
+    def from_environment(cls, environ: Mapping[str, str] = os.environ) -> "Settings":
+        """
+        Reads and validates the settings from environment variables.
+
+        Raises:
+            SettingsError: If any variable holds an invalid value. Every invalid
+                variable is listed in the message.
+        """
+        reader = _EnvironmentReader(environ)
+        defaults = cls()
+        settings = cls(
+            # unknown environments and log levels were accepted before the settings
+            # were validated, so they are only warned about
+            environment=reader.choice(
+                "ENVIRONMENT", defaults.environment, ENVIRONMENTS, strict=False
+            ),
+            log_level=reader.choice(
+                "LOG_LEVEL",
+                defaults.log_level,
+                ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"),
+                transform=str.upper,
+                strict=False,
+            ),
+            jwt_secret=reader.string("JWT_SECRET", defaults.jwt_secret),
+            jwt_expiration_minutes=reader.number(
+                "JWT_EXPIRATION_MINUTES", defaults.jwt_expiration_minutes, int, 1
+            ),
+            model_path=reader.string("MODEL_PATH", defaults.model_path),
+            model_reload_interval_seconds=reader.number(
+                "MODEL_RELOAD_INTERVAL_SECONDS",
+                defaults.model_reload_interval_seconds,
+                float,
+                0,
+            ),
+            fallback_model_path=reader.string(
+                "FALLBACK_MODEL_PATH", defaults.fallback_model_path
+            ),
+            fallback_queue_ms=reader.number(
+                "FALLBACK_QUEUE_MS", defaults.fallback_queue_ms, float, 0
+            ),
+            fallback_admission_utilization=reader.number(
+                "FALLBACK_ADMISSION_UTILIZATION",
+                defaults.fallback_admission_utilization,
+                float,
+                0,
+                1,
+            ),
+            shadow_model_path=reader.string(
+                "SHADOW_MODEL_PATH", defaults.shadow_model_path
+            ),
+            shadow_sample_rate=reader.number(
+                "SHADOW_SAMPLE_RATE", defaults.shadow_sample_rate, float, 0, 1
+            ),
+            shadow_sample_rate_path=reader.string(
+                "SHADOW_SAMPLE_RATE_PATH", defaults.shadow_sample_rate_path
+            ),
+            shadow_queue_size=reader.number(
+                "SHADOW_QUEUE_SIZE", defaults.shadow_queue_size, int, 1
+            ),
+            shadow_workers=reader.number(
+                "SHADOW_WORKERS", defaults.shadow_workers, int, 1
+            ),
+            drift_baseline_path=reader.string(
+                "DRIFT_BASELINE_PATH", defaults.drift_baseline_path
+            ),
+            drift_window_size=reader.number(
+                "DRIFT_WINDOW_SIZE", defaults.drift_window_size, int, 1
+            ),
+            request_capture_dir=reader.string(
+                "REQUEST_CAPTURE_DIR", defaults.request_capture_dir
+            ),
+            request_capture_sample_rate=reader.number(
+                "REQUEST_CAPTURE_SAMPLE_RATE",
+                defaults.request_capture_sample_rate,
+                float,
+                0,
+                1,
+            ),
+            request_capture_file_mb=reader.number(
+                "REQUEST_CAPTURE_FILE_MB", defaults.request_capture_file_mb, int, 1
+            ),
+            request_capture_record_bytes=reader.number(
+                "REQUEST_CAPTURE_RECORD_BYTES",
+                defaults.request_capture_record_bytes,
+                int,
+                256,
+            ),
+            request_latency_budget_ms=reader.number(
+                "REQUEST_LATENCY_BUDGET_MS",
+                defaults.request_latency_budget_ms,
+                float,
+                1,
+            ),
+            request_route_timeouts_ms=reader.mapping(
+                "REQUEST_ROUTE_TIMEOUTS_MS", defaults.request_route_timeouts_ms
+            ),
+            warmup_sample_path=reader.string(
+                "WARMUP_SAMPLE_PATH", defaults.warmup_sample_path
+            ),
+            warmup_sample_limit=reader.number(
+                "WARMUP_SAMPLE_LIMIT", defaults.warmup_sample_limit, int, 0
+            ),
+            warmup_through_middlewares=reader.boolean(
+                "WARMUP_THROUGH_MIDDLEWARES", defaults.warmup_through_middlewares
+            ),
+            dynamodb_endpoint_url=reader.string(
+                "DYNAMODB_ENDPOINT_URL", defaults.dynamodb_endpoint_url
+            ),
+            aws_region_name=reader.string("AWS_REGION_NAME", defaults.aws_region_name),
+            dynamodb_connect_timeout=reader.number(
+                "DYNAMODB_CONNECT_TIMEOUT", defaults.dynamodb_connect_timeout, int, 0
+            ),
+            dynamodb_read_timeout=reader.number(
+                "DYNAMODB_READ_TIMEOUT", defaults.dynamodb_read_timeout, int, 0
+            ),
+            dynamodb_total_max_attempts=reader.number(
+                "DYNAMODB_TOTAL_MAX_ATTEMPTS",
+                defaults.dynamodb_total_max_attempts,
+                int,
+                1,
+            ),
+            dynamodb_max_pool_connections=reader.number(
+                "MAX_POOL_CONNECTIONS", defaults.dynamodb_max_pool_connections, int, 1
+            ),
+            dynamodb_breaker_failure_rate=reader.number(
+                "DYNAMODB_BREAKER_FAILURE_RATE",
+                defaults.dynamodb_breaker_failure_rate,
+                float,
+                0,
+                1,
+            ),
+            dynamodb_breaker_p99_latency_seconds=reader.number(
+                "DYNAMODB_BREAKER_P99_LATENCY_SECONDS",
+                defaults.dynamodb_breaker_p99_latency_seconds,
+                float,
+                0,
+            ),
+            dynamodb_breaker_window_size=reader.number(
+                "DYNAMODB_BREAKER_WINDOW_SIZE",
+                defaults.dynamodb_breaker_window_size,
+                int,
+                1,
+            ),
+            dynamodb_breaker_minimum_calls=reader.number(
+                "DYNAMODB_BREAKER_MINIMUM_CALLS",
+                defaults.dynamodb_breaker_minimum_calls,
+                int,
+                1,
+            ),
+            dynamodb_breaker_minimum_slow_calls=reader.number(
+                "DYNAMODB_BREAKER_MINIMUM_SLOW_CALLS",
+                defaults.dynamodb_breaker_minimum_slow_calls,
+                int,
+                1,
+            ),
+            dynamodb_breaker_open_seconds=reader.number(
+                "DYNAMODB_BREAKER_OPEN_SECONDS",
+                defaults.dynamodb_breaker_open_seconds,
+                float,
+                0,
+            ),
+            dynamodb_stale_cache_size=reader.number(
+                "DYNAMODB_STALE_CACHE_SIZE", defaults.dynamodb_stale_cache_size, int, 0
+            ),
+            dynamodb_min_remaining_budget_seconds=reader.number(
+                "DYNAMODB_MIN_REMAINING_BUDGET_SECONDS",
+                defaults.dynamodb_min_remaining_budget_seconds,
+                float,
+                0,
+            ),
+            metrics_latency_buckets=reader.buckets(
+                "METRICS_LATENCY_BUCKETS", defaults.metrics_latency_buckets
+            ),
+            metrics_flush_interval_seconds=reader.number(
+                "METRICS_FLUSH_INTERVAL_SECONDS",
+                defaults.metrics_flush_interval_seconds,
+                float,
+                0.01,
+            ),
+            profiling_max_seconds=reader.number(
+                "PROFILING_MAX_SECONDS", defaults.profiling_max_seconds, float, 0
+            ),
+            runtime_metrics_interval_seconds=reader.number(
+                "RUNTIME_METRICS_INTERVAL_SECONDS",
+                defaults.runtime_metrics_interval_seconds,
+                float,
+                0.01,
+            ),
+            event_loop_lag_interval_seconds=reader.number(
+                "EVENT_LOOP_LAG_INTERVAL_SECONDS",
+                defaults.event_loop_lag_interval_seconds,
+                float,
+                0.001,
+            ),
+            admission_control_enabled=reader.boolean(
+                "ADMISSION_CONTROL_ENABLED", defaults.admission_control_enabled
+            ),
+            admission_initial_limit=reader.number(
+                "ADMISSION_INITIAL_LIMIT", defaults.admission_initial_limit, int, 1
+            ),
+            admission_min_limit=reader.number(
+                "ADMISSION_MIN_LIMIT", defaults.admission_min_limit, int, 1
+            ),
+            admission_max_limit=reader.number(
+                "ADMISSION_MAX_LIMIT", defaults.admission_max_limit, int, 1
+            ),
+            admission_target_queue_ms=reader.number(
+                "ADMISSION_TARGET_QUEUE_MS",
+                defaults.admission_target_queue_ms,
+                float,
+                0,
+            ),
+            admission_max_queue_ms=reader.number(
+                "ADMISSION_MAX_QUEUE_MS", defaults.admission_max_queue_ms, float, 0
+            ),
+            rate_limit_requests_per_second=reader.number(
+                "RATE_LIMIT_REQUESTS_PER_SECOND",
+                defaults.rate_limit_requests_per_second,
+                float,
+                0,
+            ),
+            rate_limit_burst=reader.number(
+                "RATE_LIMIT_BURST", defaults.rate_limit_burst, float, 1
+            ),
+            rate_limit_tenant_rates=reader.mapping(
+                "RATE_LIMIT_TENANT_RATES", defaults.rate_limit_tenant_rates
+            ),
+            rate_limit_tenant_claim=reader.string(
+                "RATE_LIMIT_TENANT_CLAIM", defaults.rate_limit_tenant_claim
+            ),
+            rate_limit_max_tenants=reader.number(
+                "RATE_LIMIT_MAX_TENANTS", defaults.rate_limit_max_tenants, int, 1
+            ),
+            priority_lanes_enabled=reader.boolean(
+                "PRIORITY_LANES_ENABLED", defaults.priority_lanes_enabled
+            ),
+            priority_max_concurrency=reader.number(
+                "PRIORITY_MAX_CONCURRENCY", defaults.priority_max_concurrency, int, 1
+            ),
+            priority_interactive_weight=reader.number(
+                "PRIORITY_INTERACTIVE_WEIGHT",
+                defaults.priority_interactive_weight,
+                float,
+                0.01,
+            ),
+            priority_bulk_weight=reader.number(
+                "PRIORITY_BULK_WEIGHT", defaults.priority_bulk_weight, float, 0.01
+            ),
+            priority_bulk_max_concurrency=reader.number(
+                "PRIORITY_BULK_MAX_CONCURRENCY",
+                defaults.priority_bulk_max_concurrency,
+                int,
+                1,
+            ),
+            priority_interactive_max_queue=reader.number(
+                "PRIORITY_INTERACTIVE_MAX_QUEUE",
+                defaults.priority_interactive_max_queue,
+                int,
+                0,
+            ),
+            priority_bulk_max_queue=reader.number(
+                "PRIORITY_BULK_MAX_QUEUE", defaults.priority_bulk_max_queue, int, 0
+            ),
+            priority_bulk_routes=reader.strings(
+                "PRIORITY_BULK_ROUTES", defaults.priority_bulk_routes
+            ),
+        )
+        if settings.admission_min_limit > settings.admission_max_limit:
+            reader.errors.append(
+                "ADMISSION_MIN_LIMIT must not be greater than ADMISSION_MAX_LIMIT"
+            )
+        if reader.errors:
+            raise SettingsError("Invalid settings: " + "; ".join(reader.errors))
+        return settings
+
+
+class _EnvironmentReader:
+    """
+    Parses environment variables, collecting an error for every invalid value.
+    """
+
+    def __init__(self, environ: Mapping[str, str]):
+        self.environ = environ
+        self.errors: List[str] = []
+
+    def _get(self, name: str) -> Optional[str]:
+        value = self.environ.get(name)
+        if value is None or not value.strip():
+            return None
+        return value.strip()
+
+    def string(self, name: str, default):
+        value = self._get(name)
+        return default if value is None else value
+
+    def choice(
+        self, name: str, default: str, choices, transform=str.lower, strict=True
+    ):
+        """
+        Returns the value if it is one of the choices. Other values are an error,
+        unless `strict` is False: the default is then used, with a warning.
+        """
+        value = self._get(name)
+        if value is None:
+            return default
+        value = transform(value)
+        if value not in choices:
+            message = f"{name} must be one of {', '.join(choices)}"
+            if strict:
+                self.errors.append(message)
+            else:
+                logging.getLogger(__name__).warning(
+                    "%s, using %s instead of %s", message, default, value
+                )
+            return default
+        return value
+
+    def boolean(self, name: str, default: bool) -> bool:
+        value = self._get(name)
+        if value is None:
+            return default
+        if value.lower() in ("true", "1", "yes"):
+            return True
+        if value.lower() in ("false", "0", "no"):
+            return False
+        self.errors.append(f"{name} must be true or false")
+        return default
+
+    def number(self, name: str, default, parse, minimum=None, maximum=None):
+        value = self._get(name)
+        if value is None:
+            return default
+        try:
+            number = parse(value)
+        except ValueError:
+            self.errors.append(f"{name} must be a number")
+            return default
+        if not math.isfinite(number):
+            self.errors.append(f"{name} must be a finite number")
+            return default
+        if minimum is not None and maximum is not None:
+            if not minimum <= number <= maximum:
+                self.errors.append(f"{name} must be between {minimum} and {maximum}")
+                return default
+        elif minimum is not None and number < minimum:
+            self.errors.append(f"{name} must be at least {minimum}")
+            return default
+        elif maximum is not None and number > maximum:
+            self.errors.append(f"{name} must be at most {maximum}")
+            return default
+        return number
+
+    def buckets(self, name: str, default):
+        value = self._get(name)
+        if value is None:
+            return default
+        try:
+            buckets = tuple(float(bound) for bound in value.split(","))
+        except ValueError:
+            self.errors.append(f"{name} must be a comma separated list of numbers")
+            return default
+        increasing = list(buckets) == sorted(set(buckets))
+        if not increasing or any(
+            not math.isfinite(bound) or bound <= 0 for bound in buckets
+        ):
+            self.errors.append(f"{name} must be positive and strictly increasing")
+            return default
+        return buckets
+
+    def strings(self, name: str, default):
+        value = self._get(name)
+        if value is None:
+            return default
+        return tuple(item.strip() for item in value.split(",") if item.strip())
+
+    def mapping(self, name: str, default):
+        value = self._get(name)
+        if value is None:
+            return default
+        pairs = []
+        try:
+            for item in value.split(","):
+                key, number = item.rsplit("=", 1)
+                pairs.append((key.strip(), float(number)))
+        except ValueError:
+            self.errors.append(f"{name} must be a comma separated list of key=value")
+            return default
+        if any(
+            not key or not math.isfinite(number) or number < 0 for key, number in pairs
+        ):
+            self.errors.append(f"{name} must hold keys with finite non-negative values")
+            return default
+        return tuple(pairs)
+
+
+_settings: Optional[Settings] = None
+_reload_listeners: List[Callable[[Settings], None]] = []
+_lock = threading.Lock()
+
+
+def get_settings() -> Settings:
+    """
+    Returns the current settings snapshot, reading the environment on the first call.
+    """
+    settings = _settings
+    if settings is None:
+        with _lock:
+            if _settings is None:
+                _load()
+            settings = _settings
+    return settings
+
+
+def _load() -> Settings:
+    global _settings
+    load_environment()
+    _settings = Settings.from_environment()
+    return _settings
+
+
+def reload_settings() -> Settings:
+    """
+    Reads the environment again and swaps the new snapshot in. The current snapshot
+    is kept if the environment holds invalid values.
+
+    Raises:
+        SettingsError: If any variable holds an invalid value.
+    """
+    with _lock:
+        settings = _load()
+        listeners = list(_reload_listeners)
+    for listener in listeners:
+        try:
+            listener(settings)
+        except Exception:
+            logging.getLogger(__name__).exception("Error in settings reload listener")
+    return settings
+
+
+def add_reload_listener(listener: Callable[[Settings], None]) -> None:
+    """
+    Registers a callback invoked with the new snapshot after every reload.
+    """
+    with _lock:
+        _reload_listeners.append(listener)
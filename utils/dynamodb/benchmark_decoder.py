@@ -0,0 +1,77 @@
+"""
+Microbenchmark of `ItemDecoder` against boto3's `TypeDeserializer`.
+
+To run: `python -m utils.dynamodb.benchmark_decoder --items 10000`
+"""
+
+import argparse
+import timeit
+
+from boto3.dynamodb.types import TypeDeserializer
+
+from utils.dynamodb.decoder import ItemDecoder
+
+SCHEMA = {
+    "artist": str,
+    "song": str,
+    "plays": int,
+    "rating": float,
+    "explicit": bool,
+}
+
+
+def make_items(count: int):
+    return [
+        {
+            "artist": {"S": f"artist-{index}"},
+            "song": {"S": f"song-{index}"},
+            "plays": {"N": str(index * 10)},
+            "rating": {"N": str(index / 7)},
+            "explicit": {"BOOL": index % 2 == 0},
+        }
+        for index in range(count)
+    ]
+
+
+def deserialize_items(deserializer: TypeDeserializer, items):
+    deserialize = deserializer.deserialize
+    return [
+        {name: deserialize(value) for name, value in item.items()} for item in items
+    ]
+
+
+def run_benchmark(item_count: int, repeat: int = 5) -> dict:
+    """
+    Times the decoding of `item_count` items, keeping the best of `repeat` runs.
+
+    Returns:
+        dict: Seconds per item for every decoder.
+    """
+    items = make_items(item_count)
+    deserializer = TypeDeserializer()
+    decoder = ItemDecoder(SCHEMA)
+
+    candidates = {
+        "TypeDeserializer": lambda: deserialize_items(deserializer, items),
+        "ItemDecoder.decode_many": lambda: decoder.decode_many(items),
+        "ItemDecoder.to_arrays": lambda: decoder.to_arrays(items),
+    }
+    return {
+        name: min(timeit.repeat(candidate, number=1, repeat=repeat)) / item_count
+        for name, candidate in candidates.items()
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = run_benchmark(args.items, args.repeat)
+    baseline = results["TypeDeserializer"]
+    for name, seconds_per_item in results.items():
+        print(
+            f"{name:<26} {seconds_per_item * 1e6:8.2f} us/item "
+            f"{baseline / seconds_per_item:6.1f}x"
+        )
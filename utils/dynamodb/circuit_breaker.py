@@ -0,0 +1,168 @@
+"""
+This module provides a circuit breaker for the DynamoDB access layer.
+
+The breaker keeps a rolling window of the latest call outcomes. It opens when the
+error rate or the p99 latency of the window crosses its threshold, rejects calls
+while open, and lets a single probe call through once the cool-down has elapsed
+(half-open). A successful probe closes the breaker again, a failed one re-opens it.
+"""
+
+import threading
+import time
+from collections import deque
+
+from utils.monitoring.prometheus_metrics import (
+    bentoml_service_circuit_breaker_state,
+    bentoml_service_circuit_breaker_transitions_total,
+)
+from utils.structure_logging.logger_config import logger
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# the p99 latency is above the threshold when more than 1% of the calls are
+LATENCY_PERCENTILE = 0.99
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised when a call is rejected because the circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Error rate and p99 latency based circuit breaker.
+
+    Attributes:
+        name (str): Name used in logs and in the metric labels.
+        failure_rate_threshold (float): Error rate (0-1) of the window that opens the breaker.
+        latency_threshold_seconds (float): p99 latency of the window that opens the breaker.
+        window_size (int): Number of latest calls the rates are computed over.
+        minimum_calls (int): Number of calls needed in the window before it can open.
+        minimum_slow_calls (int): Number of calls above the latency threshold needed
+            before it can open on latency. On a window of a hundred calls or fewer,
+            the p99 is the slowest call, which alone must not open the breaker.
+        open_seconds (float): Cool-down before a probe call is let through.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        latency_threshold_seconds: float = 0.5,
+        window_size: int = 100,
+        minimum_calls: int = 20,
+        minimum_slow_calls: int = 5,
+        open_seconds: float = 5.0,
+        clock=time.monotonic,
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.latency_threshold_seconds = latency_threshold_seconds
+        self.minimum_calls = minimum_calls
+        self.minimum_slow_calls = minimum_slow_calls
+        self.open_seconds = open_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._window = deque(maxlen=window_size)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.state = CLOSED
+        bentoml_service_circuit_breaker_state.labels(name=name).set(
+            STATE_VALUES[CLOSED]
+        )
+
+    def _transition(self, new_state: str) -> None:
+        old_state, self.state = self.state, new_state
+        if new_state == OPEN:
+            self._opened_at = self._clock()
+        if new_state != HALF_OPEN:
+            self._probe_in_flight = False
+        if new_state == CLOSED:
+            self._window.clear()
+
+        bentoml_service_circuit_breaker_state.labels(name=self.name).set(
+            STATE_VALUES[new_state]
+        )
+        bentoml_service_circuit_breaker_transitions_total.labels(
+            name=self.name, from_state=old_state, to_state=new_state
+        ).inc()
+        logger.warning(
+            "Circuit breaker state changed",
+            circuit_breaker=self.name,
+            from_state=old_state,
+            to_state=new_state,
+        )
+
+    def allow_request(self) -> bool:
+        """
+        Checks whether a call may be made now. In the half-open state only a single
+        probe call is allowed until its outcome is recorded.
+        """
+        with self._lock:
+            if self.state == OPEN:
+                if self._clock() - self._opened_at < self.open_seconds:
+                    return False
+                self._transition(HALF_OPEN)
+
+            if self.state == HALF_OPEN:
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def _should_open(self) -> bool:
+        if len(self._window) < self.minimum_calls:
+            return False
+
+        failures = sum(1 for succeeded, _ in self._window if not succeeded)
+        if failures / len(self._window) >= self.failure_rate_threshold:
+            return True
+
+        slow_calls = sum(
+            1
+            for _, latency in self._window
+            if latency >= self.latency_threshold_seconds
+        )
+        return slow_calls >= self.minimum_slow_calls and slow_calls > len(
+            self._window
+        ) * (1 - LATENCY_PERCENTILE)
+
+    def record(self, succeeded: bool, latency_seconds: float) -> None:
+        """
+        Records the outcome of a call that was allowed by `allow_request`.
+        """
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if succeeded and latency_seconds < self.latency_threshold_seconds:
+                    self._transition(CLOSED)
+                else:
+                    self._transition(OPEN)
+                return
+
+            self._window.append((succeeded, latency_seconds))
+            if self.state == CLOSED and self._should_open():
+                self._transition(OPEN)
+
+    def call(self, func, *args, **kwargs):
+        """
+        Calls `func` through the breaker.
+
+        Raises:
+            CircuitOpenError: If the breaker does not allow the call.
+        """
+        if not self.allow_request():
+            raise CircuitOpenError(f"Circuit breaker '{self.name}' is open")
+
+        started_at = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record(False, time.perf_counter() - started_at)
+            raise
+        self.record(True, time.perf_counter() - started_at)
+        return result
@@ -0,0 +1,171 @@
+"""
+This module provides a fast decoder for DynamoDB attribute values.
+
+boto3's `TypeDeserializer` walks every attribute value generically and returns a
+`Decimal` for every number. When the shape of the items is known up front, the
+`ItemDecoder` converts them straight into slotted records or numpy arrays, with
+numbers as native int/float values.
+
+Example:
+    decoder = ItemDecoder({"artist": str, "song": str, "plays": int})
+    record = decoder.decode_get_item(dynamodb_client.get_item(...))
+"""
+
+from dataclasses import make_dataclass
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Attribute type tag and numpy dtype for every supported schema type.
+SCHEMA_TYPES = {
+    str: ("S", np.str_),
+    int: ("N", np.int64),
+    float: ("N", np.float64),
+    bool: ("BOOL", np.bool_),
+}
+
+
+def _identity(value):
+    return value
+
+
+def _number_to_int(value: str) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        # e.g. "1e3", parsed exactly rather than through a float
+        number = Decimal(value)
+        if number != number.to_integral_value():
+            raise ValueError(f"The number {value} is not an integer") from None
+        return int(number)
+
+
+CONVERTERS = {
+    str: _identity,
+    int: _number_to_int,
+    float: float,
+    bool: _identity,
+}
+
+
+class ItemDecoder:
+    """
+    Decodes raw DynamoDB items of a declared schema.
+
+    Attributes:
+        schema (Dict[str, type]): Attribute names mapped to `str`, `int`, `float`
+            or `bool`. Attributes which are not part of the schema are ignored.
+        record_type (type): Slotted dataclass the items are decoded into.
+    """
+
+    def __init__(self, schema: Dict[str, type], record_name: str = "Record"):
+        unsupported = {name: t for name, t in schema.items() if t not in SCHEMA_TYPES}
+        if unsupported:
+            raise ValueError(f"Unsupported schema types: {unsupported}")
+
+        self.schema = dict(schema)
+        self.record_type = make_dataclass(
+            record_name,
+            [(name, Optional[t]) for name, t in self.schema.items()],
+            slots=True,
+        )
+        self.decode = self._build_decode()
+
+    def _build_decode(self):
+        """
+        Generates a decode function specialised for the schema.
+
+        Like `collections.namedtuple`, the function source is generated once so that
+        decoding an item runs without any per-attribute loop or dispatch.
+        """
+        namespace = {"Record": self.record_type}
+        lines = ["def decode(item):", "    if item is None:", "        return None"]
+        lines.append("    get = item.get")
+        arguments = []
+        for index, (name, schema_type) in enumerate(self.schema.items()):
+            type_tag = SCHEMA_TYPES[schema_type][0]
+            convert = CONVERTERS[schema_type]
+            lines.append(f"    v{index} = get({name!r})")
+            if convert is _identity:
+                value = f"v{index}[{type_tag!r}]"
+            else:
+                namespace[f"convert{index}"] = convert
+                value = f"convert{index}(v{index}[{type_tag!r}])"
+            arguments.append(f"None if v{index} is None else {value}")
+        lines.append(f"    return Record({', '.join(arguments)})")
+
+        exec("\n".join(lines), namespace)  # pylint: disable=exec-used
+        decode = namespace["decode"]
+        decode.__doc__ = (
+            "Decodes a single item. Missing attributes are decoded as None."
+        )
+        return decode
+
+    def decode_many(self, items: Sequence[Dict]) -> List:
+        """
+        Decodes a sequence of items into a list of records.
+        """
+        decode = self.decode
+        return [decode(item) for item in items]
+
+    def to_arrays(self, items: Sequence[Dict]) -> Dict[str, np.ndarray]:
+        """
+        Decodes a sequence of items into one numpy array per attribute.
+
+        The raw values of every attribute are collected first and converted in bulk.
+        The columns of attributes missing from some items are masked arrays, masked
+        where the attribute is missing.
+
+        Returns:
+            Dict[str, np.ndarray]: The decoded columns keyed by attribute name.
+
+        Raises:
+            ValueError: If a number of an int column is fractional.
+            OverflowError: If a number of an int column does not fit in an int64.
+        """
+        columns = {}
+        for name, schema_type in self.schema.items():
+            type_tag, dtype = SCHEMA_TYPES[schema_type]
+            raw_values = [item.get(name, {}).get(type_tag) for item in items]
+
+            missing = [v is None for v in raw_values]
+            if schema_type is float:
+                raw_values = ["nan" if v is None else v for v in raw_values]
+            elif schema_type is int:
+                raw_values = ["0" if v is None else v for v in raw_values]
+            elif schema_type is str:
+                raw_values = ["" if v is None else v for v in raw_values]
+            else:
+                raw_values = [bool(v) for v in raw_values]
+
+            try:
+                column = np.array(raw_values, dtype=dtype)
+            except ValueError:
+                # numpy only parses integer strings into int64, e.g. not "1e3"
+                column = np.array([_number_to_int(v) for v in raw_values], dtype=dtype)
+            if any(missing):
+                column = np.ma.masked_array(column, mask=missing)
+            columns[name] = column
+        return columns
+
+    def decode_get_item(self, response: Dict):
+        """
+        Decodes the response of `get_item`.
+
+        Returns:
+            The decoded record or None if the item does not exist.
+        """
+        return self.decode(response.get("Item"))
+
+    def decode_batch_get_item(self, response: Dict, table_name: str) -> List:
+        """
+        Decodes the items of `table_name` from the response of `batch_get_item`.
+        """
+        return self.decode_many(response.get("Responses", {}).get(table_name, []))
+
+    def decode_scan(self, response: Dict) -> List:
+        """
+        Decodes the items of a `scan` or `query` response page.
+        """
+        return self.decode_many(response.get("Items", []))
@@ -1,29 +1,39 @@
-import os
-import boto3
-from botocore.config import Config
-from dotenv import load_dotenv
+from functools import lru_cache
 
-load_dotenv()
+from utils.common.settings import Settings, get_settings
 
-CONNECT_TIMEOUT = os.getenv("DYNAMODB_CONNECT_TIMEOUT", 1)
-READ_TIMEOUT = os.getenv("DYNAMODB_READ_TIMEOUT", 1)
-TOTAL_MAX_ATTEMPTS = os.getenv("DYNAMODB_TOTAL_MAX_ATTEMPTS", 2)
-MAX_POOL_CONNECTIONS = os.getenv("MAX_POOL_CONNECTIONS", 20)
-DYNAMODB_ENDPOINT_URL = os.getenv("DYNAMODB_ENDPOINT_URL", "http://localhost:8000")
-AWS_REGION_NAME = os.getenv("AWS_REGION_NAME", "ap-south-1")
+IN_MEMORY_ENDPOINT_URL = "memory://"
 
 
-def create_dynamodb_client():
+@lru_cache(maxsize=1)
+def _in_memory_dynamodb_client():
+    from utils.dynamodb.fake_dynamodb import FakeDynamoDBClient
+
+    return FakeDynamoDBClient()
+
+
+def create_dynamodb_client(settings: Settings = None):
+    settings = settings or get_settings()
+    if settings.dynamodb_endpoint_url == IN_MEMORY_ENDPOINT_URL:
+        return _in_memory_dynamodb_client()
+
+    # imported lazily, boto3 is not needed on the serve path until the first client
+    import boto3
+    from botocore.config import Config
+
     config = Config(
-        connect_timeout=int(CONNECT_TIMEOUT),
-        read_timeout=int(READ_TIMEOUT),
-        retries={"mode": "standard", "total_max_attempts": int(TOTAL_MAX_ATTEMPTS)},
-        max_pool_connections=int(MAX_POOL_CONNECTIONS),
+        connect_timeout=settings.dynamodb_connect_timeout,
+        read_timeout=settings.dynamodb_read_timeout,
+        retries={
+            "mode": "standard",
+            "total_max_attempts": settings.dynamodb_total_max_attempts,
+        },
+        max_pool_connections=settings.dynamodb_max_pool_connections,
     )
 
     return boto3.client(
         "dynamodb",
         config=config,
-        region_name=AWS_REGION_NAME,
-        endpoint_url=DYNAMODB_ENDPOINT_URL,
+        region_name=settings.aws_region_name,
+        endpoint_url=settings.dynamodb_endpoint_url,
     )
@@ -56,5 +56,5 @@ if __name__ == "__main__":
     populate_sample_data(client, TABLE_NAME)
 
     query = {"song": {"S": "song-1"}, "artist": {"S": "artist-1"}}
-    data = fetch_data_from_dynamodb(TABLE_NAME=TABLE_NAME, query=query)
+    data = fetch_data_from_dynamodb(table_name=TABLE_NAME, query=query)
     print(f"Data: {data}")
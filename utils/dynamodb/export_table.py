@@ -0,0 +1,410 @@
+"""
+This module exports a DynamoDB table to a local columnar snapshot.
+
+The table is read with a parallel segmented `Scan`, the attribute values are decoded
+column by column and every attribute is written to its own `.npy` file. A snapshot
+can then be memory-mapped with `TableSnapshot` to answer key lookups locally,
+without any DynamoDB round trips.
+
+Every export is written to a new directory next to `output_dir`, and `output_dir` is
+a symlink which is flipped to it once complete. The previous export is removed
+afterwards, so a failed or interrupted export leaves the previous one in place.
+
+To run: `python -m utils.dynamodb.export_table <table_name> <output_dir>`
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from utils.dynamodb.dynamodb_client import create_dynamodb_client
+from utils.structure_logging.logger_config import logger
+
+TOTAL_SEGMENTS = int(os.getenv("DYNAMODB_EXPORT_SEGMENTS", 8))
+MANIFEST_FILE_NAME = "manifest.json"
+
+# Attribute type tags which are stored as native numpy columns. Every other type
+# (maps, lists, sets, binary) is stored as its JSON encoded string.
+NUMBER_TYPE = "N"
+STRING_TYPE = "S"
+BOOL_TYPE = "BOOL"
+# Stored as a missing value, like an absent attribute
+NULL_TYPE = "NULL"
+
+INT64_INFO = np.iinfo(np.int64)
+
+
+class SnapshotError(Exception):
+    """
+    Raised when the values of an attribute cannot be stored in a column without
+    losing data.
+    """
+
+
+def scan_segment(
+    dynamodb_client,
+    table_name: str,
+    segment: int,
+    total_segments: int,
+    page_size: Optional[int] = None,
+) -> List[Dict]:
+    """
+    Scans a single segment of a DynamoDB table, following the pagination keys.
+
+    Args:
+            dynamodb_client (boto3.client): A boto3 client for DynamoDB.
+            table_name (str): Name of the DynamoDB table to scan.
+            segment (int): The segment to scan.
+            total_segments (int): Total number of segments the table is split into.
+            page_size (int, optional): Maximum number of items per `Scan` page.
+
+    Returns:
+            List[Dict]: The raw items of the segment.
+    """
+    items = []
+    scan_kwargs = {
+        "TableName": table_name,
+        "Segment": segment,
+        "TotalSegments": total_segments,
+    }
+    if page_size:
+        scan_kwargs["Limit"] = page_size
+
+    while True:
+        response = dynamodb_client.scan(**scan_kwargs)
+        items.extend(response.get("Items", []))
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            return items
+        scan_kwargs["ExclusiveStartKey"] = last_evaluated_key
+
+
+def parallel_scan(
+    dynamodb_client,
+    table_name: str,
+    total_segments: int = TOTAL_SEGMENTS,
+    page_size: Optional[int] = None,
+) -> List[Dict]:
+    """
+    Scans a DynamoDB table with `total_segments` segments in parallel.
+
+    boto3 clients are thread safe, so all the segments share the same client and
+    its connection pool.
+
+    Returns:
+            List[Dict]: The raw items of the whole table.
+    """
+    with ThreadPoolExecutor(max_workers=total_segments) as executor:
+        futures = [
+            executor.submit(
+                scan_segment,
+                dynamodb_client,
+                table_name,
+                segment,
+                total_segments,
+                page_size,
+            )
+            for segment in range(total_segments)
+        ]
+        items = []
+        for future in futures:
+            items.extend(future.result())
+    return items
+
+
+def _column_type(items: Sequence[Dict], attribute_name: str) -> str:
+    type_tags = {
+        next(iter(item[attribute_name])) for item in items if item.get(attribute_name)
+    } - {NULL_TYPE}
+    if len(type_tags) > 1:
+        raise SnapshotError(
+            f"Attribute {attribute_name!r} holds values of several types: "
+            + ", ".join(sorted(type_tags))
+        )
+    return type_tags.pop() if type_tags else STRING_TYPE
+
+
+def _is_float64(value: str) -> bool:
+    return Decimal(repr(float(value))) == Decimal(value)
+
+
+def _number_column(attribute_name: str, raw_values: List[Optional[str]]) -> np.ndarray:
+    numbers = [None if value is None else Decimal(value) for value in raw_values]
+    if all(
+        number is None
+        or (
+            number == number.to_integral_value()
+            and INT64_INFO.min <= number <= INT64_INFO.max
+        )
+        for number in numbers
+    ):
+        return np.array(
+            [0 if number is None else int(number) for number in numbers],
+            dtype=np.int64,
+        )
+
+    for value in raw_values:
+        if value is not None and not _is_float64(value):
+            raise SnapshotError(
+                f"Attribute {attribute_name!r} holds the number {value}, which does "
+                "not fit in an int64 or a float64 column"
+            )
+    return np.array(
+        ["nan" if value is None else value for value in raw_values], dtype=np.float64
+    )
+
+
+def decode_items_to_columns(items: Sequence[Dict]) -> Dict[str, np.ndarray]:
+    """
+    Decodes raw DynamoDB items into one numpy array per attribute.
+
+    The values of every attribute are collected in a single pass and converted in
+    bulk: numbers become int64 (float64 when any value is fractional), strings
+    become fixed width unicode arrays and booleans become bool arrays. The columns
+    of attributes missing (or NULL) from some items are masked arrays, masked where
+    the attribute is missing.
+
+    Args:
+            items (Sequence[Dict]): Raw items as returned by `Scan`.
+
+    Returns:
+            Dict[str, np.ndarray]: The decoded columns keyed by attribute name.
+
+    Raises:
+            SnapshotError: If an attribute holds values of several types, or numbers
+                    which neither an int64 nor a float64 holds exactly.
+    """
+    attribute_names = sorted({name for item in items for name in item})
+    columns = {}
+
+    for attribute_name in attribute_names:
+        type_tag = _column_type(items, attribute_name)
+        raw_values = [item.get(attribute_name, {}).get(type_tag) for item in items]
+
+        if type_tag == NUMBER_TYPE:
+            column = _number_column(attribute_name, raw_values)
+        elif type_tag == STRING_TYPE:
+            column = np.array(
+                ["" if value is None else value for value in raw_values], dtype=np.str_
+            )
+        elif type_tag == BOOL_TYPE:
+            column = np.array([bool(value) for value in raw_values], dtype=np.bool_)
+        else:
+            column = np.array(
+                [
+                    "" if value is None else json.dumps({type_tag: value})
+                    for value in raw_values
+                ],
+                dtype=np.str_,
+            )
+
+        missing = [value is None for value in raw_values]
+        if any(missing):
+            column = np.ma.masked_array(column, mask=missing)
+        columns[attribute_name] = column
+
+    return columns
+
+
+def _flip_symlink(target: str, link_path: str) -> None:
+    tmp_link = f"{link_path}.{os.getpid()}.tmp"
+    os.symlink(target, tmp_link)
+    try:
+        os.replace(tmp_link, link_path)
+    except OSError:
+        os.unlink(tmp_link)
+        raise
+
+
+def write_snapshot(
+    columns: Dict[str, np.ndarray],
+    output_dir: str,
+    table_name: str,
+    key_attributes: Sequence[str],
+) -> Dict:
+    """
+    Writes decoded columns to `output_dir` as one `.npy` file per attribute.
+
+    The attribute names are not used as file names: the manifest maps every
+    attribute to its column file, and to the file of its mask of missing values.
+    The snapshot is written to a new directory next to `output_dir`, which is a
+    symlink flipped to it once complete, so readers never observe a partial
+    snapshot. The previous snapshot is removed afterwards.
+
+    Returns:
+            Dict: The snapshot manifest.
+    """
+    row_count = len(next(iter(columns.values()))) if columns else 0
+    manifest = {
+        "table_name": table_name,
+        "key_attributes": list(key_attributes),
+        "row_count": row_count,
+        "exported_at": time.time(),
+        "columns": {},
+    }
+
+    output_dir = os.path.abspath(output_dir)
+    parent_dir = os.path.dirname(output_dir)
+    base_name = os.path.basename(output_dir)
+    os.makedirs(parent_dir, exist_ok=True)
+    snapshot_dir = tempfile.mkdtemp(prefix=f".{base_name}-", dir=parent_dir)
+    try:
+        for index, (name, column) in enumerate(columns.items()):
+            entry = {
+                "file": f"column-{index}.npy",
+                "dtype": column.dtype.str,
+                "mask": None,
+            }
+            if np.ma.isMaskedArray(column):
+                entry["mask"] = f"column-{index}.mask.npy"
+                np.save(
+                    os.path.join(snapshot_dir, entry["mask"]),
+                    np.ma.getmaskarray(column),
+                )
+                column = column.data
+            np.save(os.path.join(snapshot_dir, entry["file"]), column)
+            manifest["columns"][name] = entry
+        with open(os.path.join(snapshot_dir, MANIFEST_FILE_NAME), "w") as manifest_file:
+            json.dump(manifest, manifest_file)
+
+        previous_dir = None
+        if os.path.islink(output_dir):
+            previous_dir = os.path.realpath(output_dir)
+            _flip_symlink(os.path.basename(snapshot_dir), output_dir)
+        elif os.path.isdir(output_dir):
+            # a snapshot written as a plain directory cannot be replaced by a
+            # symlink, so it is moved aside first
+            previous_dir = f"{snapshot_dir}.previous"
+            os.rename(output_dir, previous_dir)
+            try:
+                _flip_symlink(os.path.basename(snapshot_dir), output_dir)
+            except OSError:
+                os.rename(previous_dir, output_dir)
+                raise
+        else:
+            _flip_symlink(os.path.basename(snapshot_dir), output_dir)
+    except Exception:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+        raise
+
+    if previous_dir:
+        shutil.rmtree(previous_dir, ignore_errors=True)
+    return manifest
+
+
+def export_table(
+    table_name: str,
+    output_dir: str,
+    total_segments: int = TOTAL_SEGMENTS,
+    dynamodb_client=None,
+) -> Dict:
+    """
+    Exports a DynamoDB table to a columnar snapshot in `output_dir`.
+
+    Args:
+            table_name (str): Name of the DynamoDB table to export.
+            output_dir (str): Directory the snapshot is written to.
+            total_segments (int): Number of parallel `Scan` segments.
+            dynamodb_client (boto3.client, optional): A boto3 client for DynamoDB.
+
+    Returns:
+            Dict: The snapshot manifest.
+    """
+    dynamodb_client = dynamodb_client or create_dynamodb_client()
+
+    key_schema = dynamodb_client.describe_table(TableName=table_name)["Table"][
+        "KeySchema"
+    ]
+    key_attributes = [key["AttributeName"] for key in key_schema]
+
+    started_at = time.perf_counter()
+    items = parallel_scan(dynamodb_client, table_name, total_segments)
+    columns = decode_items_to_columns(items)
+    manifest = write_snapshot(columns, output_dir, table_name, key_attributes)
+
+    logger.warning(
+        "DynamoDB table exported",
+        table_name=table_name,
+        row_count=manifest["row_count"],
+        total_segments=total_segments,
+        duration_seconds=round(time.perf_counter() - started_at, 3),
+    )
+    return manifest
+
+
+class TableSnapshot:
+    """
+    Read-only view of a snapshot written by `export_table`.
+
+    The columns are memory-mapped, so loading a snapshot is cheap and the pages are
+    shared between the worker processes. Only the key index is built in memory.
+    """
+
+    def __init__(self, snapshot_dir: str):
+        try:
+            self._load(os.path.realpath(snapshot_dir))
+        except FileNotFoundError:
+            # the snapshot was replaced, and removed, while it was being loaded
+            self._load(os.path.realpath(snapshot_dir))
+
+    def _load(self, snapshot_dir: str) -> None:
+        with open(os.path.join(snapshot_dir, MANIFEST_FILE_NAME)) as manifest_file:
+            self.manifest = json.load(manifest_file)
+
+        self.key_attributes = self.manifest["key_attributes"]
+        self.columns = {}
+        self.masks = {}
+        for name, entry in self.manifest["columns"].items():
+            self.columns[name] = np.load(
+                os.path.join(snapshot_dir, entry["file"]), mmap_mode="r"
+            )
+            if entry["mask"]:
+                self.masks[name] = np.load(
+                    os.path.join(snapshot_dir, entry["mask"]), mmap_mode="r"
+                )
+        key_columns = [self.columns[name].tolist() for name in self.key_attributes]
+        self._index = {key: row for row, key in enumerate(zip(*key_columns))}
+
+    def __len__(self) -> int:
+        return self.manifest["row_count"]
+
+    def get(self, key: Dict) -> Optional[Dict]:
+        """
+        Looks up a single item by its primary key.
+
+        Args:
+                key (Dict): The key attribute values, e.g. `{"artist": "artist-1"}`.
+
+        Returns:
+                Optional[Dict]: The decoded item, without the attributes it is
+                        missing, or None if the key is not found.
+        """
+        row = self._index.get(tuple(key[name] for name in self.key_attributes))
+        if row is None:
+            return None
+        return {
+            name: column[row].item()
+            for name, column in self.columns.items()
+            if name not in self.masks or not self.masks[name][row]
+        }
+
+
+def _parse_args(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("table_name")
+    parser.add_argument("output_dir")
+    parser.add_argument("--segments", type=int, default=TOTAL_SEGMENTS)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    export_table(args.table_name, args.output_dir, args.segments)
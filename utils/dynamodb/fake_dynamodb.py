@@ -0,0 +1,259 @@
+"""
+This module provides an in-process stand-in for the DynamoDB client.
+
+`FakeDynamoDBClient` implements the subset of the boto3 DynamoDB client used in
+`utils/dynamodb` (`create_table`, `describe_table`, `get_item`, `put_item`,
+`batch_get_item`, `batch_write_item` and `scan`) on top of plain dictionaries. It can
+inject latency, throttling errors and unprocessed keys, driven by a seeded random
+generator, so the caching, batching and circuit-breaking behaviour can be tested and
+load-tested reproducibly without DynamoDB Local.
+
+Set `DYNAMODB_ENDPOINT_URL=memory://` to make `create_dynamodb_client` return one.
+"""
+
+import copy
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+from botocore.exceptions import ClientError
+
+MAX_BATCH_GET_KEYS = 100
+MAX_BATCH_WRITE_ITEMS = 25
+
+
+def constant_latency(seconds: float) -> Callable[[random.Random], float]:
+    return lambda rng: seconds
+
+
+def uniform_latency(low: float, high: float) -> Callable[[random.Random], float]:
+    return lambda rng: rng.uniform(low, high)
+
+
+def lognormal_latency(
+    median_seconds: float, sigma: float
+) -> Callable[[random.Random], float]:
+    """
+    Long tailed latency distribution, the usual shape of network call latencies.
+    """
+    return lambda rng: median_seconds * rng.lognormvariate(0, sigma)
+
+
+def _client_error(code: str, message: str, operation_name: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": message}}, operation_name)
+
+
+class FakeDynamoDBClient:
+    """
+    In-memory DynamoDB client with latency and failure injection.
+
+    Attributes:
+        latency (Callable, optional): Returns the latency of a call, given the random
+            generator. See `constant_latency`, `uniform_latency` and `lognormal_latency`.
+        throttle_rate (float): Probability of a call failing with
+            `ProvisionedThroughputExceededException`.
+        unprocessed_rate (float): Probability of every key of a batch call being
+            returned as unprocessed.
+        seed (int, optional): Seed of the random generator.
+        call_counts (Counter): Number of calls per operation.
+    """
+
+    def __init__(
+        self,
+        latency: Optional[Callable[[random.Random], float]] = None,
+        throttle_rate: float = 0.0,
+        unprocessed_rate: float = 0.0,
+        seed: Optional[int] = None,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.unprocessed_rate = unprocessed_rate
+        self.call_counts = Counter()
+        self._sleep = sleep
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tables: Dict[str, Dict] = {}
+
+    def _call(self, operation_name: str) -> None:
+        with self._lock:
+            self.call_counts[operation_name] += 1
+            latency = self.latency(self._rng) if self.latency else 0
+            throttled = self._rng.random() < self.throttle_rate
+
+        if latency > 0:
+            self._sleep(latency)
+        if throttled:
+            raise _client_error(
+                "ProvisionedThroughputExceededException",
+                "The level of configured provisioned throughput for the table was exceeded.",
+                operation_name,
+            )
+
+    def _unprocessed(self) -> bool:
+        with self._lock:
+            return self._rng.random() < self.unprocessed_rate
+
+    def _table(self, table_name: str, operation_name: str) -> Dict:
+        table = self._tables.get(table_name)
+        if table is None:
+            raise _client_error(
+                "ResourceNotFoundException",
+                "Requested resource not found",
+                operation_name,
+            )
+        return table
+
+    @staticmethod
+    def _key(table: Dict, item: Dict, operation_name: str) -> tuple:
+        try:
+            return tuple(
+                tuple(item[name].items())[0] for name in table["key_attributes"]
+            )
+        except KeyError:
+            raise _client_error(
+                "ValidationException",
+                "The provided key element does not match the schema",
+                operation_name,
+            )
+
+    def create_table(self, TableName: str, KeySchema: List[Dict], **kwargs) -> Dict:
+        self._call("CreateTable")
+        with self._lock:
+            if TableName in self._tables:
+                raise _client_error(
+                    "ResourceInUseException",
+                    f"Table already exists: {TableName}",
+                    "CreateTable",
+                )
+            self._tables[TableName] = {
+                "key_schema": copy.deepcopy(KeySchema),
+                "key_attributes": [key["AttributeName"] for key in KeySchema],
+                "items": {},
+            }
+        return self.describe_table(TableName=TableName)
+
+    def describe_table(self, TableName: str) -> Dict:
+        table = self._table(TableName, "DescribeTable")
+        return {
+            "Table": {
+                "TableName": TableName,
+                "KeySchema": copy.deepcopy(table["key_schema"]),
+                "ItemCount": len(table["items"]),
+                "TableStatus": "ACTIVE",
+            }
+        }
+
+    def get_item(self, TableName: str, Key: Dict, **kwargs) -> Dict:
+        self._call("GetItem")
+        table = self._table(TableName, "GetItem")
+        item = table["items"].get(self._key(table, Key, "GetItem"))
+        return {} if item is None else {"Item": copy.deepcopy(item)}
+
+    def put_item(self, TableName: str, Item: Dict, **kwargs) -> Dict:
+        self._call("PutItem")
+        table = self._table(TableName, "PutItem")
+        key = self._key(table, Item, "PutItem")
+        with self._lock:
+            table["items"][key] = copy.deepcopy(Item)
+        return {}
+
+    def batch_get_item(self, RequestItems: Dict, **kwargs) -> Dict:
+        self._call("BatchGetItem")
+        if sum(len(request["Keys"]) for request in RequestItems.values()) > (
+            MAX_BATCH_GET_KEYS
+        ):
+            raise _client_error(
+                "ValidationException",
+                "Too many items requested for the BatchGetItem call",
+                "BatchGetItem",
+            )
+
+        responses, unprocessed_keys = {}, {}
+        for table_name, request in RequestItems.items():
+            table = self._table(table_name, "BatchGetItem")
+            responses[table_name] = []
+            for key in request["Keys"]:
+                if self._unprocessed():
+                    unprocessed_keys.setdefault(table_name, {"Keys": []})
+                    unprocessed_keys[table_name]["Keys"].append(key)
+                    continue
+                item = table["items"].get(self._key(table, key, "BatchGetItem"))
+                if item is not None:
+                    responses[table_name].append(copy.deepcopy(item))
+        return {"Responses": responses, "UnprocessedKeys": unprocessed_keys}
+
+    def batch_write_item(self, RequestItems: Dict, **kwargs) -> Dict:
+        self._call("BatchWriteItem")
+        if sum(len(requests) for requests in RequestItems.values()) > (
+            MAX_BATCH_WRITE_ITEMS
+        ):
+            raise _client_error(
+                "ValidationException",
+                "Too many items requested for the BatchWriteItem call",
+                "BatchWriteItem",
+            )
+
+        unprocessed_items = {}
+        for table_name, requests in RequestItems.items():
+            table = self._table(table_name, "BatchWriteItem")
+            for request in requests:
+                if self._unprocessed():
+                    unprocessed_items.setdefault(table_name, []).append(request)
+                    continue
+                with self._lock:
+                    if "PutRequest" in request:
+                        item = request["PutRequest"]["Item"]
+                        key = self._key(table, item, "BatchWriteItem")
+                        table["items"][key] = copy.deepcopy(item)
+                    else:
+                        key = self._key(
+                            table, request["DeleteRequest"]["Key"], "BatchWriteItem"
+                        )
+                        table["items"].pop(key, None)
+        return {"UnprocessedItems": unprocessed_items}
+
+    def scan(
+        self,
+        TableName: str,
+        Segment: Optional[int] = None,
+        TotalSegments: Optional[int] = None,
+        ExclusiveStartKey: Optional[Dict] = None,
+        Limit: Optional[int] = None,
+        **kwargs,
+    ) -> Dict:
+        """
+        Scans the table in key order. Items are assigned to segments by a stable
+        hash of their key, like DynamoDB assigns them by partition.
+        """
+        self._call("Scan")
+        table = self._table(TableName, "Scan")
+        with self._lock:
+            keys = sorted(table["items"])
+        if TotalSegments:
+            keys = [
+                key
+                for key in keys
+                if zlib.crc32(repr(key).encode()) % TotalSegments == Segment
+            ]
+        if ExclusiveStartKey:
+            start_key = self._key(table, ExclusiveStartKey, "Scan")
+            keys = [key for key in keys if key > start_key]
+
+        page = keys[:Limit] if Limit else keys
+        with self._lock:
+            items = [
+                copy.deepcopy(table["items"][key])
+                for key in page
+                if key in table["items"]
+            ]
+        response = {"Items": items, "Count": len(items), "ScannedCount": len(items)}
+        if Limit and len(keys) > Limit and items:
+            last_item = items[-1]
+            response["LastEvaluatedKey"] = {
+                name: last_item[name] for name in table["key_attributes"]
+            }
+        return response
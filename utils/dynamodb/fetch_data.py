@@ -1,9 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
 from typing import Dict, Union
+
 import botocore
+import orjson
 
+from utils.common.latency_budget import budget_exhausted
+from utils.common.settings import Settings, get_settings
+from utils.dynamodb.circuit_breaker import CircuitBreaker
 from utils.dynamodb.dynamodb_client import create_dynamodb_client
+from utils.monitoring.prometheus_metrics import bentoml_service_dynamodb_fallbacks_total
 from utils.structure_logging.logger_config import logger
 
+# client errors which mean DynamoDB is overloaded rather than the request is invalid
+SERVICE_FAILURE_CODES = {
+    "ProvisionedThroughputExceededException",
+    "RequestLimitExceeded",
+    "ThrottlingException",
+}
+
+
+def create_circuit_breaker(settings: Settings) -> CircuitBreaker:
+    return CircuitBreaker(
+        name="dynamodb",
+        failure_rate_threshold=settings.dynamodb_breaker_failure_rate,
+        latency_threshold_seconds=settings.dynamodb_breaker_p99_latency_seconds,
+        window_size=settings.dynamodb_breaker_window_size,
+        minimum_calls=settings.dynamodb_breaker_minimum_calls,
+        minimum_slow_calls=settings.dynamodb_breaker_minimum_slow_calls,
+        open_seconds=settings.dynamodb_breaker_open_seconds,
+    )
+
+
+circuit_breaker = create_circuit_breaker(get_settings())
+
+
+class StaleCache:
+    """
+    Bounded LRU cache of the last item read for every key. It is only used to answer
+    reads while DynamoDB is unavailable, so entries never expire.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                self._entries.move_to_end(key)
+            return item
+
+    def put(self, key, item) -> None:
+        with self._lock:
+            self._entries[key] = item
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+stale_cache = StaleCache(get_settings().dynamodb_stale_cache_size)
+
+
+@lru_cache(maxsize=1)
+def get_dynamodb_client():
+    """
+    Returns the shared DynamoDB client. boto3 clients are thread safe, so a single
+    client and its connection pool is reused for every request.
+    """
+    return create_dynamodb_client()
+
+
+def _fallback(reason: str, cache_key) -> Union[Dict, None]:
+    item = stale_cache.get(cache_key)
+    bentoml_service_dynamodb_fallbacks_total.labels(
+        reason=reason, stale_hit=str(item is not None).lower()
+    ).inc()
+    return item
+
+
+def is_service_failure(error: botocore.exceptions.ClientError) -> bool:
+    """
+    Returns whether an error means DynamoDB is unhealthy (server errors and
+    throttling), rather than the request being invalid, e.g. a validation error or a
+    missing table, which must not open the circuit breaker.
+    """
+    status_code = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    if status_code is not None and status_code >= 500:
+        return True
+    return error.response.get("Error", {}).get("Code") in SERVICE_FAILURE_CODES
+
 
 def fetch_data_from_dynamodb(table_name: str, query: Dict) -> Union[Dict, None]:
     """
@@ -11,6 +101,10 @@ def fetch_data_from_dynamodb(table_name: str, query: Dict) -> Union[Dict, None]:
     and read timeout is set to 1.0 second. The total number of retries can be set by the user
     from the environment variable DYNAMODB_TOTAL_MAX_ATTEMPTS
 
+    The call goes through a circuit breaker and respects the latency budget of the
+    current request. When the breaker is open, the budget is used up or the call fails,
+    the last item read for the same query is returned instead (or None if there is none).
+
     Args:
             table_name (str): Name of the DynamoDB table to query.
             query (Dict): Query parameters for the DynamoDB table.
@@ -18,13 +112,32 @@ def fetch_data_from_dynamodb(table_name: str, query: Dict) -> Union[Dict, None]:
     Returns:
             Union[Dict, None]: The fetched data as a dictionary or None if no data is found.
     """
+    cache_key = (table_name, orjson.dumps(query, option=orjson.OPT_SORT_KEYS))
+
+    # calls are skipped when less than this is left of the request's latency budget
+    if budget_exhausted(get_settings().dynamodb_min_remaining_budget_seconds):
+        logger.warning("Skipping DynamoDB read, latency budget exhausted")
+        return _fallback("budget_exhausted", cache_key)
+    if not circuit_breaker.allow_request():
+        return _fallback("circuit_open", cache_key)
+
+    started_at = time.perf_counter()
     try:
-        dynamodb_client = create_dynamodb_client()
+        dynamodb_client = get_dynamodb_client()
         response = dynamodb_client.get_item(TableName=table_name, Key=query)
-        return response.get("Item")
+        circuit_breaker.record(True, time.perf_counter() - started_at)
     except botocore.exceptions.ClientError as error:
+        circuit_breaker.record(
+            not is_service_failure(error), time.perf_counter() - started_at
+        )
         logger.exception(f"DynamoDB Client Error: {error.response['Error']['Message']}")
-        return None
+        return _fallback("error", cache_key)
     except Exception:
+        circuit_breaker.record(False, time.perf_counter() - started_at)
         logger.exception("Error fetching data from DynamoDB")
-        return None
+        return _fallback("error", cache_key)
+
+    item = response.get("Item")
+    if item is not None:
+        stale_cache.put(cache_key, item)
+    return item
@@ -1,20 +1,33 @@
-import os
+import argparse
 from datetime import datetime, timedelta, timezone
 import jwt
-from dotenv import load_dotenv
 
-load_dotenv()
+from utils.common.settings import get_settings
 
-SECRET = os.getenv("JWT_SECRET")
-EXPIRATION_MINUTES = int(os.getenv("JWT_EXPIRATION_MINUTES", 1))
+ADMIN_ROLE = "admin"
 
 
-def generate_token() -> str:
-    exp = datetime.now(tz=timezone.utc) + timedelta(minutes=EXPIRATION_MINUTES)
-    payload = {"exp": exp}
-    return jwt.encode(payload, SECRET, algorithm="HS256")
+def generate_token(claims: dict = None) -> str:
+    settings = get_settings()
+    exp = datetime.now(tz=timezone.utc) + timedelta(
+        minutes=settings.jwt_expiration_minutes
+    )
+    payload = {**(claims or {}), "exp": exp}
+    return jwt.encode(payload, settings.jwt_secret, algorithm="HS256")
 
 
 if __name__ == "__main__":
-    GENERATED_TOKEN = generate_token()
+    parser = argparse.ArgumentParser(description="Generate a JWT token")
+    parser.add_argument(
+        "--admin", action="store_true", help="Grant access to the admin routes"
+    )
+    parser.add_argument("--subject", help="Tenant of the token, set as its `sub` claim")
+    args = parser.parse_args()
+
+    claims = {}
+    if args.admin:
+        claims["role"] = ADMIN_ROLE
+    if args.subject:
+        claims["sub"] = args.subject
+    GENERATED_TOKEN = generate_token(claims)
     print(f"Generated JWT Token: {GENERATED_TOKEN}")
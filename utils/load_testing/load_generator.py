@@ -0,0 +1,442 @@
+"""
+Load generator replaying API requests against the service.
+
+The requests come from a JSONL request corpus (see `utils/common/request_corpus.py`)
+or are synthesized iris requests, and are authenticated with JWT tokens minted with
+`utils/jwt/generate_token.py`. The target is either a service running with
+`bentoml serve` (`--url`) or the service application run in-process.
+
+Two modes are supported:
+
+- closed loop: `--concurrency` clients each send a request as soon as their previous
+  one is answered, which measures the maximum throughput;
+- open loop: requests arrive at a fixed `--rate` whatever the response times, which
+  measures the latency at a given load. Latencies are measured from the scheduled
+  arrival, so a stalled service is not hidden by the generator waiting for it.
+
+The report is a JSON document with the throughput, the latency percentiles and the
+error rate, tagged with the git commit, so runs can be compared between commits.
+
+To run: `LOG_LEVEL=ERROR python -m utils.load_testing.load_generator --mode closed`
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import math
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from itertools import cycle
+from typing import Dict, List, Optional
+
+import httpx
+
+from utils.common.request_corpus import (
+    DEFAULT_ROUTE,
+    CorpusRequest,
+    load_request_corpus,
+)
+from utils.common.settings import get_settings
+from utils.jwt.generate_token import generate_token
+
+CLOSED_LOOP = "closed"
+OPEN_LOOP = "open"
+PERCENTILES = (50, 90, 99, 99.9)
+# Tenant of the load test requests, rate limited as a single tenant
+LOAD_TEST_SUBJECT = "load-test"
+
+# Ranges of the iris dataset features, in cm
+IRIS_FEATURE_RANGES = {
+    "sepal_length": (4.3, 7.9),
+    "sepal_width": (2.0, 4.4),
+    "petal_length": (1.0, 6.9),
+    "petal_width": (0.1, 2.5),
+}
+
+
+def synthesize_requests(count: int, seed: int = 0) -> List[CorpusRequest]:
+    """
+    Returns `count` prediction requests with features drawn uniformly from the ranges
+    of the iris dataset.
+    """
+    generator = random.Random(seed)
+    return [
+        CorpusRequest(
+            DEFAULT_ROUTE,
+            {
+                name: round(generator.uniform(low, high), 1)
+                for name, (low, high) in IRIS_FEATURE_RANGES.items()
+            },
+        )
+        for _ in range(count)
+    ]
+
+
+class TokenProvider:
+    """
+    Returns a JWT token, minted again once half of its lifetime elapsed.
+    """
+
+    def __init__(self):
+        self._lifetime_seconds = get_settings().jwt_expiration_minutes * 60
+        self._token = None
+        self._minted_at = 0.0
+
+    def token(self) -> str:
+        now = time.monotonic()
+        if self._token is None or now - self._minted_at > self._lifetime_seconds / 2:
+            self._token = generate_token(
+                {get_settings().rate_limit_tenant_claim: LOAD_TEST_SUBJECT}
+            )
+            self._minted_at = now
+        return self._token
+
+
+@dataclass
+class Outcome:
+    """
+    Outcomes of the requests sent during a run.
+    """
+
+    latencies: List[float] = field(default_factory=list)
+    status_codes: Counter = field(default_factory=Counter)
+    errors: int = 0
+    started_at: float = 0.0
+    finished_at: float = 0.0
+
+    def record(self, status: str, error: bool, latency: Optional[float]) -> None:
+        if latency is not None:
+            self.latencies.append(latency)
+        self.status_codes[status] += 1
+        if error:
+            self.errors += 1
+
+
+async def send_request(
+    client: httpx.AsyncClient,
+    request: CorpusRequest,
+    tokens: TokenProvider,
+    outcome: Outcome,
+    scheduled_at: Optional[float] = None,
+) -> None:
+    """
+    Sends a request and records its latency, measured from `scheduled_at` when given.
+    Responses other than 2xx and failed requests are errors.
+    """
+    start = time.perf_counter() if scheduled_at is None else scheduled_at
+    try:
+        response = await client.post(
+            request.route,
+            json=request.body,
+            headers={"Authorization": tokens.token()},
+        )
+        status = str(response.status_code)
+        error = not response.is_success
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+        error = True
+    outcome.record(status, error, time.perf_counter() - start)
+
+
+async def run_closed_loop(
+    client: httpx.AsyncClient,
+    requests: List[CorpusRequest],
+    concurrency: int,
+    total_requests: Optional[int] = None,
+    duration_seconds: Optional[float] = None,
+) -> Outcome:
+    """
+    Sends the requests, cycling through them, from `concurrency` clients until
+    `total_requests` were sent or `duration_seconds` elapsed.
+    """
+    tokens = TokenProvider()
+    outcome = Outcome()
+    next_request = cycle(requests).__next__
+    remaining = [total_requests]
+    outcome.started_at = time.perf_counter()
+    deadline = outcome.started_at + duration_seconds if duration_seconds else None
+
+    async def client_loop():
+        while True:
+            if remaining[0] is not None:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            await send_request(client, next_request(), tokens, outcome)
+
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    outcome.finished_at = time.perf_counter()
+    return outcome
+
+
+async def run_open_loop(
+    client: httpx.AsyncClient,
+    requests: List[CorpusRequest],
+    rate: float,
+    duration_seconds: float,
+    max_in_flight: int = 1000,
+) -> Outcome:
+    """
+    Sends the requests, cycling through them, at a fixed rate per second during
+    `duration_seconds`. Arrivals finding `max_in_flight` requests unanswered are
+    recorded as `dropped` errors instead of being sent.
+    """
+    tokens = TokenProvider()
+    outcome = Outcome()
+    next_request = cycle(requests).__next__
+    in_flight = set()
+    interval = 1 / rate
+    count = int(duration_seconds * rate)
+    outcome.started_at = time.perf_counter()
+
+    for index in range(count):
+        scheduled_at = outcome.started_at + index * interval
+        delay = scheduled_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(in_flight) >= max_in_flight:
+            outcome.record("dropped", True, None)
+            continue
+        task = asyncio.create_task(
+            send_request(client, next_request(), tokens, outcome, scheduled_at)
+        )
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    outcome.finished_at = time.perf_counter()
+    return outcome
+
+
+def percentile(sorted_values: List[float], percent: float) -> float:
+    """
+    Returns the nearest-rank percentile of sorted values.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(percent * len(sorted_values) / 100)
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_report(outcome: Outcome, parameters: Dict) -> Dict:
+    """
+    Returns the JSON report of a run.
+    """
+    latencies = sorted(outcome.latencies)
+    total = sum(outcome.status_codes.values())
+    elapsed = outcome.finished_at - outcome.started_at
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(tz=timezone.utc).isoformat(),
+        "parameters": parameters,
+        "requests": total,
+        "errors": outcome.errors,
+        "error_rate": outcome.errors / total if total else 0.0,
+        "duration_seconds": elapsed,
+        "throughput_rps": (total - outcome.errors) / elapsed if elapsed > 0 else 0.0,
+        "latency_seconds": {
+            **{
+                f"p{percent:g}": percentile(latencies, percent)
+                for percent in PERCENTILES
+            },
+            "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+            "max": latencies[-1] if latencies else 0.0,
+        },
+        "status_codes": dict(outcome.status_codes),
+    }
+
+
+def compare_reports(baseline: Dict, report: Dict) -> Dict[str, float]:
+    """
+    Returns the relative change of the throughput, the error rate and every latency
+    statistic of a report against a baseline report, e.g. `0.1` for 10% higher.
+    """
+    pairs = {
+        "throughput_rps": (baseline["throughput_rps"], report["throughput_rps"]),
+        "error_rate": (baseline["error_rate"], report["error_rate"]),
+        **{
+            f"latency_{name}": (value, report["latency_seconds"][name])
+            for name, value in baseline["latency_seconds"].items()
+        },
+    }
+    return {
+        name: (new - old) / old if old else float(new != old)
+        for name, (old, new) in pairs.items()
+    }
+
+
+@asynccontextmanager
+async def serve_in_process(app):
+    """
+    Runs the lifespan of an ASGI application and yields a client sending requests
+    straight to it.
+    """
+    messages = asyncio.Queue()
+    started = asyncio.Event()
+    stopped = asyncio.Event()
+    failure = []
+
+    async def send(message):
+        if message["type"].startswith("lifespan.startup"):
+            if message["type"] == "lifespan.startup.failed":
+                failure.append(message.get("message", ""))
+            started.set()
+        elif message["type"].startswith("lifespan.shutdown"):
+            stopped.set()
+
+    await messages.put({"type": "lifespan.startup"})
+    lifespan = asyncio.create_task(
+        app(
+            {"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}},
+            messages.get,
+            send,
+        )
+    )
+    await started.wait()
+    if failure:
+        raise RuntimeError(f"Application startup failed: {failure[0]}")
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://load-generator"
+        ) as client:
+            yield client
+    finally:
+        await messages.put({"type": "lifespan.shutdown"})
+        await stopped.wait()
+        await lifespan
+
+
+def load_service_app(target: str):
+    """
+    Returns the ASGI application of a BentoML service given as `module:Service`.
+    """
+    module_name, _, service_name = target.partition(":")
+    service = getattr(importlib.import_module(module_name), service_name)
+    return service.to_asgi()
+
+
+async def run(args) -> Dict:
+    requests = (
+        load_request_corpus(args.corpus, limit=args.corpus_limit)
+        if args.corpus
+        else synthesize_requests(args.synthesized, seed=args.seed)
+    )
+    if not requests:
+        raise ValueError("The request corpus is empty")
+
+    if args.url:
+        client_context = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        client_context = serve_in_process(load_service_app(args.app))
+
+    async with client_context as client:
+        if args.mode == OPEN_LOOP:
+            outcome = await run_open_loop(client, requests, args.rate, args.duration)
+        else:
+            outcome = await run_closed_loop(
+                client,
+                requests,
+                args.concurrency,
+                total_requests=None if args.duration else args.requests,
+                duration_seconds=args.duration,
+            )
+
+    parameters = {
+        "mode": args.mode,
+        "target": args.url or f"in-process {args.app}",
+        "corpus": args.corpus or f"synthesized ({len(requests)} requests)",
+    }
+    if args.mode == OPEN_LOOP:
+        parameters.update(rate=args.rate, duration_seconds=args.duration)
+    else:
+        parameters.update(
+            concurrency=args.concurrency,
+            requests=None if args.duration else args.requests,
+            duration_seconds=args.duration,
+        )
+    return build_report(outcome, parameters)
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Replay API requests against the service"
+    )
+    parser.add_argument("--mode", choices=(CLOSED_LOOP, OPEN_LOOP), default=CLOSED_LOOP)
+    parser.add_argument(
+        "--url", help="Base URL of a running service, e.g. http://localhost:3000"
+    )
+    parser.add_argument(
+        "--app",
+        default="service:IrisClassifierService",
+        help="Service run in-process when no URL is given",
+    )
+    parser.add_argument(
+        "--corpus", help="JSONL request corpus, synthesized requests otherwise"
+    )
+    parser.add_argument("--corpus-limit", type=int)
+    parser.add_argument(
+        "--synthesized", type=int, default=1000, help="Number of synthesized requests"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--concurrency", type=int, default=8, help="Closed loop clients"
+    )
+    parser.add_argument(
+        "--requests", type=int, default=1000, help="Closed loop requests"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=50, help="Open loop requests per second"
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        help="Duration in seconds, required in open loop, replaces --requests in closed loop",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=30, help="Request timeout in seconds"
+    )
+    parser.add_argument("--output", help="Path of the JSON report, printed otherwise")
+    parser.add_argument(
+        "--compare", help="Baseline JSON report to compare the run with"
+    )
+    args = parser.parse_args(argv)
+    if args.mode == OPEN_LOOP and not args.duration:
+        parser.error("--duration is required in open loop mode")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    report = asyncio.run(run(args))
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            report["comparison"] = compare_reports(json.load(baseline_file), report)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    print(output, file=sys.stderr if args.output else sys.stdout)
@@ -0,0 +1,324 @@
+"""
+This module provides a content-addressed model cache shared between processes.
+
+Every pod on a node can point `MODEL_CACHE_DIR` at the same host directory. Blobs are
+stored under their SHA-256 digest and found through their S3 ETag, so a model is
+downloaded once per node and linked into each pod's models directory. The cache is
+safe to use from several processes at once:
+
+- a per-ETag file lock makes sure only one process downloads a given blob,
+- downloads land in a temporary file and are renamed into place once verified,
+- least recently used blobs are garbage collected when the cache grows too large.
+  Every link into a models directory is registered, and a blob is kept while one of
+  its links still points to it. Fetching and linking a blob hold the garbage
+  collection lock in shared mode, so a blob is never removed between the two.
+
+Layout:
+    <root>/blobs/<sha256[:2]>/<sha256>   the model files
+    <root>/refs/<etag>                   the SHA-256 of the blob of an ETag
+    <root>/links/<sha256>/<path hash>    the paths the blob is linked to
+    <root>/locks/<etag>.lock             download locks
+    <root>/locks/gc.lock                 garbage collection lock
+    <root>/tmp/                          in-progress downloads
+"""
+
+import errno
+import fcntl
+import hashlib
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from utils.structure_logging.logger_config import logger
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class ChecksumMismatchError(Exception):
+    """
+    Raised when a downloaded blob does not match its expected checksum.
+    """
+
+
+def file_digests(path: str):
+    """
+    Computes the SHA-256 and MD5 digests of a file in a single read.
+    """
+    sha256, md5 = hashlib.sha256(), hashlib.md5()
+    with open(path, "rb") as blob_file:
+        for chunk in iter(lambda: blob_file.read(HASH_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+            md5.update(chunk)
+    return sha256.hexdigest(), md5.hexdigest()
+
+
+def _ref_name(etag: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]", "", etag)
+
+
+class BlobCache:
+    """
+    Content-addressed blob cache with LRU garbage collection.
+
+    Attributes:
+        root_dir (str): Directory of the cache, shared by every process on the node.
+        max_bytes (int): Total size of the blobs above which the least recently used
+            blobs are removed.
+    """
+
+    def __init__(self, root_dir: str, max_bytes: int):
+        self.root_dir = root_dir
+        self.max_bytes = max_bytes
+        for name in ("blobs", "refs", "links", "locks", "tmp"):
+            os.makedirs(os.path.join(root_dir, name), exist_ok=True)
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.root_dir, "blobs", sha256[:2], sha256)
+
+    def _ref_path(self, etag: str) -> str:
+        return os.path.join(self.root_dir, "refs", _ref_name(etag))
+
+    def _links_dir(self, sha256: str) -> str:
+        return os.path.join(self.root_dir, "links", sha256)
+
+    @contextmanager
+    def _file_lock(self, name: str, operation: int = fcntl.LOCK_EX):
+        lock_path = os.path.join(self.root_dir, "locks", name)
+        with open(lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _lock(self, etag: str):
+        return self._file_lock(f"{_ref_name(etag)}.lock")
+
+    def _gc_lock(self, exclusive: bool):
+        """
+        Held in shared mode while blobs are fetched and linked, and in exclusive mode
+        while they are garbage collected.
+        """
+        return self._file_lock("gc.lock", fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+    def lookup(self, etag: str) -> Optional[str]:
+        """
+        Returns the path of the cached blob of an ETag, or None if it is not cached.
+        """
+        try:
+            with open(self._ref_path(etag), "r") as ref_file:
+                sha256 = ref_file.read().strip()
+        except OSError:
+            return None
+
+        path = self.blob_path(sha256)
+        try:
+            # the modification time orders the blobs for the LRU collection
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def fetch(
+        self,
+        etag: str,
+        download: Callable[[str], None],
+        expected_sha256: Optional[str] = None,
+    ) -> str:
+        """
+        Returns the cached blob of an ETag, downloading it first if needed.
+
+        Args:
+            etag (str): The S3 ETag of the object.
+            download (Callable[[str], None]): Downloads the object to the given path.
+            expected_sha256 (str, optional): SHA-256 the blob must match. Single part
+                uploads are also verified against their ETag, which is the MD5 of
+                the object.
+
+        Returns:
+            str: The path of the blob in the cache.
+
+        Raises:
+            ChecksumMismatchError: If the downloaded blob does not match its checksum.
+        """
+        with self._gc_lock(exclusive=False):
+            path = self._fetch(etag, download, expected_sha256)
+        self.collect_garbage()
+        return path
+
+    def install(
+        self,
+        etag: str,
+        download: Callable[[str], None],
+        dest_path: str,
+        expected_sha256: Optional[str] = None,
+    ) -> str:
+        """
+        Fetches the blob of an ETag like `fetch()` and links it to `dest_path`. The
+        link is registered, so the blob is not garbage collected while `dest_path`
+        points to it.
+
+        Returns:
+            str: The path of the blob in the cache.
+        """
+        with self._gc_lock(exclusive=False):
+            path = self._fetch(etag, download, expected_sha256)
+            link_into(path, dest_path)
+            self._register_link(os.path.basename(path), dest_path)
+        self.collect_garbage()
+        return path
+
+    def _register_link(self, sha256: str, dest_path: str) -> None:
+        dest_path = os.path.abspath(dest_path)
+        links_dir = self._links_dir(sha256)
+        os.makedirs(links_dir, exist_ok=True)
+        link_name = hashlib.sha256(dest_path.encode()).hexdigest()
+        with open(os.path.join(links_dir, link_name), "w") as link_file:
+            link_file.write(dest_path)
+
+    def _in_use(self, sha256: str, blob_path: str) -> bool:
+        """
+        Returns whether a registered link still points to the blob. The links which
+        were removed or now point to another blob are unregistered.
+        """
+        links_dir = self._links_dir(sha256)
+        try:
+            link_names = os.listdir(links_dir)
+        except OSError:
+            return False
+        for link_name in link_names:
+            link_path = os.path.join(links_dir, link_name)
+            try:
+                with open(link_path, "r") as link_file:
+                    dest_path = link_file.read()
+                # follows symbolic links, and compares the inodes of hard links
+                if os.path.samefile(dest_path, blob_path):
+                    return True
+            except OSError:
+                pass
+            try:
+                os.remove(link_path)
+            except OSError:
+                pass
+        return False
+
+    def _fetch(
+        self,
+        etag: str,
+        download: Callable[[str], None],
+        expected_sha256: Optional[str],
+    ) -> str:
+        path = self.lookup(etag)
+        if path is not None:
+            return path
+
+        with self._lock(etag):
+            # another process may have downloaded it while we waited for the lock
+            path = self.lookup(etag)
+            if path is not None:
+                return path
+
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root_dir, "tmp"))
+            os.close(fd)
+            try:
+                download(tmp_path)
+                sha256, md5 = file_digests(tmp_path)
+                self._verify(etag, sha256, md5, expected_sha256)
+
+                path = self.blob_path(sha256)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+                self._write_ref(etag, sha256)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        return path
+
+    @staticmethod
+    def _verify(etag, sha256, md5, expected_sha256) -> None:
+        if expected_sha256 is not None and sha256 != expected_sha256:
+            raise ChecksumMismatchError(
+                f"SHA-256 mismatch: expected {expected_sha256}, got {sha256}"
+            )
+        # multipart ETags ("<md5>-<parts>") are not the MD5 of the object
+        plain_etag = etag.strip('"')
+        if "-" not in plain_etag and plain_etag != md5:
+            raise ChecksumMismatchError(
+                f"MD5 mismatch: expected {plain_etag}, got {md5}"
+            )
+
+    def _write_ref(self, etag: str, sha256: str) -> None:
+        ref_path = self._ref_path(etag)
+        tmp_ref_path = f"{ref_path}.{os.getpid()}.tmp"
+        with open(tmp_ref_path, "w") as ref_file:
+            ref_file.write(sha256)
+        os.replace(tmp_ref_path, ref_path)
+
+    def collect_garbage(self) -> int:
+        """
+        Removes the least recently used blobs until the cache is below `max_bytes`.
+        Blobs which a registered link points to, or which are hard linked elsewhere,
+        are kept, as a models directory still uses them.
+
+        Returns:
+            int: The number of bytes freed.
+        """
+        with self._gc_lock(exclusive=True):
+            return self._collect_garbage()
+
+    def _collect_garbage(self) -> int:
+        blobs = []
+        blobs_dir = os.path.join(self.root_dir, "blobs")
+        for dir_path, _, file_names in os.walk(blobs_dir):
+            for file_name in file_names:
+                path = os.path.join(dir_path, file_name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                blobs.append((stat.st_mtime, stat.st_size, stat.st_nlink, path))
+
+        total_bytes = sum(size for _, size, _, _ in blobs)
+        freed_bytes = 0
+        for _, size, link_count, path in sorted(blobs):
+            if total_bytes - freed_bytes <= self.max_bytes:
+                break
+            sha256 = os.path.basename(path)
+            if link_count > 1 or self._in_use(sha256, path):
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            try:
+                os.rmdir(self._links_dir(sha256))
+            except OSError:
+                pass
+            freed_bytes += size
+            logger.warning("Removed model blob from cache", blob=path, size=size)
+        return freed_bytes
+
+
+def link_into(blob_path: str, dest_path: str) -> None:
+    """
+    Links a cached blob to `dest_path`, replacing any existing file atomically.
+
+    A hard link is used when the cache and the destination share a file system,
+    a symbolic link otherwise.
+
+    Raises:
+        OSError: If the blob cannot be linked, e.g. it does not exist.
+    """
+    tmp_path = f"{dest_path}.{os.getpid()}.tmp"
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(blob_path, tmp_path)
+    except OSError as e:
+        # other file system, or hard links not allowed
+        if e.errno not in (errno.EXDEV, errno.EPERM):
+            raise
+        os.symlink(os.path.abspath(blob_path), tmp_path)
+    os.replace(tmp_path, dest_path)
@@ -0,0 +1,62 @@
+"""
+This module provides a local directory stand-in for the S3 client used by
+`download_models.py`.
+
+Objects are plain files under `<root_dir>/<bucket>/<key>`. `list_objects_v2` reports
+the same fields as S3 (with the MD5 of the file as ETag, like a single part upload)
+and paginates the same way, so the model sync and the model cache can be tested
+without S3. Set `MODEL_STORE_LOCAL_DIR` to make `download_models.py` use it.
+"""
+
+import os
+import shutil
+from datetime import datetime, timezone
+
+from utils.model_cache.blob_cache import file_digests
+
+
+class LocalDirectoryS3Client:
+    """
+    Implements `list_objects_v2` and `download_file` of the boto3 S3 client on top
+    of a local directory.
+    """
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+
+    def _object(self, bucket: str, key: str) -> dict:
+        path = os.path.join(self.root_dir, bucket, key)
+        stat = os.stat(path)
+        _, md5 = file_digests(path)
+        return {
+            "Key": key,
+            "ETag": f'"{md5}"',
+            "Size": stat.st_size,
+            "LastModified": datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+        }
+
+    def list_objects_v2(
+        self, Bucket: str, Prefix: str = "", ContinuationToken=None, MaxKeys=1000
+    ) -> dict:
+        bucket_dir = os.path.join(self.root_dir, Bucket)
+        keys = sorted(
+            os.path.relpath(os.path.join(dir_path, file_name), bucket_dir)
+            for dir_path, _, file_names in os.walk(bucket_dir)
+            for file_name in file_names
+        )
+        keys = [key for key in keys if key.startswith(Prefix)]
+        if ContinuationToken:
+            keys = [key for key in keys if key > ContinuationToken]
+
+        page = keys[:MaxKeys]
+        response = {
+            "Contents": [self._object(Bucket, key) for key in page],
+            "KeyCount": len(page),
+            "IsTruncated": len(keys) > MaxKeys,
+        }
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = page[-1]
+        return response
+
+    def download_file(self, Bucket: str, Key: str, Filename: str, Config=None):
+        shutil.copyfile(os.path.join(self.root_dir, Bucket, Key), Filename)
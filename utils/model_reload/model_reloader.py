@@ -0,0 +1,182 @@
+"""
+This module reloads the served model in the background when its file changes.
+
+`ModelReloader` polls the model file, loads a changed file in its own thread, warms
+the new model up with sample inputs and then swaps it in by replacing a single
+reference. Requests read the reference once, so in-flight requests finish on the
+model they started with while new requests use the new one, and the service never
+needs a restart to pick up a new model.
+"""
+
+import hashlib
+import os
+import pickle
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional
+
+from utils.monitoring.prometheus_metrics import bentoml_service_model_info
+from utils.structure_logging.logger_config import logger
+
+
+def load_pickle(model_path: str):
+    with open(model_path, "rb") as model_file:
+        return pickle.load(model_file)
+
+
+def file_version(model_path: str) -> str:
+    """
+    Returns the version of a model file: the first 12 hex digits of its SHA-256.
+    """
+    sha256 = hashlib.sha256()
+    with open(model_path, "rb") as model_file:
+        for chunk in iter(lambda: model_file.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()[:12]
+
+
+@dataclass(frozen=True)
+class LoadedModel:
+    """
+    A loaded model together with the version it was loaded from.
+    """
+
+    model: Any
+    version: str
+    loaded_at: float
+
+
+class ModelReloader:
+    """
+    Holds the served model and swaps in new versions of the model file.
+
+    Attributes:
+        model_path (str): Path of the model file to watch.
+        service_name (str): Service name used in the metric labels.
+        poll_interval_seconds (float): Interval between two checks of the model file.
+        warmup_inputs: Sample inputs every new model must predict before it is served.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        service_name: str,
+        poll_interval_seconds: float = 10.0,
+        warmup_inputs=None,
+        load_model: Callable[[str], Any] = load_pickle,
+    ):
+        self.model_path = model_path
+        self.service_name = service_name
+        self.poll_interval_seconds = poll_interval_seconds
+        self.warmup_inputs = warmup_inputs
+        self._load_model = load_model
+        self._swap_listeners: List[Callable[[LoadedModel, LoadedModel], None]] = []
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._file_state = None
+        self.current: Optional[LoadedModel] = None
+
+    @property
+    def model(self):
+        return self.current.model
+
+    @property
+    def version(self) -> str:
+        return self.current.version
+
+    def add_swap_listener(
+        self, listener: Callable[[LoadedModel, LoadedModel], None]
+    ) -> None:
+        """
+        Registers a callback invoked with the old and the new model after every swap,
+        e.g. to invalidate result caches tied to the old version.
+        """
+        self._swap_listeners.append(listener)
+
+    def _stat(self):
+        stat = os.stat(self.model_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self) -> LoadedModel:
+        version = file_version(self.model_path)
+        model = self._load_model(self.model_path)
+        if self.warmup_inputs is not None:
+            # warm up both the batch and the single row code paths
+            model.predict(self.warmup_inputs)
+            for index in range(len(self.warmup_inputs)):
+                model.predict(self.warmup_inputs[index : index + 1])
+        return LoadedModel(model=model, version=version, loaded_at=time.time())
+
+    def load(self) -> LoadedModel:
+        """
+        Loads the model file synchronously and serves it.
+        """
+        self._file_state = self._stat()
+        self._swap(self._load())
+        return self.current
+
+    def _swap(self, new: LoadedModel) -> None:
+        old, self.current = self.current, new
+
+        model_info = bentoml_service_model_info
+        model_info.labels(service_name=self.service_name, version=new.version).set(1)
+        if old is None:
+            return
+        if old.version != new.version:
+            model_info.labels(service_name=self.service_name, version=old.version).set(
+                0
+            )
+
+        logger.warning(
+            "Model reloaded", old_version=old.version, new_version=new.version
+        )
+        for listener in self._swap_listeners:
+            try:
+                listener(old, new)
+            except Exception:
+                logger.exception("Error in model swap listener")
+
+    def check_for_update(self) -> bool:
+        """
+        Reloads the model if its file changed since the last load. The current model
+        keeps being served if the new file cannot be loaded or warmed up.
+
+        Returns:
+            bool: Whether a new model was swapped in.
+        """
+        try:
+            file_state = self._stat()
+            if file_state == self._file_state:
+                return False
+            new = self._load()
+        except Exception:
+            logger.exception("Error reloading model", model_path=self.model_path)
+            return False
+
+        self._file_state = file_state
+        if new.version == self.current.version:
+            return False
+        self._swap(new)
+        return True
+
+    def _watch(self) -> None:
+        while not self._stop_event.wait(self.poll_interval_seconds):
+            self.check_for_update()
+
+    def start(self) -> None:
+        """
+        Starts watching the model file in a background thread.
+        """
+        if self.poll_interval_seconds <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._watch, name="model-reloader", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,199 @@
+"""
+This module evaluates a candidate model on live traffic, off the request path.
+
+`ShadowEvaluator` samples `sample_rate` of the requests served by the primary model and
+queues their inputs, together with the primary prediction and its duration, in a
+bounded queue. Its own worker threads run the candidate model on the queued inputs and
+record:
+
+- whether the candidate agrees with the primary model, in
+  `bentoml_service_shadow_comparisons_total`;
+- the duration of both models on the sampled inputs, in
+  `bentoml_service_shadow_model_duration_seconds`;
+- the samples dropped because the queue was full, in
+  `bentoml_service_shadow_dropped_total`.
+
+A request never waits for the candidate model: queueing a sample does not block, and a
+sample is dropped when the queue is full.
+
+The sample rate can be changed at runtime by writing a number between 0 and 1 to the
+file at `sample_rate_path`, which every worker checks at most once per
+`SAMPLE_RATE_REFRESH_SECONDS`.
+"""
+
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Callable, List, Optional
+
+import numpy as np
+
+from utils.model_reload.model_reloader import ModelReloader
+from utils.monitoring.prometheus_metrics import (
+    bentoml_service_shadow_comparisons_total,
+    bentoml_service_shadow_dropped_total,
+    bentoml_service_shadow_model_duration_seconds,
+    bentoml_service_shadow_sample_rate,
+)
+from utils.structure_logging.logger_config import logger
+
+SAMPLE_RATE_REFRESH_SECONDS = 1.0
+
+AGREE = "agree"
+DISAGREE = "disagree"
+ERROR = "error"
+
+
+class ShadowEvaluator:
+    """
+    Runs a candidate model on a sample of the requests in background threads.
+
+    Attributes:
+        candidate (ModelReloader): Holds the candidate model.
+        service_name (str): Service name used in the metric labels.
+        sample_rate (float): Share of the requests evaluated with the candidate.
+        sample_rate_path (str, optional): File overriding the sample rate at runtime.
+    """
+
+    def __init__(
+        self,
+        candidate: ModelReloader,
+        service_name: str,
+        sample_rate: float,
+        queue_size: int = 1000,
+        workers: int = 1,
+        sample_rate_path: Optional[str] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sample: Callable[[], float] = random.random,
+    ):
+        self.candidate = candidate
+        self.service_name = service_name
+        self.sample_rate_path = sample_rate_path
+        self.workers = workers
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._threads: List[threading.Thread] = []
+        self._clock = clock
+        self._sample = sample
+        self._next_refresh = 0.0
+        self._sample_rate_state = None
+        self.set_sample_rate(sample_rate)
+
+        labels = {"service_name": service_name}
+        self._comparisons = {
+            outcome: bentoml_service_shadow_comparisons_total.labels(
+                outcome=outcome, **labels
+            )
+            for outcome in (AGREE, DISAGREE, ERROR)
+        }
+        self._durations = {
+            model: bentoml_service_shadow_model_duration_seconds.labels(
+                model=model, **labels
+            )
+            for model in ("primary", "shadow")
+        }
+        self._dropped = bentoml_service_shadow_dropped_total.labels(**labels)
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def set_sample_rate(self, sample_rate: float) -> None:
+        self.sample_rate = sample_rate
+        bentoml_service_shadow_sample_rate.labels(service_name=self.service_name).set(
+            sample_rate
+        )
+
+    def _refresh_sample_rate(self) -> None:
+        now = self._clock()
+        if self.sample_rate_path is None or now < self._next_refresh:
+            return
+        self._next_refresh = now + SAMPLE_RATE_REFRESH_SECONDS
+        try:
+            stat = os.stat(self.sample_rate_path)
+            state = (stat.st_mtime_ns, stat.st_size)
+            if state == self._sample_rate_state:
+                return
+            self._sample_rate_state = state
+            with open(self.sample_rate_path) as sample_rate_file:
+                sample_rate = float(sample_rate_file.read().strip())
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            logger.exception("Error reading shadow sample rate")
+            return
+        if not 0 <= sample_rate <= 1:
+            logger.error("Shadow sample rate must be between 0 and 1")
+            return
+        if sample_rate != self.sample_rate:
+            logger.warning("Shadow sample rate changed", sample_rate=sample_rate)
+            self.set_sample_rate(sample_rate)
+
+    def submit(
+        self, inputs: np.ndarray, primary_prediction: Any, primary_seconds: float
+    ) -> bool:
+        """
+        Queues a sample of the request for the candidate model, without blocking.
+
+        Returns:
+            bool: Whether the request was queued.
+        """
+        self._refresh_sample_rate()
+        if self._sample() >= self.sample_rate:
+            return False
+        try:
+            self._queue.put_nowait((inputs, primary_prediction, primary_seconds))
+        except queue.Full:
+            self._dropped.inc()
+            return False
+        return True
+
+    def evaluate(
+        self, inputs: np.ndarray, primary_prediction: Any, primary_seconds: float
+    ) -> None:
+        """
+        Runs the candidate model on the inputs of a request and records the outcome.
+        """
+        try:
+            start = time.perf_counter()
+            prediction = self.candidate.model.predict(inputs)
+            shadow_seconds = time.perf_counter() - start
+        except Exception:
+            logger.exception("Error running shadow model")
+            self._comparisons[ERROR].inc()
+            return
+        agrees = np.array_equal(prediction, primary_prediction)
+        self._comparisons[AGREE if agrees else DISAGREE].inc()
+        self._durations["primary"].observe(primary_seconds)
+        self._durations["shadow"].observe(shadow_seconds)
+
+    def _work(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            self.evaluate(*item)
+
+    def start(self) -> None:
+        """
+        Starts the worker threads running the candidate model.
+        """
+        if self._threads:
+            return
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._work, name=f"shadow-evaluator-{index}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        """
+        Stops the worker threads once the queued samples are evaluated.
+        """
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
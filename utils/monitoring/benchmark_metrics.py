@@ -0,0 +1,86 @@
+"""
+Microbenchmark of observing a multiprocess histogram on the request path, directly and
+through `BufferedHistogram`.
+
+To run: `python -m utils.monitoring.benchmark_metrics --observations 200000`
+"""
+
+import argparse
+import os
+import tempfile
+import timeit
+from contextlib import contextmanager
+
+from prometheus_client import Histogram, values
+
+from utils.monitoring.multiprocess import BufferedHistogram
+from utils.monitoring.prometheus_metrics import DEFAULT_LATENCY_BUCKETS
+
+
+@contextmanager
+def multiprocess_values(directory: str):
+    """
+    Makes the histograms created in the block write to mmap files in `directory`, as
+    they do in the BentoML workers.
+    """
+    previous_directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    previous_value_class = values.ValueClass
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = directory
+    values.ValueClass = values.MultiProcessValue()
+    try:
+        yield
+    finally:
+        values.ValueClass = previous_value_class
+        if previous_directory is None:
+            del os.environ["PROMETHEUS_MULTIPROC_DIR"]
+        else:
+            os.environ["PROMETHEUS_MULTIPROC_DIR"] = previous_directory
+
+
+def run_benchmark(observations: int, repeat: int = 5) -> dict:
+    """
+    Times `observations` observations, keeping the best of `repeat` runs.
+
+    Returns:
+        dict: Nanoseconds per observation for every way of observing.
+    """
+    with tempfile.TemporaryDirectory() as directory, multiprocess_values(directory):
+        histogram = Histogram(
+            "benchmark_duration_seconds",
+            "Benchmark histogram",
+            labelnames=["stage"],
+            buckets=DEFAULT_LATENCY_BUCKETS,
+            registry=None,
+        )
+        buffered = BufferedHistogram(histogram)
+        direct_child = histogram.labels(stage="model_call")
+        buffered_child = buffered.labels(stage="model_call")
+
+        candidates = {
+            "Histogram child": lambda: direct_child.observe(0.0003),
+            "Histogram.labels": lambda: histogram.labels(stage="model_call").observe(
+                0.0003
+            ),
+            "BufferedHistogram child": lambda: buffered_child.observe(0.0003),
+            "BufferedHistogram.labels": lambda: buffered.labels(
+                stage="model_call"
+            ).observe(0.0003),
+        }
+        results = {
+            name: min(timeit.repeat(candidate, number=observations, repeat=repeat))
+            / observations
+            * 1e9
+            for name, candidate in candidates.items()
+        }
+        buffered.flush()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--observations", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for name, nanoseconds in run_benchmark(args.observations, args.repeat).items():
+        print(f"{name:26s} {nanoseconds:8.0f} ns/observation")
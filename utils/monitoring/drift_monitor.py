@@ -0,0 +1,228 @@
+"""
+This module monitors the drift of the model inputs away from the training data.
+
+`train_and_save_model.py` saves a baseline of every feature of the training data: the
+edges of its decile bins, the share of the training rows in every bin, and the mean
+and standard deviation of the feature.
+
+`DriftMonitor` keeps the same statistics of the inputs served, in constant memory: a
+count per bin and running moments per feature. Inputs are buffered and folded into the
+statistics in vectorized batches of `batch_size` rows, so a request only copies its
+row into the buffer. Every `window_size` inputs, the statistics of the window are
+compared with the baseline and exported per feature, then reset:
+
+- `bentoml_service_feature_drift_psi`, the population stability index of the bins.
+  Below 0.1 the distribution is stable, above 0.25 it has shifted significantly;
+- `bentoml_service_feature_mean_shift`, the difference between the mean of the window
+  and the training mean, in training standard deviations;
+- `bentoml_service_feature_std_ratio`, the standard deviation of the window over the
+  training one.
+"""
+
+import json
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from utils.monitoring.prometheus_metrics import (
+    bentoml_service_feature_drift_psi,
+    bentoml_service_feature_mean_shift,
+    bentoml_service_feature_std_ratio,
+)
+
+# proportion used for empty bins, which would make the PSI infinite
+PSI_EPSILON = 1e-4
+
+
+def bin_counts(edges: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    Counts the values below the first edge, between every two edges and above the
+    last edge.
+    """
+    return np.bincount(
+        np.searchsorted(edges, values, side="right"), minlength=len(edges) + 1
+    )
+
+
+def build_baseline(features: np.ndarray, names: Sequence[str], bins: int = 10) -> Dict:
+    """
+    Returns the baseline of every feature (column) of the training data, as a JSON
+    serializable dictionary.
+    """
+    features = np.asarray(features, dtype=np.float64)
+    baseline = {}
+    for index, name in enumerate(names):
+        column = features[:, index]
+        edges = np.unique(np.quantile(column, np.linspace(0, 1, bins + 1)))
+        counts = bin_counts(edges, column)
+        baseline[name] = {
+            "edges": edges.tolist(),
+            "proportions": (counts / len(column)).tolist(),
+            "mean": float(column.mean()),
+            "std": float(column.std()),
+        }
+    return {"samples": len(features), "features": baseline}
+
+
+def save_baseline(baseline: Dict, path: str) -> None:
+    with open(path, "w") as baseline_file:
+        json.dump(baseline, baseline_file, indent=2)
+
+
+@dataclass(frozen=True)
+class FeatureBaseline:
+    """
+    Distribution of a feature in the training data.
+    """
+
+    name: str
+    edges: np.ndarray
+    proportions: np.ndarray
+    mean: float
+    std: float
+
+
+def parse_baseline(baseline: Dict, names: Sequence[str]) -> List[FeatureBaseline]:
+    """
+    Returns the features `names` of a baseline built by `build_baseline()`, in the
+    order of `names`, i.e. of the input columns. The features are looked up by name,
+    so the baseline does not depend on the order its columns were saved in.
+
+    Raises:
+        ValueError: If the baseline has no feature of one of the names.
+    """
+    features = baseline["features"]
+    missing = [name for name in names if name not in features]
+    if missing:
+        raise ValueError(f"The baseline has no feature {', '.join(missing)}")
+    return [
+        FeatureBaseline(
+            name=name,
+            edges=np.array(features[name]["edges"]),
+            proportions=np.array(features[name]["proportions"]),
+            mean=features[name]["mean"],
+            std=features[name]["std"],
+        )
+        for name in names
+    ]
+
+
+def load_baseline(path: str, names: Sequence[str]) -> List[FeatureBaseline]:
+    with open(path) as baseline_file:
+        return parse_baseline(json.load(baseline_file), names)
+
+
+def population_stability_index(expected: np.ndarray, actual: np.ndarray) -> float:
+    """
+    Returns the population stability index of the bin proportions `actual` against
+    `expected`.
+    """
+    expected = np.maximum(expected, PSI_EPSILON)
+    actual = np.maximum(actual, PSI_EPSILON)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+class DriftMonitor:
+    """
+    Streaming statistics of the model inputs, compared with the training baseline.
+
+    Attributes:
+        baselines (List[FeatureBaseline]): Baseline of every feature, in the order of
+            the input columns.
+        window_size (int): Number of inputs compared with the baseline at once.
+        batch_size (int): Number of inputs buffered before they are folded into the
+            statistics.
+    """
+
+    def __init__(
+        self,
+        baselines: List[FeatureBaseline],
+        window_size: int = 1000,
+        batch_size: int = 128,
+    ):
+        self.baselines = baselines
+        self.window_size = window_size
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._buffer = np.empty((batch_size, len(baselines)), dtype=np.float64)
+        self._buffered = 0
+        self._gauges = [
+            (
+                bentoml_service_feature_drift_psi.labels(feature=baseline.name),
+                bentoml_service_feature_mean_shift.labels(feature=baseline.name),
+                bentoml_service_feature_std_ratio.labels(feature=baseline.name),
+            )
+            for baseline in baselines
+        ]
+        self._reset()
+
+    def _reset(self) -> None:
+        self._counts = [np.zeros(len(b.edges) + 1, np.int64) for b in self.baselines]
+        self._count = 0
+        self._mean = np.zeros(len(self.baselines))
+        self._m2 = np.zeros(len(self.baselines))
+
+    def observe(self, row: Sequence[float]) -> None:
+        """
+        Records the features of one input.
+        """
+        with self._lock:
+            self._buffer[self._buffered] = row
+            self._buffered += 1
+            if self._buffered == self.batch_size:
+                self._update(self._buffer)
+                self._buffered = 0
+
+    def update(self, batch: np.ndarray) -> None:
+        """
+        Records the features of a batch of inputs, one input per row.
+        """
+        with self._lock:
+            self._update(np.asarray(batch, dtype=np.float64))
+
+    def _update(self, batch: np.ndarray) -> None:
+        for index, baseline in enumerate(self.baselines):
+            self._counts[index] += bin_counts(baseline.edges, batch[:, index])
+
+        # merges the moments of the batch into the running ones (Chan et al.)
+        count = len(batch)
+        mean = batch.mean(axis=0)
+        m2 = ((batch - mean) ** 2).sum(axis=0)
+        total = self._count + count
+        delta = mean - self._mean
+        self._mean = self._mean + delta * count / total
+        self._m2 = self._m2 + m2 + delta**2 * self._count * count / total
+        self._count = total
+
+        if self._count >= self.window_size:
+            self._export()
+            self._reset()
+
+    def scores(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns the drift scores of every feature in the current window.
+        """
+        if self._count == 0:
+            return {}
+        std = np.sqrt(self._m2 / self._count)
+        scores = {}
+        for index, baseline in enumerate(self.baselines):
+            training_std = baseline.std or 1.0
+            scores[baseline.name] = {
+                "psi": population_stability_index(
+                    baseline.proportions, self._counts[index] / self._count
+                ),
+                "mean_shift": float((self._mean[index] - baseline.mean) / training_std),
+                "std_ratio": float(std[index] / training_std),
+            }
+        return scores
+
+    def _export(self) -> None:
+        for (psi, mean_shift, std_ratio), feature_scores in zip(
+            self._gauges, self.scores().values()
+        ):
+            psi.set(feature_scores["psi"])
+            mean_shift.set(feature_scores["mean_shift"])
+            std_ratio.set(feature_scores["std_ratio"])
@@ -0,0 +1,129 @@
+"""
+Import time and memory profile of the service process.
+
+The module is imported in a fresh interpreter with `python -X importtime`, so the
+profile reflects the cold start of a worker. The test suite runs the profile with
+regression thresholds on the import time and the peak RSS.
+
+To run: `python -m utils.monitoring.import_profile service`
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+# Peak RSS is read with `resource`, `ru_maxrss` is in kilobytes on Linux
+CHILD_SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+import_seconds = time.perf_counter() - start
+{statement}
+print(json.dumps({{
+    "import_seconds": import_seconds,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modules": sorted(sys.modules),
+}}))
+"""
+
+
+@dataclass
+class ImportProfile:
+    """
+    Profile of importing a module in a fresh interpreter.
+
+    Attributes:
+        import_seconds (float): Wall time of the import.
+        max_rss_mb (float): Peak RSS of the process once the import and the optional
+            statement completed.
+        slowest_imports (List[Tuple[str, float]]): Top level packages with the highest
+            cumulative import time in seconds, slowest first.
+        modules (List[str]): Every module loaded by the process.
+    """
+
+    import_seconds: float
+    max_rss_mb: float
+    slowest_imports: List[Tuple[str, float]]
+    modules: List[str]
+
+
+def parse_importtime(stderr: str) -> Dict[str, float]:
+    """
+    Returns the cumulative import time in seconds of every top level package from
+    the `-X importtime` output.
+    """
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative_us, name = line[len("import time:") :].split("|")
+        if not cumulative_us.strip().isdigit():
+            continue
+        package = name.strip().split(".")[0]
+        seconds = int(cumulative_us) / 1e6
+        cumulative[package] = max(cumulative.get(package, 0.0), seconds)
+    return cumulative
+
+
+def profile_import(
+    module: str,
+    statement: Optional[str] = None,
+    env: Optional[Dict[str, str]] = None,
+    top: int = 15,
+) -> ImportProfile:
+    """
+    Imports `module` in a fresh interpreter and profiles it.
+
+    Args:
+        module (str): Module to import.
+        statement (str, optional): Python statement run after the import, e.g. to
+            instantiate the service, before the peak RSS is read.
+        env (dict, optional): Environment variables set in the interpreter.
+        top (int): Number of slowest packages reported.
+    """
+    script = CHILD_SCRIPT.format(module=module, statement=statement or "")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        env={**os.environ, **(env or {})},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    measurements = json.loads(result.stdout.strip().splitlines()[-1])
+    cumulative = parse_importtime(result.stderr)
+    slowest = sorted(cumulative.items(), key=lambda item: item[1], reverse=True)
+    return ImportProfile(
+        import_seconds=measurements["import_seconds"],
+        max_rss_mb=measurements["max_rss_mb"],
+        slowest_imports=slowest[:top],
+        modules=measurements["modules"],
+    )
+
+
+def format_report(module: str, profile: ImportProfile) -> str:
+    lines = [
+        f"Import of {module}: {profile.import_seconds:.3f}s, "
+        f"peak RSS {profile.max_rss_mb:.1f} MB, {len(profile.modules)} modules",
+    ]
+    lines.extend(
+        f"  {seconds:8.3f}s  {package}" for package, seconds in profile.slowest_imports
+    )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("module", help="Module to import, e.g. service")
+    parser.add_argument("--statement", help="Statement run after the import")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    print(
+        format_report(
+            args.module, profile_import(args.module, args.statement, top=args.top)
+        )
+    )
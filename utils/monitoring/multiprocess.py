@@ -0,0 +1,356 @@
+"""
+This module keeps the Prometheus metrics correct and cheap with several worker processes.
+
+`bentoml serve` sets `PROMETHEUS_MULTIPROC_DIR` for its workers, so every metric value
+is written to an mmap-backed file per worker process, and the `/metrics` endpoint
+aggregates the files of all workers. On top of that, this module provides:
+
+- `buffer_observations()`: observing a multiprocess histogram takes a global lock and
+  writes to the mmap file on every call, several microseconds on the request path.
+  Buffered histograms only count the observation in process memory, and
+  `metrics_flusher` writes the counts to the files in the background every
+  `METRICS_FLUSH_INTERVAL_SECONDS`.
+- `compact_dead_process_files()`: every worker process leaves a counter and a histogram
+  file behind, so the directory would grow with every worker restart. The files of
+  exited workers are merged into a single archive file per metric type, and the live
+  gauges of exited workers are removed. The compaction holds an exclusive lock on the
+  directory and the scrapes a shared one (see `LockedMultiProcessCollector`), so a
+  scrape never reads both the new archive and the files merged into it.
+- `start_worker_metrics()` and `stop_worker_metrics()`, called when a worker starts
+  and exits.
+"""
+
+import fcntl
+import glob
+import json
+import os
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import List, Optional
+
+from prometheus_client import multiprocess, values
+from prometheus_client.context_managers import Timer
+from prometheus_client.mmap_dict import MmapedDict
+
+from utils.common.settings import get_settings
+from utils.structure_logging.logger_config import logger
+
+# Metric types whose values are summed across processes, and can therefore be merged
+COMPACTED_TYPES = ("counter", "histogram", "summary")
+ARCHIVE_ID = "archive"
+COMPACTION_LOCK_FILE = ".compaction.lock"
+# Files merged into an archive which is being swapped in
+COMPACTION_JOURNAL_FILE = ".compaction.journal"
+
+
+def is_multiprocess() -> bool:
+    """
+    Returns whether metric values are written to the multiprocess directory.
+    """
+    return getattr(values.ValueClass, "_multiprocess", False)
+
+
+class _BufferedHistogramChild:
+    """
+    Labelled histogram counting observations in process memory until flushed.
+    """
+
+    __slots__ = ("_child", "_upper_bounds", "_counts", "_sum", "_lock")
+
+    def __init__(self, child):
+        self._child = child
+        self._upper_bounds = child._upper_bounds
+        self._counts = [0] * len(self._upper_bounds)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, amount: float) -> None:
+        # the bucket of a value is the first one whose upper bound is >= the value
+        index = bisect_left(self._upper_bounds, amount)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += amount
+
+    def time(self) -> Timer:
+        return Timer(self, "observe")
+
+    def flush(self) -> None:
+        with self._lock:
+            counts, total = self._counts, self._sum
+            self._counts = [0] * len(counts)
+            self._sum = 0.0
+        if not any(counts):
+            return
+        # the buckets and the sum of the prometheus_client child are incremented
+        # directly, once per flush instead of once per observation
+        for bucket, count in zip(self._child._buckets, counts):
+            if count:
+                bucket.inc(count)
+        self._child._sum.inc(total)
+
+
+class BufferedHistogram:
+    """
+    Wraps a labelled prometheus_client `Histogram`, buffering its observations.
+    """
+
+    def __init__(self, histogram):
+        self._histogram = histogram
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *labelvalues, **labelkwargs) -> _BufferedHistogramChild:
+        key = labelvalues or tuple(labelkwargs.items())
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = _BufferedHistogramChild(
+                        self._histogram.labels(*labelvalues, **labelkwargs)
+                    )
+                    self._children[key] = child
+        return child
+
+    def flush(self) -> None:
+        for child in list(self._children.values()):
+            child.flush()
+
+
+class MetricsFlusher:
+    """
+    Flushes the buffered histograms in a background thread.
+    """
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._metrics: List[BufferedHistogram] = []
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, metric: BufferedHistogram) -> None:
+        self._metrics.append(metric)
+
+    def flush(self) -> None:
+        for metric in self._metrics:
+            try:
+                metric.flush()
+            except Exception:
+                logger.exception("Error flushing metrics")
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval_seconds):
+            self.flush()
+
+    def start(self) -> None:
+        if not self._metrics or self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="metrics-flusher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+metrics_flusher = MetricsFlusher(get_settings().metrics_flush_interval_seconds)
+
+
+def buffer_observations(histogram):
+    """
+    Returns a buffered version of a labelled histogram in multiprocess mode, and the
+    histogram itself otherwise.
+    """
+    if not is_multiprocess():
+        return histogram
+    buffered = BufferedHistogram(histogram)
+    metrics_flusher.register(buffered)
+    return buffered
+
+
+def _file_process_id(path: str) -> str:
+    # files are named <type>_<pid>.db or gauge_<mode>_<pid>.db
+    return os.path.basename(path)[: -len(".db")].rsplit("_", 1)[1]
+
+
+def _is_alive(pid: str) -> bool:
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        return True
+    return True
+
+
+@contextmanager
+def _compaction_lock(directory: str, operation: int = fcntl.LOCK_EX):
+    with open(os.path.join(directory, COMPACTION_LOCK_FILE), "a") as lock_file:
+        fcntl.flock(lock_file, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class LockedMultiProcessCollector(multiprocess.MultiProcessCollector):
+    """
+    `MultiProcessCollector` reading the metric files under a shared compaction lock.
+
+    Without it, a scrape listing the files before a compaction and reading them after
+    would count the merged values twice, once in the new archive and once in the
+    files of the exited workers.
+    """
+
+    def collect(self):
+        with _compaction_lock(self._path, fcntl.LOCK_SH):
+            return super().collect()
+
+
+def use_locked_collector() -> None:
+    """
+    Makes the `/metrics` endpoint of BentoML, which creates a `MultiProcessCollector`
+    on every scrape, collect under the compaction lock.
+    """
+    multiprocess.MultiProcessCollector = LockedMultiProcessCollector
+
+
+def _archive_path(directory: str, metric_type: str) -> str:
+    return os.path.join(directory, f"{metric_type}_{ARCHIVE_ID}.db")
+
+
+def _remove_files(paths: List[str]) -> None:
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _recover_interrupted_merge(directory: str) -> None:
+    """
+    Completes or rolls back a merge interrupted by the exit of its process.
+    """
+    journal_path = os.path.join(directory, COMPACTION_JOURNAL_FILE)
+    try:
+        with open(journal_path) as journal_file:
+            journal = json.load(journal_file)
+    except FileNotFoundError:
+        return
+    temporary_path = _archive_path(directory, journal["metric_type"]) + ".tmp"
+    if os.path.exists(temporary_path):
+        # the archive was not swapped in, the merged files are merged again
+        os.remove(temporary_path)
+    else:
+        _remove_files(journal["paths"])
+    os.remove(journal_path)
+
+
+def _merge_into_archive(directory: str, metric_type: str, paths: List[str]) -> None:
+    archive_path = _archive_path(directory, metric_type)
+    totals = {}
+    for path in ([archive_path] if os.path.exists(archive_path) else []) + paths:
+        for key, value, _, _ in MmapedDict.read_all_values_from_file(path):
+            totals[key] = totals.get(key, 0.0) + value
+
+    # written aside (not matching *.db) and swapped in, so a scrape never sees a
+    # partially written archive
+    temporary_path = archive_path + ".tmp"
+    if os.path.exists(temporary_path):
+        os.remove(temporary_path)
+    archive = MmapedDict(temporary_path)
+    for key, value in totals.items():
+        archive.write_value(key, value, 0.0)
+    archive.close()
+
+    # the merged files are recorded before the archive is swapped in, so they are
+    # never counted twice when the process exits before removing them
+    journal_path = os.path.join(directory, COMPACTION_JOURNAL_FILE)
+    with open(journal_path + ".tmp", "w") as journal_file:
+        json.dump({"metric_type": metric_type, "paths": paths}, journal_file)
+        journal_file.flush()
+        os.fsync(journal_file.fileno())
+    os.replace(journal_path + ".tmp", journal_path)
+    os.replace(temporary_path, archive_path)
+    _remove_files(paths)
+    os.remove(journal_path)
+
+
+def compact_dead_process_files(
+    directory: Optional[str] = None, exiting_pid: Optional[int] = None
+) -> int:
+    """
+    Merges the counter, histogram and summary files of exited processes into one
+    archive file per type, and removes the live gauges of exited processes.
+
+    Args:
+        directory (str, optional): The multiprocess directory, defaults to
+            `PROMETHEUS_MULTIPROC_DIR`.
+        exiting_pid (int, optional): Process which is exiting, handled as exited.
+
+    Returns:
+        int: The number of files merged or removed.
+    """
+    directory = directory or os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not directory or not os.path.isdir(directory):
+        return 0
+
+    exiting = str(exiting_pid) if exiting_pid is not None else None
+
+    def exited(path: str) -> bool:
+        pid = _file_process_id(path)
+        return pid != ARCHIVE_ID and (pid == exiting or not _is_alive(pid))
+
+    removed = 0
+    with _compaction_lock(directory):
+        _recover_interrupted_merge(directory)
+        for metric_type in COMPACTED_TYPES:
+            paths = [
+                path
+                for path in glob.glob(os.path.join(directory, f"{metric_type}_*.db"))
+                if exited(path)
+            ]
+            if paths:
+                _merge_into_archive(directory, metric_type, paths)
+                removed += len(paths)
+
+        live_gauge_paths = glob.glob(os.path.join(directory, "gauge_live*_*.db"))
+        for pid in {_file_process_id(path) for path in live_gauge_paths}:
+            if pid == exiting or not _is_alive(pid):
+                multiprocess.mark_process_dead(pid, directory)
+                removed += 1
+    return removed
+
+
+def start_worker_metrics() -> None:
+    """
+    Cleans up after exited workers and starts flushing the buffered histograms.
+    """
+    if not is_multiprocess():
+        return
+    use_locked_collector()
+    try:
+        compact_dead_process_files()
+    except Exception:
+        logger.exception("Error compacting metric files")
+    metrics_flusher.start()
+
+
+def stop_worker_metrics() -> None:
+    """
+    Flushes the buffered histograms and merges the metric files of the exiting worker.
+    """
+    if not is_multiprocess():
+        return
+    metrics_flusher.stop()
+    try:
+        compact_dead_process_files(exiting_pid=os.getpid())
+    except Exception:
+        logger.exception("Error compacting metric files")
@@ -0,0 +1,218 @@
+"""
+On-demand profiles of a live worker process.
+
+Nothing is installed or traced until a capture is requested, so the profiler costs
+nothing when it is not in use:
+
+- `capture_cpu_profile()` samples the stacks of the threads of the process at a fixed
+  interval, like py-spy, and returns them in the folded stack format read by
+  `flamegraph.pl`, speedscope and most flamegraph viewers. Sampling observes the event
+  loop and the API worker threads alike, which a deterministic profiler enabled in
+  one thread would not. Only the threads running on a CPU are sampled, as reported
+  by `/proc`: threads waiting for a lock, for I/O or for the GIL are left out.
+- `capture_wall_profile()` samples every thread, idle or not, to see where the
+  threads wait.
+- `capture_allocation_diff()` traces the memory allocations with `tracemalloc` for the
+  duration and returns the allocation sites which grew the most.
+
+Captures are serialized by `capture_guard`, only one capture runs per process.
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Optional
+
+CPU = "cpu"
+WALL = "wall"
+MEMORY = "memory"
+PROFILE_KINDS = (CPU, WALL, MEMORY)
+
+
+class ProfileInProgress(Exception):
+    """
+    Raised when a capture is requested while another one is running.
+    """
+
+
+class CaptureGuard:
+    """
+    Lets a single capture run at a time, without ever waiting for the running one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        if not self._lock.acquire(blocking=False):
+            raise ProfileInProgress("A profile is already being captured")
+        return self
+
+    def __exit__(self, *exc_info):
+        self._lock.release()
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+
+capture_guard = CaptureGuard()
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    # keyed on the first line of the function, so every sample of a function adds up
+    # to a single node of the flamegraph
+    return (
+        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+
+
+def _folded_stack(thread_name: str, frame) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.append(thread_name)
+    names.reverse()
+    return ";".join(names)
+
+
+def is_running(native_id: Optional[int]) -> bool:
+    """
+    Returns whether a thread is running or runnable, from its state in `/proc`.
+    Threads whose state cannot be read, e.g. on macOS, are reported as running.
+    """
+    if native_id is None:
+        return True
+    try:
+        with open(f"/proc/self/task/{native_id}/stat", "rb") as stat_file:
+            stat = stat_file.read()
+    except OSError:
+        return True
+    # the state follows the thread name, which is in parentheses and may hold spaces
+    state_offset = stat.rindex(b")") + 2
+    return stat[state_offset : state_offset + 1] == b"R"
+
+
+def sample_stacks(
+    duration_seconds: float, interval_seconds: float, running_only: bool = False
+) -> Counter:
+    """
+    Samples the stacks of every other thread of the process until the duration elapsed.
+
+    Args:
+        duration_seconds (float): Duration of the capture.
+        interval_seconds (float): Interval between two samples.
+        running_only (bool): Only samples the threads running on a CPU.
+
+    Returns:
+        Counter: Number of samples of every folded stack, rooted at the thread name.
+    """
+    own_thread_id = threading.get_ident()
+    samples = Counter()
+    deadline = time.monotonic() + duration_seconds
+    while time.monotonic() < deadline:
+        threads = {thread.ident: thread for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread_id:
+                continue
+            thread = threads.get(thread_id)
+            if running_only and not is_running(thread and thread.native_id):
+                continue
+            thread_name = thread.name if thread else f"thread-{thread_id}"
+            samples[_folded_stack(thread_name, frame)] += 1
+        time.sleep(interval_seconds)
+    return samples
+
+
+def format_folded(samples: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(samples.items()))
+
+
+def capture_cpu_profile(duration_seconds: float, interval_seconds: float = 0.01) -> str:
+    """
+    Returns a sampling CPU profile of the process in the folded stack format, from
+    the threads running on a CPU.
+
+    Raises:
+        ProfileInProgress: If another capture is running.
+    """
+    with capture_guard:
+        return format_folded(
+            sample_stacks(duration_seconds, interval_seconds, running_only=True)
+        )
+
+
+def capture_wall_profile(
+    duration_seconds: float, interval_seconds: float = 0.01
+) -> str:
+    """
+    Returns a sampling wall-clock profile of the process in the folded stack format,
+    from every thread whether it runs or waits.
+
+    Raises:
+        ProfileInProgress: If another capture is running.
+    """
+    with capture_guard:
+        return format_folded(sample_stacks(duration_seconds, interval_seconds))
+
+
+def capture_allocation_diff(
+    duration_seconds: float, top: int = 50, frames: int = 10
+) -> str:
+    """
+    Returns the allocation sites whose allocated memory changed the most during the
+    duration, as reported by `tracemalloc`.
+
+    Tracing is only enabled for the duration, unless it was already enabled.
+
+    Raises:
+        ProfileInProgress: If another capture is running.
+    """
+    with capture_guard:
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start(frames)
+        try:
+            before = tracemalloc.take_snapshot()
+            time.sleep(duration_seconds)
+            after = tracemalloc.take_snapshot()
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+
+    ignored = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ]
+    differences = after.filter_traces(ignored).compare_to(
+        before.filter_traces(ignored), "traceback"
+    )
+    lines = []
+    for difference in differences[:top]:
+        lines.append(str(difference))
+        lines.extend(f"    {line}" for line in difference.traceback.format())
+    return "\n".join(lines) + "\n"
+
+
+def capture_profile(
+    kind: str, duration_seconds: float, interval_seconds: Optional[float] = None
+) -> str:
+    """
+    Captures a profile of the given kind, `cpu`, `wall` or `memory`.
+
+    Raises:
+        ValueError: If the kind is unknown.
+        ProfileInProgress: If another capture is running.
+    """
+    if kind == CPU:
+        return capture_cpu_profile(duration_seconds, interval_seconds or 0.01)
+    if kind == WALL:
+        return capture_wall_profile(duration_seconds, interval_seconds or 0.01)
+    if kind == MEMORY:
+        return capture_allocation_diff(duration_seconds)
+    raise ValueError(f"Unknown profile kind: {kind}")
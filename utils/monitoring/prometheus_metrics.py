@@ -1,12 +1,175 @@
 # utils/monitoring/prometheus_metrics.py
 
-from prometheus_client import Histogram
-
-# Initialize the metric once
-bentoml_service_model_inferencing_duration_seconds = Histogram(
-    name="bentoml_service_model_inferencing_duration_seconds",
-    documentation="Time taken to perform inference",
-    labelnames=["endpoint", "service_name"],
-    unit="seconds",
-    buckets=(0.5, 1, 2.5, 5, 7.5, 10),
+from typing import Tuple
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from utils.common.settings import get_settings
+from utils.monitoring.multiprocess import buffer_observations
+
+
+def exponential_buckets(start: float, factor: float, count: int) -> Tuple[float, ...]:
+    """
+    Returns `count` histogram bucket bounds, starting at `start` and growing by
+    `factor`. prometheus_client cannot record native histograms, exponential buckets
+    give the same constant relative error with classic ones.
+    """
+    return tuple(start * factor**index for index in range(count))
+
+
+# 25 microseconds to 13 seconds, every bucket twice as wide as the previous one
+DEFAULT_LATENCY_BUCKETS = exponential_buckets(25e-6, 2, 20)
+LATENCY_BUCKETS = get_settings().metrics_latency_buckets or DEFAULT_LATENCY_BUCKETS
+
+# Initialize the metric once. The histograms observed on the request path are
+# buffered in multiprocess mode, see multiprocess.py
+bentoml_service_model_inferencing_duration_seconds = buffer_observations(
+    Histogram(
+        name="bentoml_service_model_inferencing_duration_seconds",
+        documentation="Time taken to perform inference",
+        labelnames=["endpoint", "service_name"],
+        unit="seconds",
+        buckets=LATENCY_BUCKETS,
+    )
+)
+
+bentoml_service_request_stage_duration_seconds = buffer_observations(
+    Histogram(
+        name="bentoml_service_request_stage_duration_seconds",
+        documentation="Time spent by a request in every stage of the serve path",
+        labelnames=["stage"],
+        unit="seconds",
+        buckets=LATENCY_BUCKETS,
+    )
+)
+
+bentoml_service_model_info = Gauge(
+    name="bentoml_service_model_info",
+    documentation="Version of the served model (1 for the version being served)",
+    labelnames=["service_name", "version"],
+    multiprocess_mode="livemax",
+)
+
+bentoml_service_circuit_breaker_state = Gauge(
+    name="bentoml_service_circuit_breaker_state",
+    documentation="Circuit breaker state (0 closed, 1 half open, 2 open)",
+    labelnames=["name"],
+    multiprocess_mode="livemax",
+)
+
+bentoml_service_circuit_breaker_transitions_total = Counter(
+    name="bentoml_service_circuit_breaker_transitions_total",
+    documentation="Number of circuit breaker state transitions",
+    labelnames=["name", "from_state", "to_state"],
+)
+
+bentoml_service_dynamodb_fallbacks_total = Counter(
+    name="bentoml_service_dynamodb_fallbacks_total",
+    documentation="DynamoDB reads answered from the stale cache or skipped",
+    labelnames=["reason", "stale_hit"],
+)
+
+bentoml_service_admission_rejections_total = Counter(
+    name="bentoml_service_admission_rejections_total",
+    documentation="Requests rejected by the admission control",
+    labelnames=["reason"],
+)
+
+bentoml_service_admission_concurrency_limit = Gauge(
+    name="bentoml_service_admission_concurrency_limit",
+    documentation="Adaptive concurrency limit of the worker",
+    multiprocess_mode="liveall",
+)
+
+bentoml_service_rate_limited_requests_total = Counter(
+    name="bentoml_service_rate_limited_requests_total",
+    documentation="Requests rejected by the per-tenant rate limit",
+)
+
+bentoml_service_deadline_exceeded_total = Counter(
+    name="bentoml_service_deadline_exceeded_total",
+    documentation="Requests dropped past their deadline, by the stage they skipped",
+    labelnames=["stage"],
+)
+
+bentoml_service_priority_lane_wait_seconds = buffer_observations(
+    Histogram(
+        name="bentoml_service_priority_lane_wait_seconds",
+        documentation="Time spent by requests waiting in their priority lane",
+        labelnames=["lane"],
+        unit="seconds",
+        buckets=LATENCY_BUCKETS,
+    )
+)
+
+bentoml_service_priority_lane_rejections_total = Counter(
+    name="bentoml_service_priority_lane_rejections_total",
+    documentation="Requests rejected because the queue of their priority lane is full",
+    labelnames=["lane"],
+)
+
+bentoml_service_fallback_predictions_total = Counter(
+    name="bentoml_service_fallback_predictions_total",
+    documentation="Predictions served by the fallback model, by the reason for it",
+    labelnames=["service_name", "reason"],
+)
+
+bentoml_service_shadow_comparisons_total = Counter(
+    name="bentoml_service_shadow_comparisons_total",
+    documentation="Sampled requests run on the shadow model, by whether it agreed "
+    "with the served model",
+    labelnames=["service_name", "outcome"],
+)
+
+bentoml_service_shadow_model_duration_seconds = buffer_observations(
+    Histogram(
+        name="bentoml_service_shadow_model_duration_seconds",
+        documentation="Prediction time of the served and the shadow model on the "
+        "sampled requests",
+        labelnames=["service_name", "model"],
+        unit="seconds",
+        buckets=LATENCY_BUCKETS,
+    )
+)
+
+bentoml_service_shadow_dropped_total = Counter(
+    name="bentoml_service_shadow_dropped_total",
+    documentation="Sampled requests dropped because the shadow queue was full",
+    labelnames=["service_name"],
+)
+
+bentoml_service_shadow_sample_rate = Gauge(
+    name="bentoml_service_shadow_sample_rate",
+    documentation="Share of the requests run on the shadow model",
+    labelnames=["service_name"],
+    multiprocess_mode="liveall",
+)
+
+bentoml_service_feature_drift_psi = Gauge(
+    name="bentoml_service_feature_drift_psi",
+    documentation="Population stability index of the inputs against the training data",
+    labelnames=["feature"],
+    multiprocess_mode="liveall",
+)
+
+bentoml_service_feature_mean_shift = Gauge(
+    name="bentoml_service_feature_mean_shift",
+    documentation="Shift of the mean of the inputs from the training mean, in "
+    "training standard deviations",
+    labelnames=["feature"],
+    multiprocess_mode="liveall",
+)
+
+bentoml_service_feature_std_ratio = Gauge(
+    name="bentoml_service_feature_std_ratio",
+    documentation="Standard deviation of the inputs over the training one",
+    labelnames=["feature"],
+    multiprocess_mode="liveall",
+)
+
+bentoml_service_request_captures_total = Counter(
+    name="bentoml_service_request_captures_total",
+    documentation="Sampled requests written to the capture file, or skipped because "
+    "they did not fit in a record",
+    labelnames=["outcome"],
 )
@@ -0,0 +1,283 @@
+"""
+Capture of sampled API requests to a memory-mapped ring file, for replay and profiling.
+
+Every worker appends the requests it samples to its own file of fixed size, mapped in
+memory. The file holds a header followed by slots of `record_bytes` bytes, and the
+n-th record is written to the slot `n % slots`: once the file is full, every record
+overwrites the oldest one, so the file always holds the latest requests and never
+grows. Appending a record copies it into the page cache and does not wait for the
+disk, the kernel writes the pages back in the background.
+
+A record holds its sequence number, a CRC32 of its content, the arrival time, the
+latency and the status code of the request, its route and its raw body. Its sequence
+number is written last, so a record read while it is being written (or left half
+written by a crashed worker) fails the CRC check and is skipped. Requests whose route
+and body do not fit in a slot are not captured.
+
+A worker takes over the capture file of an exited worker, if any, rather than
+creating a new one: the number of files stays bounded by the number of workers, and
+the records of the exited worker are kept until the ring overwrites them.
+
+The captures are converted into a request corpus for the load testing harness (see
+`utils/common/request_corpus.py`), oldest request first.
+
+To run: `python -m utils.monitoring.request_capture captures/*.capture -o requests.jsonl`
+"""
+
+import argparse
+import glob
+import json
+import mmap
+import os
+import struct
+import zlib
+from typing import Iterable, List, NamedTuple, Optional
+
+MAGIC = b"REQCAP01"
+# magic, size of the slots and number of slots, padded to FILE_HEADER_BYTES
+FILE_HEADER = struct.Struct("<8sII")
+FILE_HEADER_BYTES = 64
+# sequence number, CRC32 of the rest of the record
+RECORD_PREFIX = struct.Struct("<QI")
+# arrival time, latency in seconds, status code, route length, body length
+RECORD_FIELDS = struct.Struct("<dfHHI")
+RECORD_HEADER_BYTES = RECORD_PREFIX.size + RECORD_FIELDS.size
+
+
+class CapturedRequest(NamedTuple):
+    sequence: int
+    timestamp: float
+    latency_seconds: float
+    status: int
+    route: str
+    body: bytes
+
+
+class RequestCaptureRing:
+    """
+    Ring of fixed-size request records in a memory-mapped file.
+
+    The ring is written from one thread only, the event loop of the worker.
+
+    Attributes:
+        path (str): Path of the capture file. An existing capture file with the same
+            slots is appended to, any other file is truncated.
+        size_bytes (int): Size of the capture file.
+        record_bytes (int): Size of the slots, the largest record captured.
+    """
+
+    def __init__(self, path: str, size_bytes: int, record_bytes: int = 4096):
+        self.path = path
+        self.record_bytes = record_bytes
+        self.slots = (size_bytes - FILE_HEADER_BYTES) // record_bytes
+        if record_bytes <= RECORD_HEADER_BYTES or self.slots < 1:
+            raise ValueError("The capture file must hold at least one record")
+
+        self._sequence = self._last_sequence(path)
+        self._file = open(path, "r+b" if self._sequence is not None else "w+b")
+        self._file.truncate(FILE_HEADER_BYTES + self.slots * record_bytes)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        FILE_HEADER.pack_into(self._map, 0, MAGIC, record_bytes, self.slots)
+        self._sequence = self._sequence or 0
+
+    def _last_sequence(self, path: str) -> Optional[int]:
+        """
+        Returns the sequence number of the latest record of an existing capture file
+        with the same slots, which the ring continues, and None otherwise.
+        """
+        try:
+            with open(path, "rb") as capture_file:
+                header = capture_file.read(FILE_HEADER.size)
+        except FileNotFoundError:
+            return None
+        if len(header) < FILE_HEADER.size or FILE_HEADER.unpack(header) != (
+            MAGIC,
+            self.record_bytes,
+            self.slots,
+        ):
+            return None
+        records = read_capture(path)
+        return records[-1].sequence if records else 0
+
+    def append(
+        self,
+        timestamp: float,
+        route: str,
+        body: bytes,
+        latency_seconds: float,
+        status: int,
+    ) -> bool:
+        """
+        Writes a request to the ring, over the oldest record once the ring is full.
+
+        Returns:
+            bool: Whether the request fits in a slot and was captured.
+        """
+        route_bytes = route.encode()
+        if RECORD_HEADER_BYTES + len(route_bytes) + len(body) > self.record_bytes:
+            return False
+
+        self._sequence += 1
+        offset = (
+            FILE_HEADER_BYTES + (self._sequence - 1) % self.slots * self.record_bytes
+        )
+        # invalidates the slot until the new record is complete
+        RECORD_PREFIX.pack_into(self._map, offset, 0, 0)
+        fields = RECORD_FIELDS.pack(
+            timestamp, latency_seconds, status, len(route_bytes), len(body)
+        )
+        payload = route_bytes + body
+        start = offset + RECORD_HEADER_BYTES
+        self._map[offset + RECORD_PREFIX.size : start] = fields
+        self._map[start : start + len(payload)] = payload
+        crc = zlib.crc32(payload, zlib.crc32(fields))
+        RECORD_PREFIX.pack_into(self._map, offset, self._sequence, crc)
+        return True
+
+    def close(self) -> None:
+        self._map.flush()
+        self._map.close()
+        self._file.close()
+
+
+def read_capture(path: str) -> List[CapturedRequest]:
+    """
+    Reads the complete records of a capture file, oldest first.
+
+    Raises:
+        ValueError: If the file is not a capture file.
+    """
+    with open(path, "rb") as capture_file:
+        data = memoryview(capture_file.read())
+    if len(data) < FILE_HEADER_BYTES:
+        raise ValueError(f"{path} is not a request capture file")
+    magic, record_bytes, slots = FILE_HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a request capture file")
+
+    records = []
+    for slot in range(slots):
+        offset = FILE_HEADER_BYTES + slot * record_bytes
+        if offset + record_bytes > len(data):
+            break
+        sequence, crc = RECORD_PREFIX.unpack_from(data, offset)
+        if sequence == 0:
+            continue
+        fields_offset = offset + RECORD_PREFIX.size
+        timestamp, latency, status, route_length, body_length = (
+            RECORD_FIELDS.unpack_from(data, fields_offset)
+        )
+        end = offset + RECORD_HEADER_BYTES + route_length + body_length
+        if end > offset + record_bytes or zlib.crc32(data[fields_offset:end]) != crc:
+            continue
+        route_end = offset + RECORD_HEADER_BYTES + route_length
+        records.append(
+            CapturedRequest(
+                sequence=sequence,
+                timestamp=timestamp,
+                latency_seconds=latency,
+                status=status,
+                route=bytes(data[offset + RECORD_HEADER_BYTES : route_end]).decode(),
+                body=bytes(data[route_end:end]),
+            )
+        )
+    records.sort(key=lambda record: record.sequence)
+    return records
+
+
+def export_corpus(
+    capture_paths: Iterable[str], output_path: str, route: Optional[str] = None
+) -> int:
+    """
+    Writes the requests of capture files to a JSONL request corpus, oldest first.
+    Requests whose body is not a JSON object are skipped.
+
+    Every line holds the `route` and the `body` of a request, as well as its
+    `timestamp`, `latency_ms` and `status`, which the corpus loader ignores.
+
+    Args:
+        capture_paths (Iterable[str]): Capture files, e.g. one per worker.
+        output_path (str): Path of the JSONL corpus.
+        route (str, optional): Only exports the requests of this route.
+
+    Returns:
+        int: Number of requests written.
+    """
+    records = [
+        record
+        for path in capture_paths
+        for record in read_capture(path)
+        if route is None or record.route == route
+    ]
+    records.sort(key=lambda record: record.timestamp)
+
+    written = 0
+    with open(output_path, "w") as corpus_file:
+        for record in records:
+            try:
+                body = json.loads(record.body)
+            except ValueError:
+                continue
+            if not isinstance(body, dict):
+                continue
+            line = {
+                "route": record.route,
+                "body": body,
+                "timestamp": record.timestamp,
+                "latency_ms": round(record.latency_seconds * 1000, 3),
+                "status": record.status,
+            }
+            corpus_file.write(json.dumps(line) + "\n")
+            written += 1
+    return written
+
+
+def capture_file_path(capture_dir: str) -> str:
+    """
+    Returns the capture file of the current worker process.
+    """
+    return os.path.join(capture_dir, f"requests-{os.getpid()}.capture")
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def claim_capture_file(capture_dir: str) -> str:
+    """
+    Returns the capture file of the current worker process, renamed from the capture
+    file of an exited worker when there is one.
+    """
+    path = capture_file_path(capture_dir)
+    if os.path.exists(path):
+        return path
+    for other_path in sorted(
+        glob.glob(os.path.join(capture_dir, "requests-*.capture"))
+    ):
+        pid = os.path.basename(other_path)[len("requests-") : -len(".capture")]
+        if not pid.isdigit() or _is_alive(int(pid)):
+            continue
+        try:
+            # a rename is atomic, two workers never claim the same file
+            os.rename(other_path, path)
+        except FileNotFoundError:
+            continue
+        return path
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("captures", nargs="+", help="Capture files to export")
+    parser.add_argument("-o", "--output", default="requests.jsonl")
+    parser.add_argument("--route", help="Only export the requests of this route")
+    args = parser.parse_args()
+
+    count = export_corpus(args.captures, args.output, args.route)
+    print(f"Exported {count} requests to {args.output}")
@@ -0,0 +1,356 @@
+"""
+Runtime resource metrics of a worker process.
+
+The sync API functions run in BentoML's thread pool while the middlewares run on the
+event loop, so latency spikes can come from the event loop being blocked, from the
+thread pool being saturated or from garbage collection pauses. This module exports:
+
+- the resident memory of the worker and the bytes held by the served model;
+- the garbage collections and their pauses, by generation, recorded with
+  `gc.callbacks`;
+- the event loop lag, how late a sleep on the event loop wakes up;
+- the requests in flight in the worker and the requests queued for a worker thread.
+
+Nothing is written to the metrics on the request path or during a collection: the
+counts are kept in process memory and `RuntimeSampler` exports them from a background
+thread every `RUNTIME_METRICS_INTERVAL_SECONDS`. The gauges are labelled by the process
+id of the worker in multiprocess mode.
+"""
+
+import asyncio
+import gc
+import os
+import resource
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+from prometheus_client import Counter, Gauge, Histogram
+
+from utils.common.settings import get_settings
+from utils.monitoring.prometheus_metrics import DEFAULT_LATENCY_BUCKETS
+from utils.structure_logging.logger_config import logger
+
+# Scope key marking a request handed to BentoML whose API function did not start yet
+QUEUED_KEY = "runtime_metrics.queued"
+# Scope key holding the seconds the request waited for a worker thread
+QUEUE_WAIT_SECONDS_KEY = "runtime_metrics.queue_wait_seconds"
+
+bentoml_service_worker_resident_memory_bytes = Gauge(
+    name="bentoml_service_worker_resident_memory_bytes",
+    documentation="Resident memory of the worker process",
+    multiprocess_mode="liveall",
+)
+
+bentoml_service_model_resident_bytes = Gauge(
+    name="bentoml_service_model_resident_bytes",
+    documentation="Memory held by the served model",
+    labelnames=["service_name"],
+    multiprocess_mode="liveall",
+)
+
+bentoml_service_gc_collections_total = Counter(
+    name="bentoml_service_gc_collections_total",
+    documentation="Number of garbage collections",
+    labelnames=["generation"],
+)
+
+bentoml_service_gc_pause_seconds = Histogram(
+    name="bentoml_service_gc_pause_seconds",
+    documentation="Duration of the garbage collections",
+    labelnames=["generation"],
+    unit="seconds",
+    buckets=DEFAULT_LATENCY_BUCKETS,
+)
+
+bentoml_service_event_loop_lag_seconds = Histogram(
+    name="bentoml_service_event_loop_lag_seconds",
+    documentation="Delay of the event loop in waking up a sleeping task",
+    unit="seconds",
+    buckets=DEFAULT_LATENCY_BUCKETS,
+)
+
+bentoml_service_in_flight_requests = Gauge(
+    name="bentoml_service_in_flight_requests",
+    documentation="Requests being served by the worker",
+    multiprocess_mode="liveall",
+)
+
+bentoml_service_queued_requests = Gauge(
+    name="bentoml_service_queued_requests",
+    documentation="Requests waiting for a worker thread",
+    multiprocess_mode="liveall",
+)
+
+
+class RequestCounter:
+    """
+    Number of requests in a state, updated from the event loop and worker threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self) -> None:
+        with self._lock:
+            self.value += 1
+
+    def dec(self) -> None:
+        with self._lock:
+            self.value -= 1
+
+
+class QueuedRequests:
+    """
+    Requests waiting for a worker thread, with the time they were queued at.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # insertion ordered, the first entry is the oldest queued request
+        self._queued_at: Dict[int, float] = {}
+
+    @property
+    def value(self) -> int:
+        return len(self._queued_at)
+
+    def add(self, key: int, queued_at: float) -> None:
+        with self._lock:
+            self._queued_at[key] = queued_at
+
+    def remove(self, key: int) -> None:
+        with self._lock:
+            self._queued_at.pop(key, None)
+
+    def oldest_age(self, now: float) -> float:
+        """
+        Returns the seconds the oldest queued request has been waiting, 0 when no
+        request is queued.
+        """
+        with self._lock:
+            for queued_at in self._queued_at.values():
+                return now - queued_at
+        return 0.0
+
+
+in_flight_requests = RequestCounter()
+queued_requests = QueuedRequests()
+
+
+def mark_queued(scope) -> None:
+    """
+    Counts the request as queued until `request_started()` or `mark_finished()`.
+    """
+    queued_at = time.perf_counter()
+    scope[QUEUED_KEY] = queued_at
+    queued_requests.add(id(scope), queued_at)
+
+
+def request_started(scope) -> None:
+    """
+    Stops counting the request as queued, to be called when the API function starts.
+    The time the request waited is kept in the scope.
+    """
+    # popped by whichever of this and `mark_finished()` runs first
+    queued_at = scope.pop(QUEUED_KEY, None)
+    if queued_at is not None:
+        queued_requests.remove(id(scope))
+        scope[QUEUE_WAIT_SECONDS_KEY] = time.perf_counter() - queued_at
+
+
+def mark_finished(scope) -> None:
+    """
+    Stops counting the request as queued if its API function never started.
+    """
+    if scope.pop(QUEUED_KEY, None) is not None:
+        queued_requests.remove(id(scope))
+
+
+class GCPauses:
+    """
+    Records the garbage collections with `gc.callbacks`.
+
+    The callback runs inside the collection, in whichever thread triggered it, so it
+    only appends to a bounded deque: taking the lock of a metric there could deadlock
+    with the thread it interrupted.
+    """
+
+    def __init__(self, max_pending: int = 10000):
+        self.pending = deque(maxlen=max_pending)
+        self._started_at = None
+
+    def callback(self, phase: str, info: Dict[str, Any]) -> None:
+        # collections hold the GIL and never overlap
+        if phase == "start":
+            self._started_at = time.perf_counter()
+        elif self._started_at is not None:
+            self.pending.append(
+                (info["generation"], time.perf_counter() - self._started_at)
+            )
+            self._started_at = None
+
+    def install(self) -> None:
+        if self.callback not in gc.callbacks:
+            gc.callbacks.append(self.callback)
+
+    def uninstall(self) -> None:
+        if self.callback in gc.callbacks:
+            gc.callbacks.remove(self.callback)
+
+    def export(self) -> None:
+        while self.pending:
+            generation, seconds = self.pending.popleft()
+            generation = str(generation)
+            bentoml_service_gc_collections_total.labels(generation=generation).inc()
+            bentoml_service_gc_pause_seconds.labels(generation=generation).observe(
+                seconds
+            )
+
+
+gc_pauses = GCPauses()
+
+
+def resident_memory_bytes() -> int:
+    """
+    Returns the current resident memory of the process, or the peak resident memory
+    where `/proc` is not available.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def object_size_bytes(obj) -> int:
+    """
+    Returns the memory held by an object and everything it references, counting every
+    object and every numpy buffer once.
+
+    Objects are followed through their pickled state, which also reaches the arrays of
+    extension types such as the trees of scikit-learn neighbors models.
+    """
+    seen = set()
+    pending = [obj]
+    # states built by __getstate__ are kept alive, so their ids are not reused
+    states = []
+    total = 0
+    while pending:
+        current = pending.pop()
+        if id(current) in seen or isinstance(current, type):
+            continue
+        seen.add(id(current))
+
+        if isinstance(current, np.ndarray):
+            # views count the buffer of the array owning it, once
+            owner = current
+            while isinstance(owner.base, np.ndarray):
+                owner = owner.base
+            if owner is current or id(owner) not in seen:
+                seen.add(id(owner))
+                total += owner.nbytes
+            continue
+
+        total += sys.getsizeof(current, 0)
+        if isinstance(current, (str, bytes, int, float, complex, bool)):
+            continue
+        if isinstance(current, dict):
+            pending.extend(current.keys())
+            pending.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            pending.extend(current)
+        else:
+            try:
+                state = current.__getstate__()
+            except Exception:
+                state = getattr(current, "__dict__", None)
+            if state is not None:
+                states.append(state)
+                pending.append(state)
+    return total
+
+
+class RuntimeSampler:
+    """
+    Exports the runtime metrics of the worker in a background thread.
+    """
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._models: Dict[str, Callable[[], Any]] = {}
+        self._model_sizes: Dict[str, tuple] = {}
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def track_model(self, service_name: str, get_model: Callable[[], Any]) -> None:
+        """
+        Exports the memory held by the model returned by `get_model`, measured again
+        whenever another model is returned.
+        """
+        self._models[service_name] = get_model
+
+    def _sample_models(self) -> None:
+        for service_name, get_model in self._models.items():
+            model = get_model()
+            cached = self._model_sizes.get(service_name)
+            if cached is None or cached[0] is not model:
+                cached = (model, object_size_bytes(model))
+                self._model_sizes[service_name] = cached
+            bentoml_service_model_resident_bytes.labels(service_name=service_name).set(
+                cached[1]
+            )
+
+    def sample(self) -> None:
+        bentoml_service_worker_resident_memory_bytes.set(resident_memory_bytes())
+        bentoml_service_in_flight_requests.set(in_flight_requests.value)
+        bentoml_service_queued_requests.set(queued_requests.value)
+        gc_pauses.export()
+        self._sample_models()
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval_seconds):
+            try:
+                self.sample()
+            except Exception:
+                logger.exception("Error sampling runtime metrics")
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        gc_pauses.install()
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="runtime-metrics", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        gc_pauses.uninstall()
+        self.sample()
+
+
+runtime_sampler = RuntimeSampler(get_settings().runtime_metrics_interval_seconds)
+
+
+async def monitor_event_loop_lag(interval_seconds: float) -> None:
+    """
+    Observes how late a sleep of `interval_seconds` wakes up, until cancelled. Every
+    callback blocking the event loop for longer than the interval is observed.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval_seconds)
+        bentoml_service_event_loop_lag_seconds.observe(
+            max(loop.time() - start - interval_seconds, 0.0)
+        )
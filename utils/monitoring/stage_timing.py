@@ -0,0 +1,153 @@
+"""
+This module times the stages of the serve path of every request.
+
+Every stage is observed in the `bentoml_service_request_stage_duration_seconds`
+histogram, labelled by stage:
+
+- one stage per middleware wrapped in `TimedMiddleware`, covering the time spent in
+  the middleware itself, excluding the time spent in the middlewares and the
+  endpoint it calls;
+- `body_parsing`, the parsing of the request body by the `ValidationHandler`,
+  excluded from the `validation` stage;
+- `queue_wait`, from the innermost middleware handing the request to BentoML until
+  the API function starts in the worker thread, i.e. BentoML's input decoding and
+  the wait for a free thread;
+- `model_call`, the model prediction.
+
+The stages do not overlap, so the sum of their histograms is the time spent on the
+serve path. The timings of a request are kept in its ASGI scope, which every
+middleware passes on to the next one.
+
+A request past its deadline (see `utils/common/latency_budget.py`) is answered with
+504 before the next timed stage runs, and counted in
+`bentoml_service_deadline_exceeded_total` by the stage it skipped.
+"""
+
+import time
+from contextlib import contextmanager
+from http import HTTPStatus
+
+from utils.common.latency_budget import deadline_exceeded
+from utils.common.response import error_response
+from utils.monitoring.prometheus_metrics import (
+    bentoml_service_deadline_exceeded_total,
+    bentoml_service_request_stage_duration_seconds,
+)
+
+# Scope keys holding the timings of a request
+DOWNSTREAM_SECONDS_KEY = "stage_timing.downstream_seconds"
+NESTED_SECONDS_KEY = "stage_timing.nested_seconds"
+APP_ENTERED_AT_KEY = "stage_timing.app_entered_at"
+
+BODY_PARSING = "body_parsing"
+QUEUE_WAIT = "queue_wait"
+MODEL_CALL = "model_call"
+
+
+# Labelled histogram of every stage, looked up once instead of on every observation
+_stage_histograms = {}
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    histogram = _stage_histograms.get(stage)
+    if histogram is None:
+        histogram = bentoml_service_request_stage_duration_seconds.labels(stage=stage)
+        _stage_histograms[stage] = histogram
+    histogram.observe(seconds)
+
+
+@contextmanager
+def stage_timer(stage: str, scope=None):
+    """
+    Observes the time spent in the block as `stage`. Given the scope of the request,
+    the time is excluded from the stage of the timed middleware running the block.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe_stage(stage, elapsed)
+        if scope is not None:
+            scope[NESTED_SECONDS_KEY] = scope.get(NESTED_SECONDS_KEY, 0.0) + elapsed
+
+
+def count_deadline_exceeded(stage: str) -> None:
+    """
+    Counts a request dropped past its deadline before `stage`.
+    """
+    bentoml_service_deadline_exceeded_total.labels(stage=stage).inc()
+
+
+def deadline_exceeded_response():
+    return error_response("Request deadline exceeded", HTTPStatus.GATEWAY_TIMEOUT)
+
+
+def observe_queue_wait(scope) -> None:
+    """
+    Observes the `queue_wait` stage of the request, to be called when the API
+    function starts.
+    """
+    app_entered_at = scope.get(APP_ENTERED_AT_KEY)
+    if app_entered_at is not None:
+        observe_stage(QUEUE_WAIT, time.perf_counter() - app_entered_at)
+
+
+class _Downstream:
+    """
+    Records the time spent in the application called by a timed middleware.
+    """
+
+    def __init__(self, app, stage: str):
+        self.app = app
+        self.stage = stage
+
+    async def __call__(self, scope, receive, send):
+        start = time.perf_counter()
+        # overwritten by every timed middleware, the innermost one writes last
+        scope[APP_ENTERED_AT_KEY] = start
+        # stage timers run downstream are already part of the downstream time
+        nested = scope.get(NESTED_SECONDS_KEY, 0.0)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            scope[NESTED_SECONDS_KEY] = nested
+            downstream = scope.setdefault(DOWNSTREAM_SECONDS_KEY, {})
+            downstream[self.stage] = (
+                downstream.get(self.stage, 0.0) + time.perf_counter() - start
+            )
+
+
+class TimedMiddleware:
+    """
+    Pure ASGI wrapper observing the time spent in a middleware as a stage, and
+    dropping requests past their deadline before the middleware runs.
+
+    Usage:
+        Service.add_asgi_middleware(
+            TimedMiddleware, middleware=JWTAuthentication, stage="jwt"
+        )
+    """
+
+    def __init__(self, app, middleware, stage: str, **options):
+        self.stage = stage
+        self.middleware = middleware(_Downstream(app, stage), **options)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.middleware(scope, receive, send)
+            return
+        if deadline_exceeded():
+            count_deadline_exceeded(self.stage)
+            await deadline_exceeded_response()(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        nested = scope.get(NESTED_SECONDS_KEY, 0.0)
+        try:
+            await self.middleware(scope, receive, send)
+        finally:
+            elapsed = time.perf_counter() - start
+            downstream = scope.get(DOWNSTREAM_SECONDS_KEY, {}).pop(self.stage, 0.0)
+            nested = scope.get(NESTED_SECONDS_KEY, 0.0) - nested
+            observe_stage(self.stage, elapsed - downstream - nested)
@@ -2,16 +2,13 @@
 This module configures the structure logging setup using structlog.
 """
 
-import os
 import logging
-from dotenv import load_dotenv
 import structlog
 import orjson
 
-load_dotenv()
+from utils.common.settings import get_settings
 
-level = os.getenv("LOG_LEVEL", "WARNING").upper()
-LOG_LEVEL = getattr(logging, level, logging.WARNING)
+LOG_LEVEL = getattr(logging, get_settings().log_level, logging.WARNING)
 
 
 def configure_structure_logging():